@@ -1,9 +1,20 @@
 """
 Bayesian smoothing using Beta-Binomial.
+bayesian_smooth_rate handles one cell; bayesian_smooth_rates takes arrays and smooths
+thousands of cells in one call. Its CIs use beta.ppf, or for large posteriors (ESS >=
+NORMAL_APPROX_MIN_ESS, alpha and beta >= NORMAL_APPROX_MIN_SHAPE) the normal approximation
+mean ± z·sd, which stays within NORMAL_APPROX_TOLERANCE of beta.ppf there.
 """
+import numpy as np
 from scipy.stats import beta as beta_dist
+from scipy.stats import norm
 
-from config import PRIOR_STRENGTH
+from config import NORMAL_APPROX_MIN_ESS, NORMAL_APPROX_MIN_SHAPE, PRIOR_STRENGTH
+
+# Max absolute error of the normal-approximation CI bounds vs beta.ppf (checked over
+# ESS 1e3-1e6, alpha 30..ESS/2) - 0.1 percentage points
+NORMAL_APPROX_TOLERANCE = 1e-3
+_CI_LEVELS = (0.025, 0.975)
 
 
 def bayesian_smooth_rate(
@@ -14,31 +25,66 @@ def bayesian_smooth_rate(
 ) -> dict:
     """
     Beta-Binomial smoothing. prior_mean should be market average for same demographic.
-    Returns posterior_mean, ci_lower, ci_upper, ess, weight, raw_rate.
+    Returns posterior_mean, ci_lower, ci_upper, ess, weight, raw_rate (exact beta.ppf CI).
     """
+    cell = bayesian_smooth_rates([successes], [trials], prior_mean, prior_strength, exact=True)
+    result = {key: float(values[0]) for key, values in cell.items()}
     if trials == 0:
-        return {
-            "posterior_mean": prior_mean,
-            "ci_lower": prior_mean,
-            "ci_upper": prior_mean,
-            "ess": prior_strength * 2,
-            "weight": 0.0,
-            "raw_rate": None,
-        }
-    alpha_prior = prior_mean * prior_strength
-    beta_prior = (1 - prior_mean) * prior_strength
-    alpha_post = alpha_prior + successes
-    beta_post = beta_prior + (trials - successes)
-    posterior_mean = alpha_post / (alpha_post + beta_post)
-    ci_lower, ci_upper = beta_dist.ppf([0.025, 0.975], alpha_post, beta_post)
+        result["raw_rate"] = None
+    return result
+
+
+def bayesian_smooth_rates(
+    successes,
+    trials,
+    prior_mean,
+    prior_strength: int = PRIOR_STRENGTH,
+    exact: bool = False,
+) -> dict:
+    """
+    bayesian_smooth_rate over arrays (prior_mean may be a scalar or per-cell, e.g. the market
+    rate of each cell's segment). Returns a dict of arrays with the same keys: posterior_mean,
+    ci_lower, ci_upper, ess, weight, raw_rate (NaN for 0 trials). Cells with 0 trials get the
+    prior. exact=True computes every CI with beta.ppf instead of the normal approximation.
+    """
+    successes = np.asarray(successes, dtype="float64")
+    trials = np.asarray(trials, dtype="float64")
+    prior_mean = np.broadcast_to(np.asarray(prior_mean, dtype="float64"), trials.shape)
+    alpha_post = prior_mean * prior_strength + successes
+    beta_post = (1 - prior_mean) * prior_strength + (trials - successes)
     ess = alpha_post + beta_post
-    weight = trials / ess
-    raw_rate = successes / trials
+    posterior_mean = alpha_post / ess
+    ci_lower, ci_upper = _beta_interval(alpha_post, beta_post, exact)
+    has_data = trials > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        raw_rate = np.where(has_data, successes / trials, np.nan)
     return {
-        "posterior_mean": posterior_mean,
-        "ci_lower": ci_lower,
-        "ci_upper": ci_upper,
-        "ess": ess,
-        "weight": weight,
+        "posterior_mean": np.where(has_data, posterior_mean, prior_mean),
+        "ci_lower": np.where(has_data, ci_lower, prior_mean),
+        "ci_upper": np.where(has_data, ci_upper, prior_mean),
+        "ess": np.where(has_data, ess, prior_strength * 2),
+        "weight": trials / ess,
         "raw_rate": raw_rate,
     }
+
+
+def _beta_interval(alpha: np.ndarray, beta: np.ndarray, exact: bool) -> tuple[np.ndarray, np.ndarray]:
+    """95% equal-tailed interval of Beta(alpha, beta), normal approximation where it is within tolerance."""
+    ess = alpha + beta
+    approx = np.zeros(alpha.shape, dtype=bool)
+    if not exact:
+        approx = (ess >= NORMAL_APPROX_MIN_ESS) & (np.minimum(alpha, beta) >= NORMAL_APPROX_MIN_SHAPE)
+    lower = np.empty(alpha.shape)
+    upper = np.empty(alpha.shape)
+    if approx.any():
+        a, b, n = alpha[approx], beta[approx], ess[approx]
+        mean = a / n
+        sd = np.sqrt(a * b / (n * n * (n + 1)))
+        z = norm.ppf(_CI_LEVELS[1])
+        lower[approx] = np.clip(mean - z * sd, 0.0, 1.0)
+        upper[approx] = np.clip(mean + z * sd, 0.0, 1.0)
+    if not approx.all():
+        rest = ~approx
+        bounds = beta_dist.ppf(np.array(_CI_LEVELS)[:, None], alpha[rest], beta[rest])
+        lower[rest], upper[rest] = bounds[0], bounds[1]
+    return lower, upper
@@ -1,55 +1,154 @@
 """
 Pre-compute Bayesian-smoothed retention rates at refresh time.
-Stores results in data/processed/bayesian_cache.parquet for fast callback lookup.
+Stores results in data/processed/bayesian_cache.parquet for fast callback lookup: one row per
+insurer × product × time window × AgeBand × Region × PaymentType cell, "" standing for
+"all" in the demographic columns.
+Callbacks look rates up in an in-process index over the file's columns, loaded once and
+reloaded when its mtime or size changes.
 """
+import os
+import tempfile
+import threading
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 
-from analytics.rates import calc_retention_rate
-from analytics.bayesian import bayesian_smooth_rate
-from analytics.demographics import apply_filters
+from analytics.rates import calc_counts_by_insurer, calc_retention_rate
+from analytics.bayesian import bayesian_smooth_rates
+from analytics.count_cube import CUBE_MEASURES, count_cells
+from analytics.demographics import apply_filters, window_start
 
 # Path to cache file
 _CACHE_PATH = Path(__file__).resolve().parent.parent / "data" / "processed" / "bayesian_cache.parquet"
 
+# Time windows (months) pre-computed for every product
+TIME_WINDOWS = (6, 12, 24)
+
+# Cache column -> demographic filter column; ALL marks an unfiltered dimension
+CELL_COLUMNS = {"age_band": "AgeBand", "region": "Region", "payment_type": "PaymentType"}
+ALL = ""
+
 
 def precompute_retention_rates(df: pd.DataFrame, product: str, time_window_months: int = 24) -> pd.DataFrame:
     """
-    Pre-compute Bayesian-smoothed retention for each insurer × product.
-    Returns DataFrame with columns: insurer, product, n, raw_rate, posterior_mean, ci_lower, ci_upper, market_rate.
+    Pre-compute Bayesian-smoothed retention for each insurer × product: counts for every
+    insurer from one groupby over the market, then one batched smoothing call.
+    Returns DataFrame with columns: insurer, product, time_window_months, age_band, region,
+    payment_type (ALL), n, raw_rate, posterior_mean, ci_lower, ci_upper, market_rate.
     """
     df_market = apply_filters(df, product=product, time_window_months=time_window_months)
     market_rate = calc_retention_rate(df_market)
     if market_rate is None:
         return pd.DataFrame()
 
-    insurers = df_market["CurrentCompany"].dropna().astype(str).str.strip().unique()
-    insurers = [i for i in insurers if i and i.lower() != "nan"]
+    rates = smoothed_retention_by_insurer(df_market, market_rate, exact=True)
+    rates["insurer"] = rates["insurer"].astype(str).str.strip()
+    rates = rates[(rates["n"] > 0) & (rates["insurer"] != "") & (rates["insurer"].str.lower() != "nan")]
+    out = pd.DataFrame({
+        "insurer": rates["insurer"].to_numpy(dtype=object),
+        "product": product,
+        "time_window_months": time_window_months,
+        **dict.fromkeys(CELL_COLUMNS, ALL),
+    })
+    for col in ("n", "raw_rate", "posterior_mean", "ci_lower", "ci_upper"):
+        out[col] = rates[col].to_numpy()
+    out["market_rate"] = market_rate
+    return out
 
-    rows = []
-    for insurer in insurers:
-        df_ins = apply_filters(df, insurer=insurer, product=product, time_window_months=time_window_months)
-        df_ins = df_ins[~df_ins.get("IsNewToMarket", False)]
-        n = len(df_ins)
-        if n == 0:
-            continue
-        retained = int(df_ins["IsRetained"].sum())
-        total = n
-        result = bayesian_smooth_rate(retained, total, market_rate)
-        rows.append({
-            "insurer": insurer,
-            "product": product,
-            "time_window_months": time_window_months,
-            "n": n,
-            "raw_rate": result["raw_rate"],
-            "posterior_mean": result["posterior_mean"],
-            "ci_lower": result["ci_lower"],
-            "ci_upper": result["ci_upper"],
-            "market_rate": market_rate,
-        })
-
-    return pd.DataFrame(rows)
+
+def precompute_cell_rates(df: pd.DataFrame, product: str, time_window_months: int = 24) -> pd.DataFrame:
+    """
+    Pre-compute Bayesian-smoothed retention for each insurer × AgeBand × Region × PaymentType
+    cell, with ALL for any subset of the three (the fully unfiltered cell is left to
+    precompute_retention_rates). Each cell's prior is the market retention of the same
+    demographic cell. Counts come from one count_cells pass over the market and every cell
+    is smoothed in one batched call. Same columns as precompute_retention_rates.
+    """
+    df_market = apply_filters(df, product=product, time_window_months=time_window_months)
+    if len(df_market) == 0:
+        return pd.DataFrame()
+    labels, counts = count_cells(df_market, ("CurrentCompany", *CELL_COLUMNS.values()))
+    m = {name: i for i, name in enumerate(CUBE_MEASURES)}  # counts: measure × insurer × age × region × payment
+    # Append an "all" slot to each demographic axis (its labels plus the missing slot)
+    for axis in range(2, counts.ndim):
+        counts = np.concatenate([counts, counts.sum(axis=axis, keepdims=True)], axis=axis)
+    market = counts.sum(axis=1)
+
+    insurers = [str(i).strip() for i in labels["CurrentCompany"]]
+    ins_slots = [i for i, name in enumerate(insurers) if name and name.lower() != "nan"]
+    dims = [labels[dim] for dim in CELL_COLUMNS.values()]
+    slots = [list(range(len(labels))) + [len(labels) + 1] for labels in dims]  # skip the missing slot
+    cells = counts[(slice(None),) + np.ix_(ins_slots, *slots)]
+    market = market[(slice(None),) + np.ix_(*slots)]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        market_rate = 1 - market[m["switchers"]] / market[m["base"]]
+    market_rate = np.broadcast_to(market_rate, cells.shape[1:])
+    codes = np.indices(cells.shape[1:])
+    all_demographics = np.logical_and.reduce([codes[k + 1] == len(s) - 1 for k, s in enumerate(slots)])
+    keep = (cells[m["base"]] > 0) & (market[m["base"]] > 0) & ~all_demographics
+    if not keep.any():
+        return pd.DataFrame()
+    # Exact beta.ppf CIs, as the live fallback (bayesian_smooth_rate), so cached and live values agree
+    bay = bayesian_smooth_rates(cells[m["retained"]][keep], cells[m["base"]][keep], market_rate[keep], exact=True)
+    out = {
+        "insurer": np.asarray(insurers, dtype=object)[np.asarray(ins_slots)[codes[0][keep]]],
+        "product": product,
+        "time_window_months": time_window_months,
+    }
+    for k, (col, labels) in enumerate(zip(CELL_COLUMNS, dims)):
+        out[col] = np.asarray([str(v) for v in labels] + [ALL], dtype=object)[codes[k + 1][keep]]
+    out.update({
+        "n": cells[m["base"]][keep],
+        "raw_rate": bay["raw_rate"],
+        "posterior_mean": bay["posterior_mean"],
+        "ci_lower": bay["ci_lower"],
+        "ci_upper": bay["ci_upper"],
+        "market_rate": market_rate[keep],
+    })
+    return pd.DataFrame(out)
+
+
+def precompute_rates(df: pd.DataFrame, product: str, time_window_months: int = 24) -> pd.DataFrame:
+    """All cache rows for one product × window: per insurer, then per demographic cell."""
+    parts = [
+        precompute_retention_rates(df, product, time_window_months),
+        precompute_cell_rates(df, product, time_window_months),
+    ]
+    parts = [p for p in parts if len(p) > 0]
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+
+def smoothed_retention_by_insurer(
+    df_market: pd.DataFrame,
+    market_rate: float,
+    insurers: list[str] | None = None,
+    min_base: int = 0,
+    exact: bool = False,
+) -> pd.DataFrame:
+    """
+    Bayesian-smoothed retention for every insurer in df_market: counts from one groupby,
+    then one batched smoothing call. insurers restricts/orders the result; insurers with
+    fewer than min_base rows (new-to-market included) are dropped. exact=True computes the
+    CIs with beta.ppf (as bayesian_smooth_rate) instead of the normal approximation.
+    Columns: insurer, n_all, n (excl. new-to-market), retained, raw_rate, posterior_mean, ci_lower, ci_upper.
+    """
+    counts = calc_counts_by_insurer(df_market)
+    if insurers is not None:
+        counts = counts.reindex(insurers, fill_value=0)
+    counts = counts[(counts["n"] >= min_base) & (counts["n"] > 0)]
+    bay = bayesian_smooth_rates(counts["retained"].to_numpy(), counts["base"].to_numpy(), market_rate, exact=exact)
+    return pd.DataFrame({
+        "insurer": counts.index.astype(object),
+        "n_all": counts["n"].to_numpy(),
+        "n": counts["base"].to_numpy(),
+        "retained": counts["retained"].to_numpy(),
+        "raw_rate": bay["raw_rate"],
+        "posterior_mean": bay["posterior_mean"],
+        "ci_lower": bay["ci_lower"],
+        "ci_upper": bay["ci_upper"],
+    })
 
 
 def run_precompute(df_motor: pd.DataFrame, df_home: pd.DataFrame | None = None) -> Path | None:
@@ -61,45 +160,149 @@ def run_precompute(df_motor: pd.DataFrame, df_home: pd.DataFrame | None = None)
     for product, df in [("Motor", df_motor), ("Home", df_home)]:
         if df is None or len(df) == 0:
             continue
-        for tw in (6, 12, 24):
-            rows = precompute_retention_rates(df, product, tw)
-            if len(rows) > 0:
-                all_rows.append(rows)
+        for tw in TIME_WINDOWS:
+            all_rows.append(precompute_rates(df, product, tw))
+    return save_precompute(all_rows)
 
-    if not all_rows:
-        return None
 
-    cache_df = pd.concat(all_rows, ignore_index=True)
+def save_precompute(parts: list[pd.DataFrame]) -> Path | None:
+    """Concatenate pre-computed rows (e.g. one frame per product × window) and write the cache."""
+    parts = [p for p in parts if p is not None and len(p) > 0]
+    if not parts:
+        return None
+    cache_df = _with_cells(pd.concat(parts, ignore_index=True))
     _CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=_CACHE_PATH.parent, prefix=_CACHE_PATH.name + ".", suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)  # own temp file per writer
     try:
-        cache_df.to_parquet(_CACHE_PATH, index=False)
-        return _CACHE_PATH
+        cache_df.to_parquet(tmp, index=False)
+        os.replace(tmp, _CACHE_PATH)  # atomic, so readers never see a partial file
     except ImportError:
         return None
+    finally:
+        tmp.unlink(missing_ok=True)
+    return _CACHE_PATH
 
 
-def get_cached_rate(insurer: str, product: str, time_window_months: int) -> dict | None:
+def affected_windows(changed_months: list[int], max_ym: int | None, windows: tuple = TIME_WINDOWS) -> list[int]:
+    """Time windows (ending at max_ym) that include at least one changed month."""
+    if not changed_months or max_ym is None or pd.isna(max_ym):
+        return []
+    return [tw for tw in windows if any(m >= window_start(max_ym, tw) for m in changed_months)]
+
+
+def update_precompute(df: pd.DataFrame, product: str, windows: list[int]) -> Path | None:
     """
-    Look up pre-computed Bayesian result. Returns None if not in cache.
+    Incremental cache update: recompute only (product, window) rows and keep every
+    other row of the existing cache. Returns path or None if failed.
     """
-    if not _CACHE_PATH.exists():
-        return None
+    if not windows:
+        return _CACHE_PATH if _CACHE_PATH.exists() else None
+    existing = None
+    if _CACHE_PATH.exists():
+        try:
+            existing = pd.read_parquet(_CACHE_PATH)
+        except Exception:
+            existing = None
+    parts = []
+    if existing is not None and len(existing) > 0:
+        stale = (existing["product"] == product) & existing["time_window_months"].isin(windows)
+        parts.append(existing[~stale])
+    if df is not None and len(df) > 0:
+        for tw in windows:
+            parts.append(precompute_rates(df, product, tw))
+    return save_precompute(parts)
+
+
+def _with_cells(cache: pd.DataFrame) -> pd.DataFrame:
+    """Fill the demographic columns with ALL (rows from caches written before they existed)."""
+    for col in CELL_COLUMNS:
+        cache[col] = cache[col].fillna(ALL).astype(str) if col in cache else ALL
+    return cache
+
+
+class RateIndex:
+    """
+    Lookup index over the cache columns: each key column is dictionary-encoded and the rows
+    sorted by their combined code, so a lookup is a binary search over one int64 array.
+    """
+
+    KEY_COLUMNS = ("insurer", "product", "time_window_months", *CELL_COLUMNS)
+    VALUE_COLUMNS = ("posterior_mean", "ci_lower", "ci_upper", "raw_rate", "n")
+
+    def __init__(self, cache: pd.DataFrame):
+        cache = _with_cells(cache.copy())
+        cache["time_window_months"] = cache["time_window_months"].astype(int)
+        codes, self._codes = [], []
+        for col in self.KEY_COLUMNS:
+            col_codes, uniques = pd.factorize(cache[col])
+            codes.append(col_codes)
+            self._codes.append({v: i for i, v in enumerate(uniques)})
+        self._shape = tuple(max(len(c), 1) for c in self._codes)
+        keys = np.ravel_multi_index(codes, self._shape) if len(cache) else np.empty(0, dtype=np.int64)
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._values = {col: cache[col].to_numpy()[order] for col in self.VALUE_COLUMNS}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, key: tuple, default=None):
+        """Result dict for (insurer, product, time_window_months, age_band, region, payment_type)."""
+        codes = [c.get(v) for c, v in zip(self._codes, key)]
+        if len(codes) != len(self._shape) or None in codes:
+            return default
+        code = np.ravel_multi_index(codes, self._shape)
+        pos = int(np.searchsorted(self._keys, code))
+        if pos == len(self._keys) or self._keys[pos] != code:
+            return default
+        result = {col: self._values[col][pos] for col in self.VALUE_COLUMNS}
+        result = {col: v.item() if isinstance(v, np.generic) else v for col, v in result.items()}
+        result["n"] = int(result["n"])
+        return result
+
+
+# In-process index of the cache file: (mtime_ns, size) it was loaded from and the rows
+_index_lock = threading.Lock()
+_index: dict = {"stamp": None, "rates": {}}
+
+
+def _cache_stamp() -> tuple | None:
+    """(mtime_ns, size) of the cache file, or None if it does not exist."""
     try:
-        cache = pd.read_parquet(_CACHE_PATH)
-    except Exception:
-        return None
-    match = cache[
-        (cache["insurer"] == insurer)
-        & (cache["product"] == product)
-        & (cache["time_window_months"] == time_window_months)
-    ]
-    if len(match) == 0:
+        st = _CACHE_PATH.stat()
+    except OSError:
         return None
-    row = match.iloc[0]
-    return {
-        "posterior_mean": row["posterior_mean"],
-        "ci_lower": row["ci_lower"],
-        "ci_upper": row["ci_upper"],
-        "raw_rate": row["raw_rate"],
-        "n": int(row["n"]),
-    }
+    return (st.st_mtime_ns, st.st_size)
+
+
+def cached_rates() -> RateIndex | dict:
+    """The indexed cache, (re)loaded when the file changed since the last call; {} if unavailable."""
+    stamp = _cache_stamp()
+    if stamp is None:
+        return {}
+    if stamp != _index["stamp"]:
+        with _index_lock:
+            if stamp != _index["stamp"]:
+                try:
+                    rates = RateIndex(pd.read_parquet(_CACHE_PATH))
+                except Exception:
+                    return {}
+                _index["rates"], _index["stamp"] = rates, stamp
+    return _index["rates"]
+
+
+def get_cached_rate(
+    insurer: str,
+    product: str,
+    time_window_months: int,
+    age_band: str | None = None,
+    region: str | None = None,
+    payment_type: str | None = None,
+) -> dict | None:
+    """
+    Look up pre-computed Bayesian result for the insurer and demographic filters
+    (None = all). Returns None if not in cache.
+    """
+    key = (insurer, product, int(time_window_months), age_band or ALL, region or ALL, payment_type or ALL)
+    return cached_rates().get(key)
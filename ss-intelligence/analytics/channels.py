@@ -1,25 +1,162 @@
 """
 Channel and PCW analysis.
+
+The multi-code blocks (Q9b* channels, Q11_* PCWs) are also held as one bit-packed uint8
+respondent × code matrix per dataset (CodeMatrix, built once at load). Usage shares for
+every code, for the insurer and the market, are one masked popcount over its columns, and
+co-usage ("used both X and Y") is the same per pair of columns. The PCW scorecard (NPS and
+purchase rate for every PCW) crosses the Q11_* matrix with packed Q11d/Q36 flags the same
+way, once per filter slice.
 """
+import numpy as np
 import pandas as pd
 
+from analytics.filter_index import ROW_CACHE, filter_key, filtered_rows, get_filter_index
+from analytics.rates import wilson_interval
+from config import Z_SCORE
+
+# Columns this module reads (registered in analytics.columns; "*" = multi-code prefix)
+REQUIRED_COLUMNS = ("IsShopper",)
+OPTIONAL_COLUMNS = ("UsedPCW", "Q9b*", "Q11_*", "Q11d", "Q13a", "Q13b", "Q36", "Q37")
+
+# Multi-code blocks held as code matrices: prefix -> respondents the shares are of
+CHANNEL_PREFIX, PCW_PREFIX = "Q9b", "Q11_"
+MULTI_CODE_BLOCKS = {CHANNEL_PREFIX: "IsShopper", PCW_PREFIX: "UsedPCW"}
+
+
+# Set bits per byte (np.bitwise_count needs numpy 2)
+_POPCOUNT = np.array([bin(b).count("1") for b in range(256)], dtype=np.uint8)
+_popcount = getattr(np, "bitwise_count", lambda a: _POPCOUNT[a])
+
+
+class CodeMatrix:
+    """
+    Respondent × code 0/1 matrix for one multi-code block, bit-packed along respondents:
+    bits[i // 8, j] holds row i's flag for codes[j] (uint8, C-contiguous, 1 bit per cell).
+    Counts over a set of rows are an AND with the packed row mask plus a popcount.
+    """
+
+    def __init__(self, codes: list[str], bits: np.ndarray, n: int):
+        self.codes = codes
+        self.bits = bits
+        self.n = n
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, prefix: str) -> "CodeMatrix | None":
+        """From the prefix* columns of df (any value > 0 counts as used); None if there are none."""
+        codes = [c for c in df.columns if c.startswith(prefix)]
+        if not codes:
+            return None
+        used = np.empty((len(df), len(codes)), dtype=bool)
+        for j, col in enumerate(codes):
+            used[:, j] = pd.to_numeric(df[col], errors="coerce").fillna(0).to_numpy() > 0
+        return cls(codes, np.ascontiguousarray(np.packbits(used, axis=0)), len(df))
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def _masked(self, where) -> np.ndarray:
+        """bits restricted to the rows where is True (all rows if None)."""
+        if where is None:
+            return self.bits
+        return self.bits & np.packbits(where)[:, None]
+
+    def counts(self, where=None) -> np.ndarray:
+        """Respondents using each code, over the rows where is True (bool array of length n)."""
+        return _popcount(self._masked(where)).sum(axis=0, dtype=np.int64)
+
+    def cross_counts(self, flags: np.ndarray, where=None) -> np.ndarray:
+        """
+        flag × code counts of respondents with both, for per-row flags packed the same way
+        (n/8 × m uint8, e.g. another matrix's bits), over the rows where is True.
+        """
+        bits = self._masked(where)
+        return np.stack([_popcount(bits & flags[:, [i]]).sum(axis=0, dtype=np.int64) for i in range(flags.shape[1])])
+
+    def co_usage(self, where=None) -> pd.DataFrame:
+        """code × code counts of respondents who used both (the diagonal is counts())."""
+        return pd.DataFrame(self.cross_counts(self.bits, where), index=self.codes, columns=self.codes)
+
+
+def code_matrix(df: pd.DataFrame, prefix: str) -> CodeMatrix | None:
+    """CodeMatrix for a block of an indexed dataset, built on first use and kept with its filter index."""
+    derived = get_filter_index(df).derived
+    key = ("codes", prefix)
+    if key not in derived:
+        derived[key] = CodeMatrix.from_frame(df, prefix)
+    return derived[key]
+
+
+def _selection_codes(selection, prefix: str):
+    """
+    The block's matrix for a MarketSelection and a function mapping a bool mask over the
+    market rows to the matrix's rows (the dataset's, when the selection has one).
+    """
+    if selection.dataset is None:
+        return CodeMatrix.from_frame(selection.market, prefix), lambda where: where
+    matrix = code_matrix(selection.dataset, prefix)
+
+    def to_dataset(where):
+        full = np.zeros(matrix.n, dtype=bool)
+        full[selection.rows] = where
+        return full
+
+    return matrix, to_dataset
+
+
+def _usage_base(market: pd.DataFrame, prefix: str) -> np.ndarray:
+    """Market rows the block's shares are of (shoppers for channels, PCW users for PCWs)."""
+    col = MULTI_CODE_BLOCKS[prefix]
+    if col not in market.columns:
+        return np.zeros(len(market), dtype=bool)
+    return market[col].to_numpy(dtype=bool, na_value=False)
+
+
+def calc_code_usage_pair(selection, prefix: str) -> tuple[pd.Series | None, pd.Series | None]:
+    """
+    (insurer, market) share of the block's base using each code, descending, for a
+    MarketSelection: calc_channel_usage (prefix Q9b) / calc_pcw_usage (Q11_) without the
+    per-column loop.
+    """
+    matrix, to_rows = _selection_codes(selection, prefix) if selection.market_n else (None, None)
+    if matrix is None:
+        return None, None
+    base = _usage_base(selection.market, prefix)
+    out = []
+    for where in (base & selection.insurer_mask, base):
+        n = int(where.sum())
+        out.append(pd.Series(matrix.counts(to_rows(where)) / n, index=matrix.codes).sort_values(ascending=False) if n else None)
+    insurer, market = out
+    return (insurer if selection.insurer else None), market
+
+
+def calc_co_usage(selection, prefix: str = CHANNEL_PREFIX, insurer: bool = False) -> tuple[pd.DataFrame, int] | None:
+    """
+    Co-usage for a MarketSelection: (code × code counts of the block's base who used both,
+    base size), for the insurer's rows if insurer else the market. None if unavailable.
+    """
+    matrix, to_rows = _selection_codes(selection, prefix) if selection.market_n else (None, None)
+    if matrix is None:
+        return None
+    where = _usage_base(selection.market, prefix)
+    if insurer:
+        where = where & selection.insurer_mask
+    return matrix.co_usage(to_rows(where)), int(where.sum())
+
 
 def calc_channel_usage(df: pd.DataFrame) -> pd.Series | None:
     """Percentage of shoppers using each channel (Q9b). Multi-code so can exceed 100%."""
     if df is None or len(df) == 0:
         return None
-    shoppers = df[df["IsShopper"]]
-    if len(shoppers) == 0:
+    shoppers = _usage_base(df, CHANNEL_PREFIX)
+    if not shoppers.any():
         return None
     # Q9b_1, Q9b_2, Q9b_3, etc. - columns with channel codes
-    channel_cols = [c for c in df.columns if c.startswith("Q9b")]
-    if not channel_cols:
+    matrix = CodeMatrix.from_frame(df, CHANNEL_PREFIX)
+    if matrix is None:
         return None
-    usage = {}
-    for col in channel_cols:
-        used = shoppers[col].fillna(0).astype(int).sum()
-        usage[col] = used / len(shoppers)
-    return pd.Series(usage).sort_values(ascending=False)
+    return pd.Series(matrix.counts(shoppers) / shoppers.sum(), index=matrix.codes).sort_values(ascending=False)
 
 
 def calc_channel_first_used(df: pd.DataFrame) -> pd.Series | None:
@@ -29,25 +166,22 @@ def calc_channel_first_used(df: pd.DataFrame) -> pd.Series | None:
     shoppers = df[df["IsShopper"]]
     if len(shoppers) == 0:
         return None
-    # Q13a may contain channel code; value_counts gives distribution
-    return shoppers["Q13a"].value_counts(normalize=True)
+    # Q13a may contain channel code; value_counts gives distribution (drop unused categories)
+    dist = shoppers["Q13a"].value_counts(normalize=True)
+    return dist[dist > 0]
 
 
 def calc_pcw_usage(df: pd.DataFrame) -> pd.Series | None:
     """Percentage of PCW users who used each PCW (Q11)."""
     if df is None or len(df) == 0:
         return None
-    pcw_users = df[df.get("UsedPCW", False)]
-    if len(pcw_users) == 0:
+    pcw_users = _usage_base(df, PCW_PREFIX)
+    if not pcw_users.any():
         return None
-    pcw_cols = [c for c in df.columns if c.startswith("Q11_")]
-    if not pcw_cols:
+    matrix = CodeMatrix.from_frame(df, PCW_PREFIX)
+    if matrix is None:
         return None
-    usage = {}
-    for col in pcw_cols:
-        used = pcw_users[col].fillna(0).astype(int).sum()
-        usage[col] = used / len(pcw_users) if len(pcw_users) > 0 else 0
-    return pd.Series(usage).sort_values(ascending=False)
+    return pd.Series(matrix.counts(pcw_users) / pcw_users.sum(), index=matrix.codes).sort_values(ascending=False)
 
 
 def calc_pcw_nps(df: pd.DataFrame, pcw: str) -> float | None:
@@ -80,6 +214,100 @@ def calc_pcw_purchase_rate(df: pd.DataFrame, pcw: str) -> float | None:
     return len(purchased) / len(users)
 
 
+def _scorecard_flags(df: pd.DataFrame) -> np.ndarray:
+    """Packed per-row promoter (Q11d >= 9), detractor (Q11d <= 6) and purchased (Q36 = 1) flags."""
+    flags = np.zeros((len(df), 3), dtype=bool)
+    if "Q11d" in df.columns:
+        nps = pd.to_numeric(df["Q11d"], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        flags[:, 0] = nps >= 9
+        flags[:, 1] = nps <= 6
+    if "Q36" in df.columns:
+        flags[:, 2] = (pd.to_numeric(df["Q36"], errors="coerce") == 1).to_numpy(dtype=bool, na_value=False)
+    return np.ascontiguousarray(np.packbits(flags, axis=0))
+
+
+def _scorecard_counts(matrix: CodeMatrix, flags: np.ndarray, where=None) -> np.ndarray:
+    """(users, promoters, detractors, purchased) × PCW code counts in one pass over the packed block."""
+    return np.vstack([matrix.counts(where), matrix.cross_counts(flags, where)])
+
+
+def _scorecard_table(codes: list[str], counts: np.ndarray, has_nps: bool, has_purchase: bool) -> pd.DataFrame | None:
+    """
+    Scorecard from _scorecard_counts: one row per PCW with users (n > 0), largest base first.
+    NPS is -100..100 over the PCW's users (as calc_pcw_nps) with a normal-approximation CI on
+    the mean promoter (+1) / detractor (-1) score; purchase rate has a Wilson CI.
+    """
+    n, promoters, detractors, purchased = counts
+    keep = n > 0
+    if not keep.any():
+        return None
+    n, promoters, detractors, purchased = n[keep], promoters[keep], detractors[keep], purchased[keep]
+    table = pd.DataFrame({"n": n}, index=pd.Index(np.asarray(codes)[keep], name="pcw"))
+    if has_nps:
+        p_pro, p_det = promoters / n, detractors / n
+        score = p_pro - p_det
+        margin = Z_SCORE * np.sqrt(np.maximum(p_pro + p_det - score**2, 0) / n)
+        table["nps"] = 100 * score
+        table["nps_ci_lower"] = 100 * np.maximum(score - margin, -1)
+        table["nps_ci_upper"] = 100 * np.minimum(score + margin, 1)
+    if has_purchase:
+        table["purchase_rate"] = purchased / n
+        table["purchase_ci_lower"], table["purchase_ci_upper"] = wilson_interval(purchased, n)
+    return table.sort_values("n", ascending=False, kind="stable")
+
+
+def calc_pcw_scorecard(df: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    NPS (Q11d), purchase rate (Q36) and base for every PCW in df (Q11_* block) with 95% CIs;
+    calc_pcw_nps / calc_pcw_purchase_rate for all PCWs at once. None if unavailable.
+    """
+    if df is None or len(df) == 0 or ("Q11d" not in df.columns and "Q36" not in df.columns):
+        return None
+    matrix = CodeMatrix.from_frame(df, PCW_PREFIX)
+    if matrix is None:
+        return None
+    counts = _scorecard_counts(matrix, _scorecard_flags(df))
+    return _scorecard_table(matrix.codes, counts, "Q11d" in df.columns, "Q36" in df.columns)
+
+
+def pcw_scorecard(
+    df: pd.DataFrame,
+    insurer: str | None = None,
+    age_band: str | None = None,
+    region: str | None = None,
+    payment_type: str | None = None,
+    product: str = "Motor",
+    time_window_months: int = 24,
+    start_month: int | str | None = None,
+    end_month: int | str | None = None,
+) -> pd.DataFrame | None:
+    """
+    calc_pcw_scorecard for a filter slice of an indexed dataset (apply_filters semantics). The
+    PCW matrix and Q11d/Q36 flags are built once per dataset; counts are cached per slice in
+    ROW_CACHE.
+    """
+    if df is None or len(df) == 0 or ("Q11d" not in df.columns and "Q36" not in df.columns):
+        return None
+    matrix = code_matrix(df, PCW_PREFIX)
+    if matrix is None:
+        return None
+    index = get_filter_index(df)
+    filters = dict(
+        insurer=insurer, age_band=age_band, region=region, payment_type=payment_type, product=product,
+        time_window_months=time_window_months, start_month=start_month, end_month=end_month,
+    )
+    key = (*filter_key(index, **filters), "pcw_scorecard")
+    counts = ROW_CACHE.get(key)
+    if counts is None:
+        if "pcw_flags" not in index.derived:
+            index.derived["pcw_flags"] = _scorecard_flags(df)
+        where = np.zeros(matrix.n, dtype=bool)
+        where[filtered_rows(df, **filters)] = True
+        counts = _scorecard_counts(matrix, index.derived["pcw_flags"], where)
+        ROW_CACHE.put(key, counts)
+    return _scorecard_table(matrix.codes, counts, "Q11d" in df.columns, "Q36" in df.columns)
+
+
 def calc_quote_buy_mismatch(df: pd.DataFrame) -> float | None:
     """Percentage where Q37=2 (quoted via one method, bought via another)."""
     if df is None or "Q37" not in df.columns:
@@ -91,6 +319,19 @@ def calc_quote_buy_mismatch(df: pd.DataFrame) -> float | None:
     return mismatch / len(valid)
 
 
+def calc_quote_buy_mismatch_pair(selection) -> tuple[float | None, float | None]:
+    """(insurer, market) calc_quote_buy_mismatch for a MarketSelection, from one pass over the market."""
+    market = selection.market
+    if selection.market_n == 0 or "Q37" not in market.columns:
+        return None, None
+    valid = market["Q37"].notna().to_numpy(dtype=bool)
+    mismatch = (pd.to_numeric(market["Q37"], errors="coerce") == 2).to_numpy(dtype=bool)
+    insurer_n, market_n = selection.split_sum(valid)
+    insurer_hits, market_hits = selection.split_sum(mismatch & valid)
+    insurer = insurer_hits / insurer_n if selection.insurer and insurer_n else None
+    return insurer, (market_hits / market_n if market_n else None)
+
+
 def calc_quote_reach(df: pd.DataFrame, insurer: str) -> int:
     """Count of shoppers who got a quote from this insurer (Q13b)."""
     if df is None or "Q13b" not in df.columns:
@@ -0,0 +1,71 @@
+"""
+Column projection registry. Each analytics module declares REQUIRED_COLUMNS (read without
+a presence check) and OPTIONAL_COLUMNS (used when present); "Q9b*" style entries are
+multi-code prefixes. The app loads only the union of these columns (plus the transform
+inputs they derive from) and fails fast at startup when a required column is missing.
+"""
+from importlib import import_module
+
+import pandas as pd
+
+from data.transforms import DERIVED_FROM
+
+# Modules whose declarations make up the app projection
+CONSUMER_MODULES = (
+    "analytics.demographics",
+    "analytics.rates",
+    "analytics.flows",
+    "analytics.channels",
+    "analytics.price",
+    "analytics.reasons",
+    "analytics.segments",
+    "data.dimensions",
+)
+
+# Row identity, always loaded
+BASE_COLUMNS = ("UniqueID", "Product", "RenewalYearMonth")
+
+
+class MissingColumnsError(ValueError):
+    """Required columns are missing from a dataset."""
+
+
+def declared_columns(modules: tuple = CONSUMER_MODULES) -> tuple[list[str], list[str]]:
+    """(required, optional) column names declared by modules, de-duplicated in declaration order."""
+    required, optional = [], []
+    for name in modules:
+        module = import_module(name)
+        required += getattr(module, "REQUIRED_COLUMNS", ())
+        optional += getattr(module, "OPTIONAL_COLUMNS", ())
+    required = list(dict.fromkeys(required))
+    optional = [c for c in dict.fromkeys(optional) if c not in required]
+    return required, optional
+
+
+def app_columns(modules: tuple = CONSUMER_MODULES) -> list[str]:
+    """Columns the app loads: base columns plus everything the modules declare."""
+    required, optional = declared_columns(modules)
+    return list(dict.fromkeys(list(BASE_COLUMNS) + required + optional))
+
+
+def missing_columns(df: pd.DataFrame, modules: tuple = CONSUMER_MODULES) -> list[str]:
+    """
+    Required columns df cannot serve. A derived column (IsShopper, PriceDirection, ...)
+    also needs one of its source columns, since transform fills a default when the source
+    is absent.
+    """
+    required, _ = declared_columns(modules)
+    missing = []
+    for col in required:
+        sources = DERIVED_FROM.get(col)
+        if col not in df.columns or (sources and not any(s in df.columns for s in sources)):
+            missing.append(col)
+    return missing
+
+
+def check_required_columns(df: pd.DataFrame, label: str = "dataset", modules: tuple = CONSUMER_MODULES) -> pd.DataFrame:
+    """Raise MissingColumnsError naming every missing required column; returns df otherwise."""
+    missing = missing_columns(df, modules)
+    if missing:
+        raise MissingColumnsError(f"{label} is missing required columns: {', '.join(missing)}")
+    return df
@@ -0,0 +1,393 @@
+"""
+Dense count cube for the rate KPIs, built at refresh time.
+Cells are Product × RenewalYearMonth × CurrentCompany × AgeBand × Region × PaymentType;
+each holds the rates.count_indicators sums (n, shoppers, base, switchers, retained,
+shopper_switchers) as the smallest unsigned integer type that fits. Shopping, switching,
+retention and conversion for any filter combination and time window come from slicing
+and summing cells. Every dimension has a trailing "missing" slot so unfiltered totals
+match the respondent-level functions.
+
+The cube also indexes the reason questions (REASON_QUESTIONS): each question's answers are
+dictionary-encoded and counted per (reason × cell), stored sparsely (non-zero cells only,
+in cell order, so a product and month range is one contiguous run). Rankings for any
+insurer and filter combination are bincounts over that run. Multi-coded questions
+(Q19_1, Q19_2, ... 0/1 columns) count every selected code and keep a per-cell count of
+respondents who answered, which is the percentage base.
+Stored per product in data/processed/cube/<product>.npz, with a fingerprint of the rows it
+was built from (source_fingerprint) so the app can tell whether it matches the loaded data.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from analytics.demographics import parse_year_month, window_start
+from analytics.rates import count_indicators, rates_from_counts
+from analytics.reasons import REASON_QUESTIONS, rank_counts
+
+CUBE_DIR = Path(__file__).resolve().parent.parent / "data" / "processed" / "cube"
+
+CUBE_DIMENSIONS = ("Product", "RenewalYearMonth", "CurrentCompany", "AgeBand", "Region", "PaymentType")
+CUBE_MEASURES = ("n", "shoppers", "base", "switchers", "retained", "shopper_switchers")
+# Filter argument -> dimension (as apply_filters)
+_FILTER_DIMENSIONS = {
+    "product": "Product",
+    "insurer": "CurrentCompany",
+    "age_band": "AgeBand",
+    "region": "Region",
+    "payment_type": "PaymentType",
+}
+
+
+def _labels_and_codes(series: pd.Series) -> tuple[list, np.ndarray]:
+    """Distinct values and per-row codes; missing values get code len(labels)."""
+    if series.name == "RenewalYearMonth":
+        values = series.to_numpy(dtype="float64", na_value=np.nan)
+        labels = np.unique(values[~np.isnan(values)])
+        codes = np.searchsorted(labels, values)  # NaN sorts past the end
+        return [int(m) for m in labels], codes
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, labels = series.cat.codes.to_numpy().astype(np.int64), list(series.cat.categories)
+    else:
+        codes, uniques = pd.factorize(series)
+        labels = list(uniques)
+    codes = np.where(codes < 0, len(labels), codes)
+    return labels, codes
+
+
+def _cell_codes(df: pd.DataFrame, dimensions: tuple) -> tuple[dict[str, list], np.ndarray, tuple]:
+    """Labels per dimension, each row's flat cell index and the cell shape (len(labels) + 1 slots per dimension)."""
+    labels, codes = {}, []
+    for dim in dimensions:
+        labels[dim], dim_codes = _labels_and_codes(df[dim])
+        codes.append(dim_codes)
+    shape = tuple(len(labels[dim]) + 1 for dim in dimensions)
+    return labels, np.ravel_multi_index(codes, shape), shape
+
+
+def count_cells(df: pd.DataFrame, dimensions: tuple = CUBE_DIMENSIONS) -> tuple[dict[str, list], np.ndarray]:
+    """
+    Labels per dimension and int64 counts of shape (len(CUBE_MEASURES), *slots), one pass of
+    bincounts; each dimension has len(labels) + 1 slots (the last for missing values).
+    """
+    labels, flat, shape = _cell_codes(df, dimensions)
+    size = int(np.prod(shape))
+    indicators = count_indicators(df)
+    counts = np.stack([np.bincount(flat[indicators[m]], minlength=size) for m in CUBE_MEASURES])
+    return labels, counts.reshape((len(CUBE_MEASURES),) + shape)
+
+
+def source_fingerprint(df: pd.DataFrame) -> dict[str, list[int]]:
+    """
+    Per RenewalYearMonth ("missing" for none): the CUBE_MEASURES sums (rows first), i.e. the
+    month's row count and rate counts. Identifies the rows a cube was built from.
+    """
+    if len(df) == 0:
+        return {}
+    months = df["RenewalYearMonth"].to_numpy(dtype="float64", na_value=np.nan)
+    keys, codes = np.unique(np.where(np.isnan(months), -1, months).astype(np.int64), return_inverse=True)
+    indicators = count_indicators(df)
+    sums = np.stack([np.bincount(codes[indicators[m]], minlength=len(keys)) for m in CUBE_MEASURES], axis=1)
+    return {(str(int(k)) if k >= 0 else "missing"): [int(v) for v in row] for k, row in zip(keys, sums)}
+
+
+def _small(values: np.ndarray) -> np.ndarray:
+    """values as the smallest unsigned integer type that holds them."""
+    return values.astype(np.min_scalar_type(int(values.max()) if values.size else 0))
+
+
+class ReasonCounts:
+    """
+    Sparse counts for one reason question: entries (cell, reason, count) sorted by cell.
+    Reason code len(reasons) counts respondents who answered (the percentage base).
+    """
+
+    def __init__(self, reasons: list[str], cell: np.ndarray, reason: np.ndarray, count: np.ndarray, multi: bool = False):
+        self.reasons = reasons
+        self.cell = cell
+        self.reason = reason
+        self.count = count
+        self.multi = multi
+        self._slots: list[np.ndarray] | None = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, question: str, flat: np.ndarray) -> "ReasonCounts | None":
+        """From the question column (or its question_* multi-code block); None if df has neither."""
+        if question in df.columns:
+            values = df[question]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                codes, reasons = values.cat.codes.to_numpy().astype(np.int64), [str(c) for c in values.cat.categories]
+            else:
+                codes, uniques = pd.factorize(values.astype(str).where(values.notna()))
+                reasons = [str(u) for u in uniques]
+            blank = np.array([r.strip() == "" for r in reasons] + [True])  # code -1 (missing) -> last
+            answered = ~blank[codes]
+            rows, selected, multi = np.flatnonzero(answered), codes[answered], False
+        else:
+            block = [c for c in df.columns if c.startswith(f"{question}_")]
+            if not block:
+                return None
+            chosen = np.column_stack([pd.to_numeric(df[c], errors="coerce").fillna(0).to_numpy() > 0 for c in block])
+            rows, selected = np.nonzero(chosen)
+            answered = chosen.any(axis=1)
+            reasons, multi = block, True
+        n_codes = len(reasons) + 1
+        keys = np.concatenate([
+            flat[rows].astype(np.int64) * n_codes + selected,
+            flat[answered].astype(np.int64) * n_codes + len(reasons),
+        ])
+        keys, counts = np.unique(keys, return_counts=True)
+        return cls(reasons, _small(keys // n_codes), _small(keys % n_codes), _small(counts), multi)
+
+    def slots(self, shape: tuple) -> list[np.ndarray]:
+        """Per-entry slot of every cube dimension (decoded from cell once, smallest dtype)."""
+        if self._slots is None:
+            self._slots = [_small(s) for s in np.unravel_index(self.cell, shape)]
+        return self._slots
+
+    @property
+    def nbytes(self) -> int:
+        decoded = sum(s.nbytes for s in self._slots) if self._slots is not None else 0
+        return self.cell.nbytes + self.reason.nbytes + self.count.nbytes + decoded
+
+
+class CountCube:
+    """
+    counts has shape (len(CUBE_MEASURES), *dimension sizes); each dimension has len(labels) + 1 slots.
+    reasons maps question -> ReasonCounts over the same cells; source is the
+    source_fingerprint of the frame it was built from (None for cubes written without one).
+    """
+
+    def __init__(
+        self,
+        labels: dict[str, list],
+        counts: np.ndarray,
+        reasons: dict[str, ReasonCounts] | None = None,
+        source: dict[str, list[int]] | None = None,
+    ):
+        self.labels = labels
+        self.counts = counts
+        self.reasons = reasons or {}
+        self.source = source
+        self._positions = {dim: {v: i for i, v in enumerate(vals)} for dim, vals in labels.items()}
+        months = np.asarray(labels["RenewalYearMonth"], dtype="int64")
+        has_rows = counts[0].sum(axis=(2, 3, 4, 5))[:, : len(months)] > 0  # product x month
+        self._max_month = {
+            p: int(months[np.flatnonzero(has_rows[i])[-1]]) if has_rows[i].any() else None
+            for i, p in enumerate(labels["Product"])
+        }
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CountCube":
+        """Build from a transformed survey frame (one pass of bincounts)."""
+        labels, counts = count_cells(df)
+        _, flat, _ = _cell_codes(df, CUBE_DIMENSIONS)
+        reasons = {q: ReasonCounts.from_frame(df, q, flat) for q in REASON_QUESTIONS}
+        return cls(labels, _small(counts), {q: r for q, r in reasons.items() if r is not None}, source_fingerprint(df))
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.nbytes + sum(r.nbytes for r in self.reasons.values())
+
+    def matches(self, df: pd.DataFrame) -> bool:
+        """
+        True if the cube was built from the same rows as df for every month df holds, and has
+        no later month (df may hold only the app's recent history). False without a fingerprint.
+        """
+        if self.source is None:
+            return False
+        frame = source_fingerprint(df)
+        if any(self.source.get(month) != value for month, value in frame.items()):
+            return False
+        latest = max((int(m) for m in frame if m != "missing"), default=None)
+        return latest is None or all(m == "missing" or int(m) <= latest for m in self.source)
+
+    def _month_selection(self, product, time_window_months, start_month, end_month) -> list | None:
+        """Month slots kept (None = every slot, including missing months)."""
+        months = np.asarray(self.labels["RenewalYearMonth"], dtype="int64")
+        start_month, end_month = parse_year_month(start_month), parse_year_month(end_month)
+        if start_month or end_month:
+            keep = (months >= (start_month or 0)) & (months <= (end_month or np.iinfo(np.int64).max))
+        elif time_window_months and time_window_months > 0 and self._max_month.get(product) is not None:
+            keep = months >= window_start(self._max_month[product], time_window_months)
+        else:
+            return None
+        return list(np.flatnonzero(keep))
+
+    def _selections(self, product, time_window_months, start_month, end_month, **values) -> list:
+        """Per dimension: list of slots to keep, or None for all."""
+        filters = {"product": product, **values}
+        selections = []
+        for dim in CUBE_DIMENSIONS:
+            if dim == "RenewalYearMonth":
+                selections.append(self._month_selection(product, time_window_months, start_month, end_month))
+                continue
+            arg = next(a for a, d in _FILTER_DIMENSIONS.items() if d == dim)
+            value = filters.get(arg)
+            if arg != "product" and not value:
+                selections.append(None)
+                continue
+            pos = self._positions[dim].get(value)
+            selections.append([pos] if pos is not None else [])
+        return selections
+
+    def query(
+        self,
+        insurer: str | None = None,
+        age_band: str | None = None,
+        region: str | None = None,
+        payment_type: str | None = None,
+        product: str = "Motor",
+        time_window_months: int = 24,
+        start_month: int | str | None = None,
+        end_month: int | str | None = None,
+        by: str | None = None,
+    ):
+        """
+        Summed counts for the filters (same semantics as apply_filters): a dict of
+        CUBE_MEASURES, or with by=<dimension> a DataFrame of counts per label of that dimension.
+        """
+        selections = self._selections(
+            product, time_window_months, start_month, end_month,
+            insurer=insurer, age_band=age_band, region=region, payment_type=payment_type,
+        )
+        arr = self.counts
+        for axis, sel in enumerate(selections, start=1):
+            if sel is not None:
+                arr = arr.take(sel, axis=axis)
+        keep = CUBE_DIMENSIONS.index(by) + 1 if by else None
+        axes = tuple(a for a in range(1, arr.ndim) if a != keep)
+        totals = arr.sum(axis=axes, dtype=np.int64)
+        if by is None:
+            return {m: int(v) for m, v in zip(CUBE_MEASURES, totals)}
+        slots = selections[keep - 1]
+        slots = range(len(self.labels[by]) + 1) if slots is None else slots
+        index = [self.labels[by][s] if s < len(self.labels[by]) else None for s in slots]
+        out = pd.DataFrame(totals.T, index=pd.Index(index, name=by), columns=list(CUBE_MEASURES))
+        return out[out["n"] > 0]
+
+    def rates(self, **filters) -> dict:
+        """rates_from_counts for the filters, plus "counts"."""
+        counts = self.query(**filters)
+        return {**rates_from_counts(counts), "counts": counts}
+
+    def _filter_selections(
+        self, product="Motor", time_window_months=24, start_month=None, end_month=None, **values
+    ) -> list:
+        """_selections with query's defaults."""
+        return self._selections(product, time_window_months, start_month, end_month, **values)
+
+    def _reason_totals(self, question: str, selections: list, split: int | None = None) -> tuple:
+        """
+        Reason counts (length len(reasons) + 1, last = answered) summed over the selected
+        cells, and the same for the cells whose insurer slot is split (None if not given).
+        """
+        rc = self.reasons[question]
+        shape = self.counts.shape[1:]
+        strides = np.cumprod((shape[1:] + (1,))[::-1])[::-1]
+        size = len(rc.reasons) + 1
+        empty = np.zeros(size, dtype=np.int64)
+        products, months = selections[0], selections[1]
+        if not products or months == []:
+            return empty, (empty if split is not None else None)
+        first, last = (0, shape[1] - 1) if months is None else (months[0], months[-1])  # months are contiguous
+        lo, hi = np.searchsorted(
+            rc.cell, [products[0] * strides[0] + first * strides[1], products[0] * strides[0] + (last + 1) * strides[1]]
+        )
+        slots = rc.slots(shape)
+        reason, count = rc.reason[lo:hi], rc.count[lo:hi]
+        keep = np.ones(hi - lo, dtype=bool)
+        for axis in range(2, len(shape)):
+            if selections[axis] is not None:  # one slot, or none for an unknown value
+                keep &= slots[axis][lo:hi] == (selections[axis][0] if selections[axis] else -1)
+        market = np.bincount(reason[keep], weights=count[keep], minlength=size).astype(np.int64)
+        if split is None:
+            return market, None
+        keep &= slots[2][lo:hi] == split
+        return market, np.bincount(reason[keep], weights=count[keep], minlength=size).astype(np.int64)
+
+    def _reason_ranking(self, question: str, totals: np.ndarray, top_n: int) -> list[dict] | None:
+        reasons = self.reasons[question].reasons
+        return rank_counts(pd.Series(totals[:-1], index=reasons), top_n, base=int(totals[-1]))
+
+    def reason_ranking(self, question: str, top_n: int = 5, **filters) -> list[dict] | None:
+        """calc_reason_ranking for the filters (as query), from the reason index."""
+        if question not in self.reasons:
+            return None
+        totals, _ = self._reason_totals(question, self._filter_selections(**filters))
+        return self._reason_ranking(question, totals, top_n)
+
+    def reason_comparison(self, question: str, insurer: str | None = None, top_n: int = 5, **filters) -> dict | None:
+        """
+        calc_reason_comparison_pair for the market filters (as query, without insurer):
+        {"insurer": [...], "market": [...]}, both from one pass over the reason index.
+        """
+        if question not in self.reasons:
+            return None
+        split = self._positions["CurrentCompany"].get(insurer, -1) if insurer else None
+        market, ins = self._reason_totals(question, self._filter_selections(**filters), split)
+        market_rank = self._reason_ranking(question, market, top_n)
+        insurer_rank = self._reason_ranking(question, ins, top_n) if ins is not None else None
+        if insurer_rank is None and market_rank is None:
+            return None
+        return {"insurer": insurer_rank or [], "market": market_rank or []}
+
+    def save(self, path: Path) -> Path:
+        """Write as an uncompressed .npz (counts, reason entries + JSON labels), atomically."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False) as f:
+            tmp = Path(f.name)  # own temp file per writer
+        arrays = {}
+        for q, rc in self.reasons.items():
+            arrays.update({f"reason_{q}_cell": rc.cell, f"reason_{q}_reason": rc.reason, f"reason_{q}_count": rc.count})
+        reasons = {q: {"reasons": rc.reasons, "multi": rc.multi} for q, rc in self.reasons.items()}
+        try:
+            with open(tmp, "wb") as out:  # a file object, so savez does not append ".npz"
+                np.savez(
+                    out,
+                    counts=self.counts,
+                    labels=np.array(json.dumps(self.labels, default=str)),
+                    reasons=np.array(json.dumps(reasons)),
+                    **({"source": np.array(json.dumps(self.source))} if self.source is not None else {}),
+                    **arrays,
+                )
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "CountCube":
+        with np.load(path, allow_pickle=False) as data:
+            reasons = {}
+            if "reasons" in data.files:  # cubes written before the reason index have none
+                for q, meta in json.loads(str(data["reasons"])).items():
+                    arrays = (data[f"reason_{q}_{part}"] for part in ("cell", "reason", "count"))
+                    reasons[q] = ReasonCounts(meta["reasons"], *arrays, multi=meta["multi"])
+            source = json.loads(str(data["source"])) if "source" in data.files else None
+            return cls(json.loads(str(data["labels"])), data["counts"], reasons, source)
+
+
+def cube_path(product: str, cube_dir: Path = CUBE_DIR) -> Path:
+    """Cube file for one product."""
+    return Path(cube_dir) / f"{product.lower()}.npz"
+
+
+def save_cube(df: pd.DataFrame, product: str, cube_dir: Path = CUBE_DIR) -> Path:
+    """Build the cube for product's rows of df and write it. Returns the path."""
+    return CountCube.from_frame(df[df["Product"] == product]).save(cube_path(product, cube_dir))
+
+
+def load_cube(product: str, cube_dir: Path = CUBE_DIR) -> CountCube | None:
+    """Cube for product, or None if the refresh has not written one."""
+    path = cube_path(product, cube_dir)
+    if not path.exists():
+        return None
+    try:
+        return CountCube.load(path)
+    except (OSError, ValueError, KeyError):
+        return None
@@ -1,8 +1,16 @@
 """
 Demographic filtering and active filter detection.
 """
+from dataclasses import dataclass
+from functools import cached_property
+
+import numpy as np
 import pandas as pd
 
+# Columns this module reads (registered in analytics.columns; "*" = multi-code prefix)
+REQUIRED_COLUMNS = ("Product", "RenewalYearMonth", "CurrentCompany")
+OPTIONAL_COLUMNS = ("AgeBand", "Region", "PaymentType")
+
 
 def apply_filters(
     df: pd.DataFrame,
@@ -12,33 +20,37 @@ def apply_filters(
     payment_type: str | None = None,
     product: str = "Motor",
     time_window_months: int = 24,
+    start_month: int | str | None = None,
+    end_month: int | str | None = None,
 ) -> pd.DataFrame:
     """
     Filter DataFrame by demographics. insurer=None means market (no insurer filter).
+    The time window ends at the product's latest RenewalYearMonth; start_month/end_month
+    (YYYYMM or "YYYY-MM", either may be open) select a custom range instead.
+    Uses the dataset's bitmap index (analytics.filter_index): one take of the matching
+    rows, no full copy; on a month-sorted dataset a time-only filter is a zero-copy slice.
+    Row positions are cached per dataset and filter combination.
     """
     if df is None or len(df) == 0:
         return df
-    filtered = df.copy()
-    filtered = filtered[filtered["Product"] == product]
-    filtered = _apply_time_window(filtered, time_window_months)
-    if age_band:
-        filtered = filtered[filtered["AgeBand"] == age_band]
-    if region:
-        filtered = filtered[filtered["Region"] == region]
-    if payment_type:
-        filtered = filtered[filtered["PaymentType"] == payment_type]
-    if insurer:
-        filtered = filtered[filtered["CurrentCompany"] == insurer]
-    return filtered
+    from analytics.filter_index import filtered_rows
 
+    rows = filtered_rows(
+        df,
+        insurer=insurer,
+        age_band=age_band,
+        region=region,
+        payment_type=payment_type,
+        product=product,
+        time_window_months=time_window_months,
+        start_month=start_month,
+        end_month=end_month,
+    )
+    return df.iloc[rows]
 
-def _apply_time_window(df: pd.DataFrame, months: int) -> pd.DataFrame:
-    """Keep only rows within the last N months of RenewalYearMonth."""
-    if "RenewalYearMonth" not in df.columns or months <= 0:
-        return df
-    max_ym = df["RenewalYearMonth"].max()
-    if pd.isna(max_ym):
-        return df
+
+def window_start(max_ym: int, months: int) -> int:
+    """Earliest YYYYMM kept by an N-month time window ending at max_ym."""
     # Convert YYYYMM to months-since-epoch for comparison
     max_year = int(max_ym // 100)
     max_month = int(max_ym % 100)
@@ -47,8 +59,112 @@ def _apply_time_window(df: pd.DataFrame, months: int) -> pd.DataFrame:
     if min_month <= 0:
         min_month += 12
         min_year -= 1
-    min_ym = min_year * 100 + min_month
-    return df[df["RenewalYearMonth"] >= min_ym]
+    return min_year * 100 + min_month
+
+
+@dataclass
+class MarketSelection:
+    """
+    Market rows for one set of filters plus a boolean mask of the insurer's rows within them
+    (all False for a market-only view). The *_pair functions in rates, reasons, channels and
+    price take it and return (insurer, market) values computed in one pass over the market.
+    """
+    market: pd.DataFrame
+    insurer_mask: np.ndarray
+    insurer: str | None = None
+    # The indexed dataset and market's row positions in it (for per-dataset structures)
+    dataset: pd.DataFrame | None = None
+    rows: np.ndarray | slice | None = None
+
+    @property
+    def market_n(self) -> int:
+        return len(self.market)
+
+    @cached_property
+    def insurer_n(self) -> int:
+        return int(self.insurer_mask.sum())
+
+    @cached_property
+    def insurer_frame(self) -> pd.DataFrame:
+        """The insurer's rows as a frame (for functions without a pair variant)."""
+        return self.market[self.insurer_mask]
+
+    def split_sum(self, values, where=None) -> tuple[float, float]:
+        """(insurer, market) totals of a bool/numeric array aligned with market rows."""
+        values = np.asarray(values, dtype="float64")
+        mask = self.insurer_mask
+        if where is not None:
+            values, mask = values[where], mask[where]
+        per_group = np.bincount(mask.view(np.uint8), weights=values, minlength=2)
+        return float(per_group[1]), float(per_group.sum())
+
+    def split_value_counts(self, series: pd.Series, where=None) -> tuple[pd.Series, pd.Series]:
+        """(insurer, market) value_counts of a market column, descending, zero counts dropped."""
+        mask = self.insurer_mask
+        if where is not None:
+            series, mask = series[where], mask[where]
+        codes, uniques = pd.factorize(series)
+        valid = codes >= 0
+        index = pd.Index(uniques, name=series.name)
+        # Ties keep first-appearance order, as value_counts does
+        return self._counts(codes[valid & mask], index), self._counts(codes[valid], index)
+
+    @staticmethod
+    def _counts(codes: np.ndarray, index: pd.Index) -> pd.Series:
+        values, first, counts = np.unique(codes, return_index=True, return_counts=True)
+        order = np.argsort(first, kind="stable")
+        vc = pd.Series(counts[order], index=index[values[order]], name="count")
+        return vc.sort_values(ascending=False, kind="stable")
+
+
+def select_market(
+    df: pd.DataFrame,
+    insurer: str | None = None,
+    age_band: str | None = None,
+    region: str | None = None,
+    payment_type: str | None = None,
+    product: str = "Motor",
+    time_window_months: int = 24,
+    start_month: int | str | None = None,
+    end_month: int | str | None = None,
+) -> MarketSelection:
+    """
+    Market frame for the filters (as apply_filters with insurer=None) and the insurer's rows
+    as a mask over it, instead of filtering the dataset twice.
+    """
+    if df is None or len(df) == 0:
+        market = df if df is not None else pd.DataFrame()
+        return MarketSelection(market, np.zeros(len(market), dtype=bool), insurer or None)
+    from analytics.filter_index import filtered_rows
+
+    rows = filtered_rows(
+        df,
+        age_band=age_band,
+        region=region,
+        payment_type=payment_type,
+        product=product,
+        time_window_months=time_window_months,
+        start_month=start_month,
+        end_month=end_month,
+    )
+    market = df.iloc[rows]
+    if insurer and len(market) and "CurrentCompany" in market.columns:
+        mask = (market["CurrentCompany"] == insurer).to_numpy(dtype=bool, na_value=False)
+    else:
+        mask = np.zeros(len(market), dtype=bool)
+    return MarketSelection(market, mask, insurer or None, dataset=df, rows=rows)
+
+
+def parse_year_month(value: int | str | None) -> int | None:
+    """YYYYMM int from "YYYY-MM" (api-contract startDate/endDate), "YYYYMM" or an int. None/"" -> None."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = value.strip().replace("-", "")
+    ym = int(value)
+    if not 1 <= ym % 100 <= 12:
+        raise ValueError(f"invalid year-month: {value!r}")
+    return ym
 
 
 def get_active_filters(
@@ -0,0 +1,373 @@
+"""
+Bitmap filter index for a dataset, built once and reused by every apply_filters call.
+Each value of Product, AgeBand, Region, PaymentType and CurrentCompany gets a packed
+bitmap (1 bit per row); months are indexed in sorted order with one bitmap per "month >= m"
+suffix, so a time window is a lookup. A filter is a bitwise AND of packed bitmaps
+followed by one take, instead of a full copy plus a mask per filter. On a dataset sorted
+by Product and RenewalYearMonth (sort_for_index; the app and snapshots use this layout) a
+per-product month offset index turns any window or custom month range into a contiguous
+slice found by searchsorted.
+The index assumes the dataset is not modified in place (app datasets are read-only).
+
+Filtered row positions are also kept in a process-wide LRU cache (ROW_CACHE) keyed by the
+index version and the normalised filters (filter_key), so callbacks that repeat the same
+market or insurer filter reuse the rows. Other modules cache per-slice results there too
+(anything with an nbytes attribute). It is bounded by FILTER_CACHE_MB; stats() reports
+hits, misses and evictions.
+"""
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from analytics.demographics import parse_year_month, window_start
+from config import FILTER_CACHE_MB
+
+# Columns with one bitmap per value (filter argument -> column)
+FILTER_COLUMNS = {
+    "product": "Product",
+    "age_band": "AgeBand",
+    "region": "Region",
+    "payment_type": "PaymentType",
+    "insurer": "CurrentCompany",
+}
+MONTH_COLUMN = "RenewalYearMonth"
+
+_versions = itertools.count(1)
+# id(df) -> (weakref to df, FilterIndex); entries are dropped when the frame is collected
+_indexes: dict[int, tuple] = {}
+
+
+def _codes(series: pd.Series) -> tuple[np.ndarray, list]:
+    """Integer codes (-1 = missing) and the values they index."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), list(series.cat.categories)
+    codes, uniques = pd.factorize(series)
+    return codes, list(uniques)
+
+
+def sort_for_index(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    df sorted by Product then RenewalYearMonth (missing months last in each product), with
+    a fresh RangeIndex. On this layout every time window is one contiguous slice.
+    """
+    by = [c for c in ("Product", MONTH_COLUMN) if c in df.columns]
+    if not by:
+        return df
+    return df.sort_values(by, kind="stable", na_position="last", ignore_index=True)
+
+
+class FilterIndex:
+    """
+    Packed bitmaps over one dataset. version is unique per index (per dataset build).
+    If the frame is sorted by Product and RenewalYearMonth (sort_for_index), a month offset
+    index per product maps any window to a contiguous row range with two searchsorted calls.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.n = len(df)
+        self.version = next(_versions)
+        # Per-dataset values other modules derive once (e.g. flow codes); dropped with the index
+        self.derived: dict = {}
+        self._bitmaps: dict[str, dict] = {}
+        for col in FILTER_COLUMNS.values():
+            if col in df.columns:
+                codes, values = _codes(df[col])
+                self._bitmaps[col] = {v: np.packbits(codes == i) for i, v in enumerate(values)}
+        self._months = None
+        self._max_month: dict = {}
+        self._blocks: dict | None = None
+        if MONTH_COLUMN in df.columns:
+            self._index_months(df)
+
+    @property
+    def sorted(self) -> bool:
+        """True if rows are grouped by product and in month order (windows are slices)."""
+        return self._blocks is not None
+
+    def _index_months(self, df: pd.DataFrame) -> None:
+        """Sorted distinct months, suffix bitmaps (month >= months[k]), max month and offsets per product."""
+        values = df[MONTH_COLUMN].to_numpy(dtype="float64", na_value=np.nan)
+        months = np.unique(values[~np.isnan(values)])
+        position = np.searchsorted(months, values)  # missing months sort past the end
+        self._months = months
+        self._suffix = [np.packbits(position >= k) & np.packbits(position < len(months)) for k in range(len(months) + 1)]
+        if "Product" not in df.columns:
+            return
+        codes, products = _codes(df["Product"])
+        for i, p in enumerate(products):
+            in_product = values[codes == i]
+            in_product = in_product[~np.isnan(in_product)]
+            self._max_month[p] = in_product.max() if len(in_product) else np.nan
+        self._blocks = _month_blocks(codes, products, values)
+
+    def _month_range(self, product, time_window_months, start_month, end_month) -> tuple | None:
+        """(first, last) YYYYMM kept, or None for no month restriction."""
+        if self._months is None:
+            return None
+        if start_month or end_month:
+            return (start_month or -np.inf, end_month or np.inf)
+        if not time_window_months or time_window_months <= 0:
+            return None
+        max_ym = self._max_month.get(product, np.nan)
+        if pd.isna(max_ym):
+            return None
+        return (window_start(max_ym, time_window_months), np.inf)
+
+    def _month_bits(self, month_range: tuple) -> np.ndarray:
+        """Bitmap of rows with first <= month <= last."""
+        first = int(np.searchsorted(self._months, month_range[0], side="left"))
+        last = int(np.searchsorted(self._months, month_range[1], side="right"))
+        bits = self._suffix[first]
+        if last < len(self._months):
+            bits = bits & ~self._suffix[last]
+        return bits
+
+    def _span(self, product, month_range: tuple | None) -> tuple[int, int]:
+        """Contiguous [start, stop) rows of product within month_range (sorted frames only)."""
+        if "Product" not in self._bitmaps:
+            raise KeyError("Product")
+        block = self._blocks.get(product)
+        if block is None:
+            return 0, 0
+        months, offsets, stop = block
+        if month_range is None:
+            return int(offsets[0]), stop
+        first = offsets[np.searchsorted(months, month_range[0], side="left")]
+        last = offsets[np.searchsorted(months, month_range[1], side="right")]
+        return int(first), int(last)
+
+    def _value_bits(self, col: str, value) -> np.ndarray:
+        """Bitmap for col == value (all zeros if the value does not occur)."""
+        if col not in self._bitmaps:
+            raise KeyError(col)
+        bits = self._bitmaps[col].get(value)
+        return bits if bits is not None else np.zeros((self.n + 7) // 8, dtype=np.uint8)
+
+    def _value_filters(self, age_band, region, payment_type, insurer) -> list[tuple[str, str]]:
+        """(column, value) for each demographic/insurer filter that is set."""
+        values = (("age_band", age_band), ("region", region), ("payment_type", payment_type), ("insurer", insurer))
+        return [(FILTER_COLUMNS[arg], value) for arg, value in values if value]
+
+    def mask_bits(
+        self,
+        insurer: str | None = None,
+        age_band: str | None = None,
+        region: str | None = None,
+        payment_type: str | None = None,
+        product: str = "Motor",
+        time_window_months: int = 24,
+        start_month: int | None = None,
+        end_month: int | None = None,
+    ) -> np.ndarray:
+        """Packed bitmap of rows matching the filters (same semantics as apply_filters)."""
+        bits = self._value_bits("Product", product)
+        month_range = self._month_range(product, time_window_months, start_month, end_month)
+        if month_range is not None:
+            bits = bits & self._month_bits(month_range)
+        for col, value in self._value_filters(age_band, region, payment_type, insurer):
+            bits = bits & self._value_bits(col, value)
+        return bits
+
+    def rows(self, **filters) -> np.ndarray | slice:
+        """
+        Positions of matching rows, ascending. On a sorted frame a product/time-only filter
+        returns a slice (a zero-copy iloc), and value filters only scan that slice's bytes.
+        """
+        if not self.sorted:
+            return np.flatnonzero(np.unpackbits(self.mask_bits(**filters), count=self.n))
+        product = filters.get("product", "Motor")
+        month_range = self._month_range(
+            product, filters.get("time_window_months", 24), filters.get("start_month"), filters.get("end_month")
+        )
+        start, stop = self._span(product, month_range)
+        values = self._value_filters(
+            filters.get("age_band"), filters.get("region"), filters.get("payment_type"), filters.get("insurer")
+        )
+        if not values:
+            return slice(start, stop)
+        lo, hi = start // 8, (stop + 7) // 8
+        bits = None
+        for col, value in values:
+            part = self._value_bits(col, value)[lo:hi]
+            bits = part if bits is None else bits & part
+        rows = np.flatnonzero(np.unpackbits(bits)) + lo * 8
+        return rows[(rows >= start) & (rows < stop)]
+
+
+def _month_blocks(codes: np.ndarray, products: list, values: np.ndarray) -> dict | None:
+    """
+    product -> (distinct months, row offset where each starts plus the end of the dated
+    rows, end of the product block), or None if rows are not grouped by product with months
+    ascending and missing months last.
+    """
+    starts = np.flatnonzero(np.diff(codes)) + 1 if len(codes) else np.array([], dtype=int)
+    bounds = np.concatenate([[0], starts, [len(codes)]]).astype(int)
+    block_codes = codes[bounds[:-1]] if len(codes) else codes
+    if len(set(block_codes.tolist())) != len(block_codes) or (block_codes < 0).any():
+        return None
+    blocks = {}
+    for code, start, stop in zip(block_codes, bounds[:-1], bounds[1:]):
+        month = values[start:stop]
+        dated = int((~np.isnan(month)).sum())
+        if np.isnan(month[:dated]).any() or (np.diff(month[:dated]) < 0).any():
+            return None
+        distinct, first = np.unique(month[:dated], return_index=True)
+        blocks[products[code]] = (distinct, np.append(first, dated) + start, int(stop))
+    return blocks
+
+
+def _size(rows) -> int:
+    """Bytes charged to the cache for one entry (a slice is a few words)."""
+    return getattr(rows, "nbytes", 64)
+
+
+class RowCache:
+    """
+    Thread-safe LRU of read-only row positions (arrays or slices), or other per-slice values
+    with an nbytes attribute, bounded by their total size in bytes.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, np.ndarray | slice] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key: tuple) -> np.ndarray | slice | None:
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rows
+
+    def put(self, key: tuple, rows: np.ndarray | slice) -> None:
+        """Store rows (skipped if larger than the whole cache), evicting least recently used."""
+        if _size(rows) > self.max_bytes:
+            return
+        if isinstance(rows, np.ndarray):
+            rows.flags.writeable = False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= _size(old)
+            self._entries[key] = rows
+            self._bytes += _size(rows)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= _size(evicted)
+                self.evictions += 1
+
+    def drop_version(self, version: int) -> None:
+        """Forget every entry of one dataset version (its frame is gone)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == version]:
+                self._bytes -= _size(self._entries.pop(key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Counters and current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+ROW_CACHE = RowCache(FILTER_CACHE_MB * 2**20)
+
+
+def _forget(key: int, version: int) -> None:
+    _indexes.pop(key, None)
+    ROW_CACHE.drop_version(version)
+
+
+def get_filter_index(df: pd.DataFrame) -> FilterIndex:
+    """FilterIndex for df, built on first use and kept while df is alive."""
+    key = id(df)
+    entry = _indexes.get(key)
+    if entry is not None and entry[0]() is df and entry[1].n == len(df):
+        return entry[1]
+    index = FilterIndex(df)
+    _indexes[key] = (weakref.ref(df), index)
+    weakref.finalize(df, _forget, key, index.version)
+    return index
+
+
+_FILTER_ARGS = (
+    "insurer", "age_band", "region", "payment_type", "product",
+    "time_window_months", "start_month", "end_month",
+)
+
+
+def filter_key(
+    index: FilterIndex,
+    insurer: str | None = None,
+    age_band: str | None = None,
+    region: str | None = None,
+    payment_type: str | None = None,
+    product: str = "Motor",
+    time_window_months: int = 24,
+    start_month: int | str | None = None,
+    end_month: int | str | None = None,
+) -> tuple:
+    """
+    Cache key for a filter slice: (index.version, *normalised filters in _FILTER_ARGS order).
+    Equivalent filters share a key ("" and None both mean "all").
+    """
+    return (
+        index.version,
+        insurer or None,
+        age_band or None,
+        region or None,
+        payment_type or None,
+        product,
+        int(time_window_months or 0),
+        parse_year_month(start_month),
+        parse_year_month(end_month),
+    )
+
+
+def filtered_rows(
+    df: pd.DataFrame,
+    insurer: str | None = None,
+    age_band: str | None = None,
+    region: str | None = None,
+    payment_type: str | None = None,
+    product: str = "Motor",
+    time_window_months: int = 24,
+    start_month: int | str | None = None,
+    end_month: int | str | None = None,
+) -> np.ndarray | slice:
+    """
+    Row positions of df matching the filters (a slice when they are contiguous), from
+    ROW_CACHE when the same filters were seen. start_month/end_month (YYYYMM or "YYYY-MM")
+    select a custom range instead of the trailing time window.
+    """
+    index = get_filter_index(df)
+    key = filter_key(
+        index, insurer, age_band, region, payment_type, product, time_window_months, start_month, end_month
+    )
+    rows = ROW_CACHE.get(key)
+    if rows is None:
+        rows = index.rows(**dict(zip(_FILTER_ARGS, key[1:])))
+        if isinstance(rows, np.ndarray) and index.n <= np.iinfo(np.int32).max:
+            rows = rows.astype(np.int32)
+        ROW_CACHE.put(key, rows)
+    return rows
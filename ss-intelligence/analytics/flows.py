@@ -1,10 +1,180 @@
 """
 Customer flow analysis: switching matrix, net flow, top sources/destinations.
+
+flow_matrix(df, **filters) is the engine the pages use: PreviousCompany/CurrentCompany are
+integer-coded once per dataset, each filter slice gets a scipy.sparse switcher matrix
+(cached in ROW_CACHE next to the slice's rows), and gained, lost, net, top-N and share of
+lost for every insurer are row and column reductions of it. The calc_* functions work on
+an already-filtered frame.
 """
+import numpy as np
 import pandas as pd
+from scipy import sparse
 
+from analytics.filter_index import ROW_CACHE, filter_key, filtered_rows, get_filter_index
 from config import MIN_BASE_FLOW_CELL
 
+# Columns this module reads (registered in analytics.columns; "*" = multi-code prefix)
+REQUIRED_COLUMNS = ("UniqueID", "IsSwitcher", "CurrentCompany", "PreviousCompany")
+OPTIONAL_COLUMNS = ("Q40", "Q40a", "Q40b")
+
+
+class FlowMatrix:
+    """
+    Switcher counts for one slice: counts[i, j] = switchers from labels[i] to labels[j]
+    (CSR). The last row/column is an "unknown insurer" slot (missing or blank), so gained
+    and lost match calc_net_flow; it never appears in rankings or the heatmap.
+    """
+
+    def __init__(self, labels: np.ndarray, counts: sparse.csr_matrix):
+        self.labels = labels
+        self.counts = counts
+        self._positions = {v: i for i, v in enumerate(labels)}
+
+    @classmethod
+    def from_codes(cls, labels: np.ndarray, previous: np.ndarray, current: np.ndarray) -> "FlowMatrix":
+        """From per-switcher codes into labels (len(labels) = unknown)."""
+        size = len(labels) + 1
+        counts = sparse.coo_matrix(
+            (np.ones(len(previous), dtype=np.int64), (previous, current)), shape=(size, size)
+        ).tocsr()  # duplicates are summed
+        return cls(labels, counts)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "FlowMatrix":
+        labels, previous, current, switcher = _flow_codes(df)
+        return cls.from_codes(labels, previous[switcher], current[switcher])
+
+    @property
+    def nbytes(self) -> int:
+        return self.counts.data.nbytes + self.counts.indices.nbytes + self.counts.indptr.nbytes + self.labels.nbytes
+
+    @property
+    def total(self) -> int:
+        return int(self.counts.sum())
+
+    def totals(self) -> pd.DataFrame:
+        """Gained, lost and net for every insurer (column sums, row sums)."""
+        gained = np.asarray(self.counts.sum(axis=0)).ravel()[:-1]
+        lost = np.asarray(self.counts.sum(axis=1)).ravel()[:-1]
+        return pd.DataFrame(
+            {"gained": gained, "lost": lost, "net": gained - lost},
+            index=pd.Index(self.labels, name="insurer"),
+        )
+
+    def net_flow(self, insurer: str) -> dict:
+        """As calc_net_flow."""
+        i = self._positions.get(insurer)
+        if i is None:
+            return {"gained": 0, "lost": 0, "net": 0}
+        gained, lost = int(self.counts[:, i].sum()), int(self.counts[i, :].sum())
+        return {"gained": gained, "lost": lost, "net": gained - lost}
+
+    def _ranked(self, values: np.ndarray) -> pd.Series:
+        """Known insurers with a positive count, largest first."""
+        values = values[:-1]
+        order = np.argsort(-values, kind="stable")
+        order = order[values[order] > 0]
+        return pd.Series(values[order], index=self.labels[order], dtype="int64")
+
+    def top_sources(self, insurer: str, n: int = 10) -> pd.Series:
+        """As calc_top_sources: insurers sending customers to insurer."""
+        i = self._positions.get(insurer)
+        if i is None:
+            return pd.Series(dtype=int)
+        return self._ranked(self.counts[:, i].toarray().ravel()).head(n)
+
+    def top_destinations(self, insurer: str, n: int = 10) -> pd.Series:
+        """As calc_top_destinations: insurers receiving customers from insurer."""
+        i = self._positions.get(insurer)
+        if i is None:
+            return pd.Series(dtype=int)
+        return self._ranked(self.counts[i, :].toarray().ravel()).head(n)
+
+    def pct_of_lost(self, insurer: str) -> pd.Series:
+        """As calc_flow_pct_of_lost: share of insurer's lost customers (known destination) by destination."""
+        dist = self.top_destinations(insurer, n=len(self.labels))
+        return dist / dist.sum() if len(dist) else pd.Series(dtype=float)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Dense previous × current counts over insurers with any flow (as calc_flow_matrix)."""
+        dense = self.counts[:-1, :-1].toarray()
+        rows, cols = dense.sum(axis=1) > 0, dense.sum(axis=0) > 0
+        return pd.DataFrame(
+            dense[np.ix_(rows, cols)],
+            index=pd.Index(self.labels[rows], name="PreviousCompany"),
+            columns=pd.Index(self.labels[cols], name="CurrentCompany"),
+        )
+
+    def heatmap(self, top_n: int | None = 20, min_cell: int = MIN_BASE_FLOW_CELL, insurers=None) -> pd.DataFrame:
+        """
+        to_frame() for the top_n insurers by total flow (gained + lost), same order on both
+        axes, with suppressed cells (is_flow_cell_suppressed) set to NaN. With insurers (the
+        user's authorised insurers), only flows to or from one of them are shown or ranked.
+        """
+        counts = self.counts
+        if insurers is not None:
+            allowed = np.append(np.isin(self.labels, list(insurers)), False)
+            coo = counts.tocoo()
+            keep = allowed[coo.row] | allowed[coo.col]
+            counts = sparse.csr_matrix((coo.data[keep], (coo.row[keep], coo.col[keep])), shape=counts.shape)
+        volume = (np.asarray(counts.sum(axis=0)).ravel() + np.asarray(counts.sum(axis=1)).ravel())[:-1]
+        order = np.argsort(-volume, kind="stable")
+        order = order[volume[order] > 0][:top_n]
+        dense = counts[order][:, order].toarray().astype("float64")
+        dense[dense < min_cell] = np.nan
+        return pd.DataFrame(
+            dense,
+            index=pd.Index(self.labels[order], name="PreviousCompany"),
+            columns=pd.Index(self.labels[order], name="CurrentCompany"),
+        )
+
+
+def _flow_codes(df: pd.DataFrame) -> tuple:
+    """Insurer labels (Previous and Current) and per-row codes; missing/blank -> len(labels)."""
+    previous, current = df["PreviousCompany"], df["CurrentCompany"]
+    values = pd.concat([pd.Series(previous.unique()), pd.Series(current.unique())], ignore_index=True)
+    values = values.dropna().astype(str)
+    labels = pd.Index(values[values != ""].unique())
+    codes = []
+    for col in (previous, current):
+        col_codes = labels.get_indexer(col)
+        codes.append(np.where(col_codes < 0, len(labels), col_codes).astype(np.int32))
+    switcher = df["IsSwitcher"].to_numpy(dtype=bool)
+    return labels.to_numpy(dtype=object), codes[0], codes[1], switcher
+
+
+def flow_matrix(
+    df: pd.DataFrame,
+    age_band: str | None = None,
+    region: str | None = None,
+    payment_type: str | None = None,
+    product: str = "Motor",
+    time_window_months: int = 24,
+    start_month: int | str | None = None,
+    end_month: int | str | None = None,
+) -> FlowMatrix:
+    """
+    FlowMatrix for the market slice (apply_filters semantics, no insurer filter). Codes are
+    built once per dataset; matrices are cached per slice in ROW_CACHE.
+    """
+    index = get_filter_index(df)
+    filters = dict(
+        age_band=age_band, region=region, payment_type=payment_type, product=product,
+        time_window_months=time_window_months, start_month=start_month, end_month=end_month,
+    )
+    key = (*filter_key(index, **filters), "flows")
+    matrix = ROW_CACHE.get(key)
+    if matrix is None:
+        if "flows" not in index.derived:
+            index.derived["flows"] = _flow_codes(df)
+        labels, previous, current, switcher = index.derived["flows"]
+        rows = filtered_rows(df, **filters)
+        switched = switcher[rows]
+        matrix = FlowMatrix.from_codes(labels, previous[rows][switched], current[rows][switched])
+        ROW_CACHE.put(key, matrix)
+    return matrix
+
 
 def calc_flow_matrix(df: pd.DataFrame) -> pd.DataFrame:
     """Pivot: rows=PreviousCompany, cols=CurrentCompany, values=count."""
@@ -20,6 +190,7 @@ def calc_flow_matrix(df: pd.DataFrame) -> pd.DataFrame:
         values="UniqueID",
         aggfunc="count",
         fill_value=0,
+        observed=True,
     )
 
 
@@ -38,7 +209,8 @@ def calc_top_sources(df: pd.DataFrame, insurer: str, n: int = 10) -> pd.Series:
     if df is None or len(df) == 0:
         return pd.Series(dtype=int)
     switchers = df[(df["IsSwitcher"]) & (df["CurrentCompany"] == insurer)]
-    return switchers["PreviousCompany"].value_counts().head(n)
+    counts = switchers["PreviousCompany"].value_counts()
+    return counts[counts > 0].head(n)
 
 
 def calc_top_destinations(df: pd.DataFrame, insurer: str, n: int = 10) -> pd.Series:
@@ -46,7 +218,8 @@ def calc_top_destinations(df: pd.DataFrame, insurer: str, n: int = 10) -> pd.Ser
     if df is None or len(df) == 0:
         return pd.Series(dtype=int)
     switchers = df[(df["IsSwitcher"]) & (df["PreviousCompany"] == insurer)]
-    return switchers["CurrentCompany"].value_counts().head(n)
+    counts = switchers["CurrentCompany"].value_counts()
+    return counts[counts > 0].head(n)
 
 
 def calc_flow_pct_of_lost(df: pd.DataFrame, insurer: str) -> pd.Series:
@@ -56,7 +229,8 @@ def calc_flow_pct_of_lost(df: pd.DataFrame, insurer: str) -> pd.Series:
     lost = df[(df["IsSwitcher"]) & (df["PreviousCompany"] == insurer)]
     if len(lost) == 0:
         return pd.Series(dtype=float)
-    return lost["CurrentCompany"].value_counts(normalize=True)
+    dist = lost["CurrentCompany"].value_counts(normalize=True)
+    return dist[dist > 0]
 
 
 def calc_departed_sentiment(
@@ -1,8 +1,29 @@
 """
 Price sensitivity analysis.
 """
+import re
+
+import numpy as np
 import pandas as pd
 
+from analytics.rates import calc_conversion_rate, calc_retention_rate, calc_shopping_rate, calc_switching_rate
+from analytics.segments import calc_segment_rates, regroup_segments
+
+# Columns this module reads (registered in analytics.columns; "*" = multi-code prefix)
+REQUIRED_COLUMNS = ("IsSwitcher", "PriceDirection")
+OPTIONAL_COLUMNS = ("Q6a", "Q6b", "How much higher", "How much lower", "Q30")
+
+PRICE_DIRECTIONS = ("Higher", "Lower", "Unchanged", "New")
+# Size-of-change band question per direction (the first column present is used)
+PRICE_BAND_COLUMNS = {"Higher": ("Q6a", "How much higher"), "Lower": ("Q6b", "How much lower")}
+# Rate functions calc_rate_by_price_direction can take from the segment table
+_SEGMENT_RATE_FUNCS = {
+    calc_shopping_rate: "shopping",
+    calc_switching_rate: "switching",
+    calc_retention_rate: "retention",
+    calc_conversion_rate: "conversion",
+}
+
 
 def calc_price_direction_dist(df: pd.DataFrame) -> pd.Series | None:
     """Distribution of PriceDirection (Higher/Lower/Unchanged/New)."""
@@ -11,7 +32,23 @@ def calc_price_direction_dist(df: pd.DataFrame) -> pd.Series | None:
     valid = df[df["PriceDirection"].notna() & (df["PriceDirection"] != "")]
     if len(valid) == 0:
         return None
-    return valid["PriceDirection"].value_counts(normalize=True)
+    dist = valid["PriceDirection"].value_counts(normalize=True)
+    return dist[dist > 0]
+
+
+def calc_price_direction_dist_pair(selection) -> tuple[pd.Series | None, pd.Series | None]:
+    """(insurer, market) calc_price_direction_dist for a MarketSelection, from one count over the market."""
+    market = selection.market
+    if selection.market_n == 0 or "PriceDirection" not in market.columns:
+        return None, None
+    direction = market["PriceDirection"]
+    valid = (direction.notna() & (direction != "")).to_numpy(dtype=bool)
+    insurer_counts, market_counts = selection.split_value_counts(direction, where=valid)
+    dists = [
+        (counts / counts.sum()).rename("proportion") if counts.sum() > 0 else None
+        for counts in (insurer_counts, market_counts)
+    ]
+    return (dists[0] if selection.insurer else None), dists[1]
 
 
 def calc_rate_by_price_direction(
@@ -20,12 +57,18 @@ def calc_rate_by_price_direction(
     """Shopping or switching rate segmented by price direction."""
     if df is None or len(df) == 0:
         return None
+    if rate_func in _SEGMENT_RATE_FUNCS:
+        table = calc_rates_by_price_direction(df, exclude_new=exclude_new)
+        if table is None:
+            return None
+        rate = table[_SEGMENT_RATE_FUNCS[rate_func]]
+        return pd.DataFrame({"direction": table.index, "rate": rate.astype(object).where(rate.notna(), None).to_numpy(), "n": table["n"].to_numpy()})
     if exclude_new:
         df = df[df["PriceDirection"] != "New"]
     if len(df) == 0:
         return None
     results = []
-    for direction in ["Higher", "Lower", "Unchanged", "New"]:
+    for direction in PRICE_DIRECTIONS:
         subset = df[df["PriceDirection"] == direction]
         if len(subset) > 0:
             rate = rate_func(subset)
@@ -33,17 +76,77 @@ def calc_rate_by_price_direction(
     return pd.DataFrame(results) if results else None
 
 
+def calc_rates_by_price_direction(df: pd.DataFrame, by: str | None = None, exclude_new: bool = True) -> pd.DataFrame | None:
+    """
+    Counts and all four rates per PriceDirection (× the by column, if given) from one grouped
+    aggregation (segments.calc_segment_rates), directions in PRICE_DIRECTIONS order.
+    """
+    if df is None or len(df) == 0 or "PriceDirection" not in df.columns:
+        return None
+    table = calc_segment_rates(df, ["PriceDirection"] + ([by] if by else []))
+    if table is None or len(table) == 0:
+        return None
+    direction = table.index.get_level_values("PriceDirection")
+    order = [d for d in PRICE_DIRECTIONS if not (exclude_new and d == "New")]
+    keep = np.isin(direction, order)
+    table = table[keep]
+    rank = pd.Index(order).get_indexer(direction[keep])
+    table = table.iloc[np.argsort(rank, kind="stable")]
+    return table if len(table) else None
+
+
+def price_band_column(df: pd.DataFrame, direction: str) -> str | None:
+    """The size-of-change band column for Higher or Lower present in df (PRICE_BAND_COLUMNS)."""
+    return next((col for col in PRICE_BAND_COLUMNS.get(direction, ()) if col in df.columns), None)
+
+
+def _band_sort_key(band) -> float:
+    """Bands ("£10 or less a year", "£11 to £20 a year", "Over £350 a year") by their first amount."""
+    match = re.search(r"\d[\d,]*", str(band))
+    return float(match.group().replace(",", "")) if match else np.inf
+
+
+def calc_rates_by_price_band(df: pd.DataFrame) -> pd.DataFrame | None:
+    """
+    Counts and all four rates per PriceDirection (Higher, Lower) × size-of-change band (the
+    Q6a band for Higher, Q6b for Lower), smallest band first. One grouped aggregation over
+    direction × both band columns, then each direction keeps its own band.
+    """
+    if df is None or len(df) == 0 or "PriceDirection" not in df.columns:
+        return None
+    band_cols = {d: price_band_column(df, d) for d in PRICE_BAND_COLUMNS}
+    dims = ["PriceDirection"] + list(dict.fromkeys(c for c in band_cols.values() if c))
+    if len(dims) == 1:
+        return None
+    table = calc_segment_rates(df, dims, dropna=False)
+    direction = table.index.get_level_values("PriceDirection")
+    band = np.full(len(table), None, dtype=object)
+    for d, col in band_cols.items():
+        if col:
+            rows = direction == d
+            band[rows] = np.asarray(table.index.get_level_values(col), dtype=object)[rows]
+    keep = np.asarray(pd.notna(band) & np.isin(direction, list(band_cols)), dtype=bool)
+    if not keep.any():
+        return None
+    out = regroup_segments(table[keep], [np.asarray(direction[keep], dtype=object), band[keep]])
+    out.index.names = ["PriceDirection", "band"]
+    rank = pd.Index(list(band_cols)).get_indexer(out.index.get_level_values(0))
+    size = np.array([_band_sort_key(b) for b in out.index.get_level_values(1)])
+    return out.iloc[np.lexsort((rank, size))]
+
+
 def calc_price_magnitude_dist(
     df: pd.DataFrame, direction: str
 ) -> pd.Series | None:
     """Distribution of Q6a (Higher) or Q6b (Lower) bands."""
-    col = "Q6a" if direction == "Higher" else "Q6b"
-    if df is None or col not in df.columns:
+    col = price_band_column(df, direction) if df is not None else None
+    if col is None:
         return None
     subset = df[df["PriceDirection"] == direction]
     if len(subset) == 0:
         return None
-    return subset[col].value_counts(normalize=True)
+    dist = subset[col].value_counts(normalize=True)
+    return dist[dist > 0]
 
 
 def calc_switching_savings_dist(df: pd.DataFrame) -> pd.Series | None:
@@ -53,7 +156,8 @@ def calc_switching_savings_dist(df: pd.DataFrame) -> pd.Series | None:
     switchers = df[df["IsSwitcher"]]
     if len(switchers) == 0:
         return None
-    return switchers["Q30"].value_counts(normalize=True)
+    dist = switchers["Q30"].value_counts(normalize=True)
+    return dist[dist > 0]
 
 
 def calc_median_band(series: pd.Series) -> str | None:
@@ -6,6 +6,10 @@ import pandas as pd
 
 from config import Z_SCORE
 
+# Columns this module reads (registered in analytics.columns; "*" = multi-code prefix)
+REQUIRED_COLUMNS = ("IsShopper", "IsSwitcher", "IsRetained", "IsNewToMarket")
+OPTIONAL_COLUMNS = ()
+
 
 def calc_shopping_rate(df: pd.DataFrame) -> float | None:
     """Shopping rate = % where IsShopper is True."""
@@ -44,15 +48,85 @@ def calc_conversion_rate(df: pd.DataFrame) -> float | None:
     return len(switchers) / len(shoppers)
 
 
+def count_indicators(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """
+    Per-row 0/1 indicators whose sums give every rate: n, shoppers, base (not new-to-market),
+    switchers and retained within that base, and shoppers who switched.
+    """
+    shopper = df["IsShopper"].to_numpy(dtype=bool)
+    switcher = df["IsSwitcher"].to_numpy(dtype=bool)
+    in_base = ~df["IsNewToMarket"].to_numpy(dtype=bool)
+    return {
+        "n": np.ones(len(df), dtype=bool),
+        "shoppers": shopper,
+        "base": in_base,
+        "switchers": switcher & in_base,
+        "retained": df["IsRetained"].to_numpy(dtype=bool) & in_base,
+        "shopper_switchers": shopper & switcher,
+    }
+
+
+def rates_from_counts(counts: dict) -> dict:
+    """Shopping, switching, retention and conversion rates from summed indicators (None when the base is 0)."""
+    switching = counts["switchers"] / counts["base"] if counts["base"] else None
+    return {
+        "shopping": counts["shoppers"] / counts["n"] if counts["n"] else None,
+        "switching": switching,
+        "retention": 1 - switching if switching is not None else None,
+        "conversion": counts["shopper_switchers"] / counts["shoppers"] if counts["shoppers"] else None,
+    }
+
+
+def calc_counts_by_insurer(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    count_indicators sums for every CurrentCompany in one groupby: index insurer, columns
+    n, shoppers, base, switchers, retained, shopper_switchers (new-to-market = n - base).
+    """
+    columns = ["n", "shoppers", "base", "switchers", "retained", "shopper_switchers"]
+    if df is None or len(df) == 0:
+        return pd.DataFrame(columns=columns, dtype="int64")
+    indicators = pd.DataFrame(count_indicators(df), index=df.index)
+    counts = indicators.groupby(df["CurrentCompany"], observed=True, sort=False).sum()
+    counts.index = counts.index.astype(object)
+    return counts[columns].astype("int64")
+
+
+def calc_rates_pair(selection) -> tuple[dict | None, dict | None]:
+    """
+    (insurer, market) rates for a MarketSelection, from one pass over the market rows.
+    Each dict has the rates_from_counts keys plus "counts"; insurer is None without an insurer,
+    and both are None for an empty market.
+    """
+    if selection.market_n == 0:
+        return None, None
+    totals = {key: selection.split_sum(values) for key, values in count_indicators(selection.market).items()}
+    market = {key: int(pair[1]) for key, pair in totals.items()}
+    insurer = {key: int(pair[0]) for key, pair in totals.items()}
+    market_rates = {**rates_from_counts(market), "counts": market}
+    if not selection.insurer or insurer["n"] == 0:
+        return None, market_rates
+    return {**rates_from_counts(insurer), "counts": insurer}, market_rates
+
+
 def _wilson_score(successes: int, n: int, z: float = Z_SCORE) -> tuple[float, float]:
     """Wilson score interval for binomial proportion."""
     if n == 0:
         return (0.0, 0.0)
-    p = successes / n
-    denom = 1 + z**2 / n
-    centre = (p + z**2 / (2 * n)) / denom
-    margin = (z / denom) * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2))
-    return (max(0, centre - margin), min(1, centre + margin))
+    lower, upper = wilson_interval(successes, n, z)
+    return (float(lower), float(upper))
+
+
+def wilson_interval(successes, n, z: float = Z_SCORE) -> tuple[np.ndarray, np.ndarray]:
+    """Wilson score interval for arrays of successes / n (elementwise; (0, 0) where n == 0)."""
+    successes = np.asarray(successes, dtype="float64")
+    n = np.asarray(n, dtype="float64")
+    safe_n = np.where(n > 0, n, 1.0)
+    p = successes / safe_n
+    denom = 1 + z**2 / safe_n
+    centre = (p + z**2 / (2 * safe_n)) / denom
+    margin = (z / denom) * np.sqrt(p * (1 - p) / safe_n + z**2 / (4 * safe_n**2))
+    empty = n == 0
+    return np.where(empty, 0.0, np.maximum(0, centre - margin)), np.where(empty, 0.0, np.minimum(1, centre + margin))
 
 
 def calc_rate_with_ci(
@@ -3,6 +3,13 @@ Reason ranking and percentage calculations.
 """
 import pandas as pd
 
+# Reason questions; each is one coded column or a multi-code block (Q19_1, Q19_2, ...)
+REASON_QUESTIONS = ("Q8", "Q18", "Q19", "Q31", "Q33")
+
+# Columns this module reads (registered in analytics.columns; "*" = multi-code prefix)
+REQUIRED_COLUMNS = ()
+OPTIONAL_COLUMNS = REASON_QUESTIONS + tuple(f"{q}_*" for q in REASON_QUESTIONS)
+
 
 def calc_reason_ranking(
     df: pd.DataFrame, question_col: str, top_n: int = 5
@@ -12,15 +19,29 @@ def calc_reason_ranking(
     """
     if df is None or len(df) == 0 or question_col not in df.columns:
         return None
-    base = df[df[question_col].notna() & (df[question_col].astype(str).str.strip() != "")]
+    base = df[_answered(df[question_col])]
     if len(base) == 0:
         return None
-    counts = base[question_col].astype(str).value_counts()
-    total = counts.sum()
-    result = []
-    for reason, count in counts.head(top_n).items():
-        result.append({"reason": reason, "count": int(count), "pct": count / total})
-    return result
+    return rank_counts(base[question_col].astype(str).value_counts(), top_n)
+
+
+def _answered(values: pd.Series) -> pd.Series:
+    """Rows with a non-blank answer."""
+    return values.notna() & (values.astype(str).str.strip() != "")
+
+
+def rank_counts(counts: pd.Series, top_n: int, base: int | None = None) -> list[dict] | None:
+    """
+    Top n reasons by count as [{reason, count, pct}]; equal counts are ordered by reason label,
+    so the ranking does not depend on row or category order (the count cube and the frame
+    paths agree). pct is of base (respondents who answered, for multi-coded questions), else
+    of all counted answers.
+    """
+    total = counts.sum() if base is None else base
+    if total == 0:
+        return None
+    ranked = sorted(counts[counts > 0].items(), key=lambda item: (-item[1], str(item[0])))
+    return [{"reason": reason, "count": int(count), "pct": count / total} for reason, count in ranked[:top_n]]
 
 
 def calc_reason_comparison(
@@ -34,6 +55,20 @@ def calc_reason_comparison(
     return {"insurer": insurer_rank or [], "market": market_rank or []}
 
 
+def calc_reason_comparison_pair(selection, question_col: str, top_n: int = 5) -> dict | None:
+    """calc_reason_comparison for a MarketSelection: both rankings from one count over the market."""
+    market = selection.market
+    if selection.market_n == 0 or question_col not in market.columns:
+        return None
+    answered = _answered(market[question_col]).to_numpy(dtype=bool)
+    insurer_counts, market_counts = selection.split_value_counts(market[question_col].astype(str), where=answered)
+    insurer_rank = rank_counts(insurer_counts, top_n) if selection.insurer else None
+    market_rank = rank_counts(market_counts, top_n)
+    if insurer_rank is None and market_rank is None:
+        return None
+    return {"insurer": insurer_rank or [], "market": market_rank or []}
+
+
 def calc_primary_reason(df: pd.DataFrame, question_col: str) -> str | None:
     """Single most common reason."""
     rank = calc_reason_ranking(df, question_col, top_n=1)
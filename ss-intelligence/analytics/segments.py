@@ -0,0 +1,84 @@
+"""
+Segmented rates: shopping, switching, retention and conversion, with their bases, for every
+segment of one or more categorical dimensions (e.g. PriceDirection × AgeBand) from one
+grouped aggregation: count_cube.count_cells bincounts the rates.count_indicators sums per
+cell, and the rates are column arithmetic on the resulting table.
+"""
+import numpy as np
+import pandas as pd
+
+from analytics.count_cube import CUBE_MEASURES, count_cells
+
+# Columns this module reads (registered in analytics.columns; "*" = multi-code prefix).
+# Segment dimensions are columns declared by the modules that segment by them.
+REQUIRED_COLUMNS = ("IsShopper", "IsSwitcher", "IsRetained", "IsNewToMarket")
+OPTIONAL_COLUMNS = ()
+
+SEGMENT_RATES = ("shopping", "switching", "retention", "conversion")
+# Count each rate is a share of
+RATE_BASES = {"shopping": "n", "switching": "base", "retention": "base", "conversion": "shoppers"}
+
+
+def rates_from_count_table(counts: pd.DataFrame) -> pd.DataFrame:
+    """rates_from_counts for every row of a CUBE_MEASURES count table (NaN where the base is 0)."""
+    def share(hits, base):
+        base = counts[base].to_numpy(dtype="float64")
+        return np.divide(counts[hits].to_numpy(dtype="float64"), base, out=np.full(len(base), np.nan), where=base > 0)
+
+    switching = share("switchers", "base")
+    return pd.DataFrame(
+        {
+            "shopping": share("shoppers", "n"),
+            "switching": switching,
+            "retention": 1 - switching,
+            "conversion": share("shopper_switchers", "shoppers"),
+        },
+        index=counts.index,
+    )
+
+
+def calc_segment_rates(df: pd.DataFrame, by, dropna: bool = True) -> pd.DataFrame | None:
+    """
+    One row per non-empty segment of the `by` columns (a name or a list): the CUBE_MEASURES
+    counts followed by SEGMENT_RATES. Indexed by the segment values (a MultiIndex for several
+    columns), in category / first-seen order. Missing and "" values are dropped unless
+    dropna=False, which keeps them as a None segment. None if df has no rows.
+    """
+    if df is None or len(df) == 0:
+        return None
+    by = [by] if isinstance(by, str) else list(by)
+    labels, counts = count_cells(df, tuple(by))
+    flat = counts.reshape(len(CUBE_MEASURES), -1)
+    cells = np.flatnonzero(flat[0])
+    positions = np.unravel_index(cells, counts.shape[1:])
+    keep = np.ones(len(cells), dtype=bool)
+    levels = []
+    for dim, pos in zip(by, positions):
+        values = np.asarray(list(labels[dim]) + [None], dtype=object)[pos]
+        values[values == ""] = None
+        if dropna:
+            keep &= pd.notna(values)
+        levels.append(values)
+    index = pd.MultiIndex.from_arrays([values[keep] for values in levels], names=by)
+    if len(by) == 1:
+        index = index.get_level_values(0)
+    table = pd.DataFrame(flat[:, cells[keep]].T, index=index, columns=list(CUBE_MEASURES))
+    return pd.concat([table, rates_from_count_table(table)], axis=1)
+
+
+def regroup_segments(table: pd.DataFrame, keys) -> pd.DataFrame:
+    """Sum a calc_segment_rates table's counts over new segment keys (arrays aligned with its rows) and recompute the rates."""
+    counts = table[list(CUBE_MEASURES)].groupby(keys, dropna=False, sort=False).sum()
+    return pd.concat([counts, rates_from_count_table(counts)], axis=1)
+
+
+def rate_grid(table: pd.DataFrame, rate: str = "switching", min_base: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    (rate, base) as first level × second level grids from a two-column calc_segment_rates
+    table, in the table's order; cells whose base (RATE_BASES[rate]) is under min_base are
+    NaN in the rate grid.
+    """
+    row_order, column_order = (pd.unique(table.index.get_level_values(level)) for level in (0, 1))
+    base = table[RATE_BASES[rate]].unstack(1).reindex(index=row_order, columns=column_order)
+    values = table[rate].unstack(1).reindex(index=row_order, columns=column_order)
+    return values.where(base >= min_base), base.fillna(0).astype("int64")
@@ -3,6 +3,8 @@ Suppression and confidence gating.
 """
 from dataclasses import dataclass
 
+import numpy as np
+
 from config import (
     MIN_BASE_PUBLISHABLE,
     MIN_BASE_INDICATIVE,
@@ -28,13 +30,14 @@ def check_suppression(
     active_filters: dict | None = None,
 ) -> SuppressionResult:
     """
-    Check if insurer and market data meet thresholds.
+    Check if insurer and market data meet thresholds. df_insurer/df_market are frames or
+    row counts (e.g. MarketSelection.insurer_n / market_n).
     active_filters used for suppression message and multi-filter warning.
     """
     if active_filters is None:
         active_filters = {}
-    insurer_n = len(df_insurer) if df_insurer is not None else 0
-    market_n = len(df_market) if df_market is not None else 0
+    insurer_n = _row_count(df_insurer)
+    market_n = _row_count(df_market)
     can_show_insurer = insurer_n >= min_base
     can_show_market = market_n >= MIN_BASE_MARKET
 
@@ -63,6 +66,13 @@ def check_suppression(
     )
 
 
+def _row_count(data) -> int:
+    """Rows in a frame, or the count itself."""
+    if data is None:
+        return 0
+    return int(data) if isinstance(data, (int, np.integer)) else len(data)
+
+
 def get_confidence_level(n: int) -> str:
     """Returns publishable, indicative, or suppressed."""
     if n >= MIN_BASE_PUBLISHABLE:
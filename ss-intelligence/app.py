@@ -14,13 +14,15 @@ except ImportError:
 import dash
 from dash import html, dcc, callback, Input, Output
 import dash_bootstrap_components as dbc
+from flask import jsonify
 
 # Add project root to path
 sys_path = Path(__file__).resolve().parent
 if str(sys_path) not in sys.path:
     sys.path.insert(0, str(sys_path))
 
-from shared import DF_MOTOR, DF_HOME, DIMENSIONS, DF_ALL
+from shared import DATASET, count_cube, df_home, df_motor, dimensions
+from analytics.filter_index import ROW_CACHE
 from auth.access import get_authorized_insurers
 from components.global_filters import global_filter_bar
 
@@ -33,7 +35,7 @@ app = dash.Dash(
 
 # Market Overview lives outside Dash Pages to avoid duplicate callback registration for path="/"
 from views.market_overview import layout as market_overview_layout, register_callbacks as register_market_overview
-register_market_overview(app, DF_MOTOR, DF_HOME)
+register_market_overview(app, df_motor, df_home, count_cube)
 
 
 NAV_ITEMS = [
@@ -63,12 +65,13 @@ def update_nav_active(pathname):
 
 def _build_global_filter_bar():
     """Build global filter bar with dimensions. Called at layout time."""
-    all_insurers = DIMENSIONS["DimInsurer"]["Insurer"].dropna().astype(str).tolist()
+    dims = dimensions()
+    all_insurers = dims["DimInsurer"]["Insurer"].dropna().astype(str).tolist()
     authorized = get_authorized_insurers(all_insurers)
     dim_insurer = [{"Insurer": i, "value": i, "label": i, "SortOrder": idx} for idx, i in enumerate(authorized)]
-    dim_age = DIMENSIONS["DimAgeBand"].to_dict("records")
-    dim_region = DIMENSIONS["DimRegion"].to_dict("records")
-    dim_payment = DIMENSIONS["DimPaymentType"].to_dict("records")
+    dim_age = dims["DimAgeBand"].to_dict("records")
+    dim_region = dims["DimRegion"].to_dict("records")
+    dim_payment = dims["DimPaymentType"].to_dict("records")
     return global_filter_bar(dim_insurer, dim_age, dim_region, dim_payment)
 
 
@@ -78,7 +81,7 @@ def _build_global_filter_bar():
 )
 def display_page(pathname):
     if pathname == "/" or pathname is None:
-        return market_overview_layout(DF_MOTOR, DF_HOME)
+        return market_overview_layout()
     return dbc.Container(dash.page_container, fluid=True, className="mb-5")
 
 
@@ -91,39 +94,104 @@ def toggle_global_filters(pathname):
     return "d-none" if pathname == "/admin" else "mb-3"
 
 
-app.layout = html.Div(
-    [
-        dcc.Location(id="url", refresh=False),
-        dbc.Navbar(
-            dbc.Container(
-                [
-                    dbc.NavbarBrand("Shopping & Switching Intelligence", href="/", className="fw-bold"),
-                    dbc.Nav(
-                        id="main-nav",
-                        navbar=True,
-                        className="ms-auto",
-                    ),
-                ],
-                fluid=True,
+def _main_layout():
+    """App shell: navbar, global filter bar and routed page content."""
+    return html.Div(
+        [
+            dcc.Location(id="url", refresh=False),
+            dbc.Navbar(
+                dbc.Container(
+                    [
+                        dbc.NavbarBrand("Shopping & Switching Intelligence", href="/", className="fw-bold"),
+                        dbc.Nav(
+                            id="main-nav",
+                            navbar=True,
+                            className="ms-auto",
+                        ),
+                    ],
+                    fluid=True,
+                ),
+                color="dark",
+                dark=True,
+                className="mb-3",
             ),
-            color="dark",
-            dark=True,
-            className="mb-3",
-        ),
-        html.Div(_build_global_filter_bar(), id="global-filter-container", className="mb-3"),
-        html.Div(id="page-content"),
-    ]
+            html.Div(_build_global_filter_bar(), id="global-filter-container", className="mb-3"),
+            html.Div(id="page-content"),
+        ]
+    )
+
+
+def _loading_message(status: dict):
+    """Progress text for the loading screen."""
+    if status["state"] == "failed":
+        return dbc.Alert(f"Data failed to load: {status['error']}", color="danger")
+    loaded = len(status["loaded"])
+    stage = status["stage"] or ("done" if status["state"] == "ready" else "starting")
+    elapsed = status["elapsed_s"] or 0
+    return html.P(f"Loading data: {stage} ({loaded}/{len(status['stages'])} steps, {elapsed:.0f}s)", className="text-muted")
+
+
+def _loading_layout():
+    """Shown while data loads in the background; the page reloads itself once data is ready."""
+    return dbc.Container(
+        [
+            html.H4("Shopping & Switching Intelligence", className="mt-5 mb-3"),
+            dbc.Spinner(color="secondary"),
+            html.Div(_loading_message(DATASET.status()), id="data-loading-status", className="mt-3"),
+            dcc.Interval(id="data-ready-poll", interval=2000),
+            dcc.Store(id="data-ready"),
+            html.Div(id="data-ready-reload", className="d-none"),
+        ],
+        className="text-center",
+    )
+
+
+@callback(
+    [Output("data-loading-status", "children"), Output("data-ready", "data"), Output("data-ready-poll", "disabled")],
+    Input("data-ready-poll", "n_intervals"),
 )
+def poll_data_ready(_n):
+    status = DATASET.status()
+    return _loading_message(status), status["state"] == "ready", status["state"] in ("ready", "failed")
+
+
+app.clientside_callback(
+    "function(ready) { if (ready) { window.location.reload(); } return window.dash_clientside.no_update; }",
+    Output("data-ready-reload", "children"),
+    Input("data-ready", "data"),
+)
+
+
+def serve_layout():
+    """Full layout once data is loaded, else a loading screen (the server binds and serves immediately)."""
+    return _main_layout() if DATASET.ready else _loading_layout()
+
+
+app.layout = serve_layout
 
 
 server = app.server
 
+
+@server.route("/healthz")
+def healthz():
+    """Liveness: the process is up and serving requests (data may still be loading)."""
+    return jsonify({"status": "ok", "pid": os.getpid()})
+
+
+@server.route("/readyz")
+def readyz():
+    """Readiness: 200 once data is loaded, else 503. Body reports load state, stage, timings and filter cache counters."""
+    status = {**DATASET.status(), "filter_cache": ROW_CACHE.stats()}
+    return jsonify(status), 200 if status["state"] == "ready" else 503
+
+
 # Basic auth (optional MVP - enable when BASIC_AUTH_USERNAME and BASIC_AUTH_PASSWORD set)
 _auth_user = os.getenv("BASIC_AUTH_USERNAME")
 _auth_pass = os.getenv("BASIC_AUTH_PASSWORD")
 if _auth_user and _auth_pass:
     from dash_auth import BasicAuth
-    BasicAuth(app, {_auth_user: _auth_pass})
+    BasicAuth(app, {_auth_user: _auth_pass}, public_routes=["/healthz", "/readyz"])
 
 if __name__ == "__main__":
     # use_reloader=False prevents duplicate callback registration (reloader runs app twice)
@@ -21,6 +21,19 @@ PRIOR_STRENGTH = 30
 TREND_NOISE_THRESHOLD = 2.0  # percentage points
 CONFIDENCE_LEVEL = 0.95
 Z_SCORE = 1.96
+# Batched smoothing uses a normal approximation to the Beta posterior CI when the posterior
+# has ESS >= this and alpha, beta >= NORMAL_APPROX_MIN_SHAPE; the CI bounds are then within
+# 0.001 (0.1 pp) of the exact beta.ppf result (see analytics.bayesian).
+NORMAL_APPROX_MIN_ESS = 1000
+NORMAL_APPROX_MIN_SHAPE = 30
+
+# Data loading: months of history the app loads (longest time window offered in the UI).
+# Older waves stay in the processed store but are not read at startup.
+APP_HISTORY_MONTHS = 24
+# Seconds a callback waits for background data loading before failing (below gunicorn --timeout)
+DATA_WAIT_TIMEOUT_S = 60
+# Per-process cache of filtered row positions shared by all callbacks (MB)
+FILTER_CACHE_MB = 64
 
 # CI Brand colours
 CI_MAGENTA = "#981D97"
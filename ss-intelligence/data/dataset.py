@@ -0,0 +1,115 @@
+"""
+Lazy app dataset: named load stages (Motor, Home, dimensions) run once in a background
+thread started at boot, so the server can bind its port and answer health checks while
+data loads. Accessors wait for the stage they need; status() reports progress and timings
+for /readyz.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable
+
+
+class DatasetNotReady(RuntimeError):
+    """Raised when a stage is not loaded within the accessor timeout."""
+
+
+class LazyDataset:
+    """
+    stages: ordered (name, load) pairs; load(values) receives the values of earlier stages.
+    Loading starts on start() (or first access) and runs each stage once per process;
+    after a fork (gunicorn --preload) the child starts its own loader thread.
+    """
+
+    def __init__(self, stages: list[tuple[str, Callable[[dict], Any]]]):
+        self._stages = list(stages)
+        self._values: dict[str, Any] = {}
+        self._timings: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._loaded = threading.Condition(self._lock)
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._stage: str | None = None
+        self._started_at: float | None = None
+        self._finished_at: float | None = None
+        self._error: BaseException | None = None
+
+    def start(self) -> None:
+        """Start the background loader (no-op if already running or done in this process)."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._values, self._timings, self._error = {}, {}, None
+            self._started_at, self._finished_at = time.time(), None
+            self._thread = threading.Thread(target=self._run, name="dataset-loader", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        for name, load in self._stages:
+            with self._lock:
+                self._stage = name
+            t0 = time.perf_counter()
+            try:
+                value = load(dict(self._values))
+            except BaseException as e:
+                with self._loaded:
+                    self._error = e
+                    self._finished_at = time.time()
+                    self._loaded.notify_all()
+                return
+            with self._loaded:
+                self._values[name] = value
+                self._timings[name] = round(time.perf_counter() - t0, 3)
+                self._loaded.notify_all()
+        with self._loaded:
+            self._stage = None
+            self._finished_at = time.time()
+            self._loaded.notify_all()
+
+    @property
+    def ready(self) -> bool:
+        """True once every stage has loaded."""
+        return len(self._values) == len(self._stages)
+
+    def get(self, name: str, timeout: float | None = None) -> Any:
+        """
+        Value of one stage, waiting up to timeout seconds (None = no limit) for it to load.
+        Re-raises the loader's exception if loading failed before that stage.
+        """
+        self.start()
+        with self._loaded:
+            if not self._loaded.wait_for(lambda: name in self._values or self._error is not None, timeout):
+                raise DatasetNotReady(f"{name} not loaded yet (loading: {self._stage})")
+            if name in self._values:
+                return self._values[name]
+            raise self._error
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until all stages are loaded or loading failed. Returns ready."""
+        self.start()
+        with self._loaded:
+            self._loaded.wait_for(lambda: self.ready or self._error is not None, timeout)
+        return self.ready
+
+    def status(self) -> dict:
+        """State (pending/loading/ready/failed), current stage, per-stage seconds, elapsed time, error."""
+        with self._lock:
+            if self._error is not None:
+                state = "failed"
+            elif self.ready:
+                state = "ready"
+            elif self._started_at is None:
+                state = "pending"
+            else:
+                state = "loading"
+            end = self._finished_at or time.time()
+            return {
+                "state": state,
+                "stage": self._stage,
+                "loaded": [name for name, _ in self._stages if name in self._values],
+                "stages": [name for name, _ in self._stages],
+                "timings_s": dict(self._timings),
+                "elapsed_s": round(end - self._started_at, 3) if self._started_at else None,
+                "error": repr(self._error) if self._error is not None else None,
+            }
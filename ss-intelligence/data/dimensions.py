@@ -4,6 +4,10 @@ Used for filter dropdowns with sort order and display labels.
 """
 import pandas as pd
 
+# Columns this module reads (registered in analytics.columns)
+REQUIRED_COLUMNS = ("CurrentCompany",)
+OPTIONAL_COLUMNS = ("AgeBand", "Region", "PaymentType")
+
 # Spec order for age bands
 AGE_BAND_ORDER = ["17-24", "18-24", "25-34", "35-44", "45-54", "55-64", "65+"]
 
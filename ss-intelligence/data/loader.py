@@ -1,14 +1,26 @@
 """
 Load source data from CSV or Parquet.
-Reads from DATA_DIR (env), then data/processed/, data/raw/, fallback ../public/data/.
-Applies transforms before returning.
+Reads from DATA_DIR (env), then data/processed/ (partitioned store, then single Parquet),
+data/raw/, fallback ../public/data/.
+Applies the column schema at parse time and transforms before returning.
+Transformed source CSVs are cached (data/processed/cache/, Arrow IPC) under a key derived
+from the file fingerprint, so unchanged sources are not re-parsed on the next start.
+Product / month-range predicates and column selection are pushed down to the
+partitioned store; other sources are filtered after loading.
+Large CSVs can be streamed chunk by chunk into Parquet (stream_csv_to_parquet).
 """
+import hashlib
+import json
 import os
 from pathlib import Path
+from typing import Iterator
 
 import pandas as pd
 
-from data.transforms import transform
+from data.schema import apply_schema, memory_report, read_dtypes, select_columns
+from data.snapshot import read_frame, write_frame
+from data.store import has_product, product_dir, read_store, stable_schema, store_months
+from data.transforms import source_columns, transform
 
 # Base paths: ss-intelligence/data/ -> data/raw, data/processed
 _DATA_DIR = Path(__file__).resolve().parent
@@ -20,6 +32,31 @@ FALLBACK_DIR = _DATA_DIR.parent.parent / "public" / "data"
 DATA_DIR = os.getenv("DATA_DIR", r"c:\Users\ianch\OneDrive - CONSUMER INTELLIGENCE LTD")
 _DATA_DIR_PATH = Path(DATA_DIR) if DATA_DIR else None
 
+# Rows per chunk for streaming ingestion
+DEFAULT_CHUNK_SIZE = 250_000
+
+# Transformed-frame cache for source CSVs. DATA_CACHE=0 disables it; DATA_CACHE_HASH=1 keys on
+# a SHA-256 of the file instead of its mtime (slower to check, survives copies and touches).
+CACHE_DIR = Path(os.getenv("DATA_CACHE_DIR") or PROCESSED_DIR / "cache")
+CACHE_ENABLED = os.getenv("DATA_CACHE", "1") != "0"
+CACHE_CONTENT_HASH = os.getenv("DATA_CACHE_HASH", "0") == "1"
+# Bump when transform / schema output changes so existing cache entries are not reused
+CACHE_VERSION = 1
+
+# Candidate CSV filenames per location
+PRIMARY_FILES = {
+    "Motor": ["motor all data.csv"],
+    "Home": ["all home data.csv"],
+}
+RAW_FILES = {
+    "Motor": ["motor all data.csv", "motor_main_data.csv", "motor_main_data_demo.csv", "motor main data.csv", "motor main data demo.csv", "motor.csv"],
+    "Home": ["all home data.csv", "home_main_data.csv", "ff_home_updated.csv", "ff_home.csv", "home.csv"],
+}
+FALLBACK_FILES = {
+    "Motor": ["motor all data.csv", "motor_main_data.csv", "motor_main_data_demo.csv", "motor main data.csv", "motor main data demo.csv"],
+    "Home": ["all home data.csv", "home_main_data.csv", "ff_home_updated.csv", "ff_home.csv"],
+}
+
 
 def _normalise_column_name(name: str) -> str:
     """Strip MainData[, RespondentProfile[, etc. prefixes from column names."""
@@ -34,75 +71,294 @@ def _normalise_column_name(name: str) -> str:
     return name.strip()
 
 
-def _read_csv(path: Path) -> pd.DataFrame:
-    """Read CSV, normalise column names, and deduplicate columns (keep first)."""
-    df = pd.read_csv(path, dtype=str, low_memory=False)
-    df.columns = [_normalise_column_name(c) for c in df.columns]
+def _csv_read_args(path: Path, columns: list[str] | None = None) -> tuple[list[str], list[str] | None, dict]:
+    """
+    Normalised column names, usecols (raw headers to read, None = all) and read_csv dtype
+    mapping (keyed by raw header). columns projects to those output columns plus the source
+    columns transform derives them from.
+    """
+    raw_cols = list(pd.read_csv(path, nrows=0).columns)
+    names = [_normalise_column_name(c) for c in raw_cols]
+    usecols = None
+    if columns is not None:
+        wanted = set(select_columns(names, source_columns(columns)))
+        pairs = [(raw, name) for raw, name in zip(raw_cols, names) if name in wanted]
+        usecols = [raw for raw, _ in pairs]
+        raw_cols, names = usecols, [name for _, name in pairs]
+    dtypes = read_dtypes(names)
+    return names, usecols, {raw: dtypes[name] for raw, name in zip(raw_cols, names)}
+
+
+def _finalise_columns(df: pd.DataFrame, names: list[str]) -> pd.DataFrame:
+    """Apply normalised names, drop duplicate columns (keep first), coerce schema dtypes."""
+    df.columns = names
     if df.columns.duplicated().any():
         df = df.loc[:, ~df.columns.duplicated()]
+    return apply_schema(df)
+
+
+def _read_csv(path: Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Read CSV with schema dtypes, normalise column names, and deduplicate columns (keep first).
+    Category columns are parsed directly; int32/uint8 columns are coerced after parsing.
+    columns (output names / "prefix*" patterns) restricts parsing to what they need.
+    """
+    names, usecols, dtype = _csv_read_args(path, columns)
+    df = pd.read_csv(path, usecols=usecols, dtype=dtype, low_memory=False)
+    return _finalise_columns(df, names)
+
+
+def iter_csv_chunks(
+    path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    columns: list[str] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield schema-typed chunks of at most chunk_size rows, with normalised column names."""
+    names, usecols, dtype = _csv_read_args(path, columns)
+    with pd.read_csv(path, usecols=usecols, dtype=dtype, chunksize=chunk_size) as reader:
+        for chunk in reader:
+            yield _finalise_columns(chunk, names)
+
+
+def stream_csv_to_parquet(
+    path: Path,
+    product: str,
+    out_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> int:
+    """
+    Streaming ingestion: read CSV in chunks, transform each chunk and append it to a
+    Parquet file. Peak memory is bounded by chunk_size, not file size. Returns row count.
+    Requires pyarrow.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for chunk in iter_csv_chunks(path, chunk_size):
+            chunk = transform(chunk, product, copy=False)
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = stable_schema(table)
+                writer = pq.ParquetWriter(tmp_path, schema)
+            writer.write_table(table.select(schema.names).cast(schema))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        return 0
+    tmp_path.replace(out_path)
+    return rows
+
+
+def cache_key(
+    path: Path,
+    product: str,
+    content_hash: bool = CACHE_CONTENT_HASH,
+    columns: list[str] | None = None,
+) -> str:
+    """
+    Content address of a transformed source: hash of size + mtime (or SHA-256), product,
+    column projection and CACHE_VERSION.
+    """
+    from data.manifest import file_fingerprint
+
+    fp = file_fingerprint(path, content_hash=content_hash)
+    ident = {"product": product, "version": CACHE_VERSION, "size": fp["size"]}
+    if columns is not None:
+        ident["columns"] = sorted(columns)
+    if content_hash:
+        ident["sha256"] = fp["sha256"]
+    else:
+        ident["mtime"] = fp["mtime"]
+    return hashlib.sha256(json.dumps(ident, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def _load_source_csv(
+    path: Path,
+    product: str,
+    cache_dir: Path | None = None,
+    columns: list[str] | None = None,
+) -> tuple[pd.DataFrame, str]:
+    """
+    Parse and transform a source CSV, reusing the cached transformed frame while the source
+    is unchanged. Cache hits are memory-mapped (read-only). Older entries for the product are
+    removed when a new one is written. Returns (df, cache status: hit / miss / off).
+    """
+    if not CACHE_ENABLED:
+        return transform(_read_csv(path, columns), product, copy=False), "off"
+    cache_dir = Path(cache_dir or CACHE_DIR)
+    cached = cache_dir / f"{product.lower()}-{cache_key(path, product, columns=columns)}.arrow"
+    if cached.exists():
+        try:
+            return read_frame(cached), "hit"
+        except (ImportError, OSError, ValueError):
+            cached.unlink(missing_ok=True)  # unreadable entry: rebuild below
+    df = transform(_read_csv(path, columns), product, copy=False)
+    try:
+        write_frame(df, cached)
+    except (ImportError, OSError):
+        return df, "off"
+    for stale in cache_dir.glob(f"{product.lower()}-*.arrow"):
+        if stale != cached:
+            stale.unlink(missing_ok=True)
+    return df, "miss"
+
+
+def _with_metadata(df: pd.DataFrame, metadata: dict, source: str) -> tuple[pd.DataFrame, dict]:
+    """Fill source, row_count and memory report (MB per dtype / top columns)."""
+    metadata["source"] = source
+    metadata["row_count"] = len(df)
+    metadata["memory"] = memory_report(df)
+    return df, metadata
+
+
+def find_source_csv(product: str) -> Path | None:
+    """First existing source CSV for product: DATA_DIR, then data/raw/, then ../public/data/."""
+    candidates = []
+    if _DATA_DIR_PATH and _DATA_DIR_PATH.exists():
+        candidates += [_DATA_DIR_PATH / f for f in PRIMARY_FILES.get(product, [])]
+    candidates += [RAW_DIR / f for f in RAW_FILES.get(product, [f"{product.lower()}.csv"])]
+    candidates += [FALLBACK_DIR / f for f in FALLBACK_FILES.get(product, [])]
+    return next((c for c in candidates if c.exists()), None)
+
+
+def _source_files(product: str) -> list[Path]:
+    """Files of the source load_data reads for product, in its order: DATA_DIR CSV, store partitions, Parquet, raw / fallback CSV."""
+    if _DATA_DIR_PATH and _DATA_DIR_PATH.exists():
+        for fname in PRIMARY_FILES.get(product, []):
+            if (_DATA_DIR_PATH / fname).exists():
+                return [_DATA_DIR_PATH / fname]
+    if has_product(product):
+        return sorted(p for p in product_dir(product).rglob("*") if p.is_file())
+    parquet_path = PROCESSED_DIR / f"{product.lower()}.parquet"
+    if parquet_path.exists():
+        return [parquet_path]
+    csv = find_source_csv(product)
+    return [csv] if csv is not None else []
+
+
+def source_fingerprint(
+    product: str,
+    time_window_months: int | None = None,
+    columns: list[str] | None = None,
+) -> str | None:
+    """
+    Digest of what load_data(product, time_window_months, columns=columns) would return: the
+    path, size and mtime of each source file plus the window, column projection and
+    CACHE_VERSION. Changes when the source is replaced, rewritten or touched. None if there
+    is no source.
+    """
+    files = _source_files(product)
+    if not files:
+        return None
+    ident = {
+        "product": product,
+        "version": CACHE_VERSION,
+        "window": time_window_months,
+        "columns": sorted(source_columns(columns)) if columns is not None else None,
+        "files": [[str(f), st.st_size, st.st_mtime_ns] for f, st in zip(files, map(Path.stat, files))],
+    }
+    return hashlib.sha256(json.dumps(ident, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def _month_bounds(
+    months: list[int],
+    time_window_months: int | None,
+    start_month: int | None,
+    end_month: int | None,
+) -> tuple[int | None, int | None]:
+    """Resolve a time window (ending at the latest available month) into inclusive YYYYMM bounds."""
+    if time_window_months and months:
+        from analytics.demographics import window_start
+
+        window_min = window_start(max(months), time_window_months)
+        start_month = max(start_month, window_min) if start_month else window_min
+    return start_month, end_month
+
+
+def _apply_predicates(
+    df: pd.DataFrame,
+    time_window_months: int | None,
+    start_month: int | None,
+    end_month: int | None,
+    columns: list[str] | None,
+) -> pd.DataFrame:
+    """Month-range and column predicates for sources that cannot push them down (CSV, single Parquet)."""
+    if (time_window_months or start_month or end_month) and "RenewalYearMonth" in df.columns:
+        months = df["RenewalYearMonth"].dropna().unique().tolist()
+        start_month, end_month = _month_bounds(months, time_window_months, start_month, end_month)
+        mask = pd.Series(True, index=df.index)
+        if start_month:
+            mask &= df["RenewalYearMonth"] >= start_month
+        if end_month:
+            mask &= df["RenewalYearMonth"] <= end_month
+        df = df[mask.fillna(False)].reset_index(drop=True)
+    if columns is not None:
+        df = df[select_columns(df.columns, list(columns) + ["Product", "RenewalYearMonth"])]
     return df
 
 
-def load_data(product: str) -> tuple[pd.DataFrame, dict]:
+def load_data(
+    product: str,
+    time_window_months: int | None = None,
+    start_month: int | None = None,
+    end_month: int | None = None,
+    columns: list[str] | None = None,
+) -> tuple[pd.DataFrame, dict]:
     """
     Load data for Motor or Home.
-    Tries: DATA_DIR (env), data/processed/, data/raw/, then ../public/data/.
-    Returns (DataFrame, metadata dict with keys: source, row_count, product).
+    Tries: DATA_DIR (env), data/processed/ store, data/processed/ Parquet, data/raw/, then ../public/data/.
+    time_window_months (last N months of available data) and start_month / end_month
+    (inclusive YYYYMM) restrict rows. columns (names or "prefix*" patterns, e.g. from
+    analytics.columns.app_columns) restricts columns to those plus the transform inputs
+    they derive from: CSVs parse only these (usecols), the store reads only these Parquet
+    columns. Product and RenewalYearMonth are always kept.
+    CSV sources go through the transformed-frame cache (metadata["cache"]: hit / miss / off).
+    Returns (DataFrame, metadata dict with keys: source, row_count, product, memory, months, cache).
     """
     metadata = {"product": product, "source": None, "row_count": 0}
+    if columns is not None:
+        columns = source_columns(columns)  # keep transform inputs so derived columns stay checkable
+    predicates = (time_window_months, start_month, end_month, columns)
 
     # 0. Try primary DATA_DIR (e.g. OneDrive) - motor all data.csv, all home data.csv
-    primary_files = {
-        "Motor": ["motor all data.csv"],
-        "Home": ["all home data.csv"],
-    }
     if _DATA_DIR_PATH and _DATA_DIR_PATH.exists():
-        for fname in primary_files.get(product, []):
+        for fname in PRIMARY_FILES.get(product, []):
             candidate = _DATA_DIR_PATH / fname
             if candidate.exists():
-                df = _read_csv(candidate)
-                df = transform(df, product)
-                metadata["source"] = str(candidate)
-                metadata["row_count"] = len(df)
-                return df, metadata
+                df, metadata["cache"] = _load_source_csv(candidate, product, columns=columns)
+                return _with_metadata(_apply_predicates(df, *predicates), metadata, str(candidate))
+
+    # 1. Try partitioned store (processed) - only the requested partitions and columns are read
+    if has_product(product):
+        start, end = _month_bounds(store_months(product), time_window_months, start_month, end_month)
+        df = read_store(product, start_month=start, end_month=end, columns=columns)
+        metadata["months"] = (start, end)
+        return _with_metadata(df, metadata, "store")
 
-    # 1. Try Parquet (processed) - already transformed
+    # 1b. Single Parquet file (processed before the partitioned store existed)
     parquet_path = PROCESSED_DIR / f"{product.lower()}.parquet"
     if parquet_path.exists():
-        df = pd.read_parquet(parquet_path)
-        metadata["source"] = "parquet"
-        metadata["row_count"] = len(df)
-        return df, metadata
-
-    # 2. Try CSV in data/raw/ - apply transforms (canonical location for project data)
-    raw_files = {
-        "Motor": ["motor all data.csv", "motor_main_data.csv", "motor_main_data_demo.csv", "motor main data.csv", "motor main data demo.csv", "motor.csv"],
-        "Home": ["all home data.csv", "home_main_data.csv", "ff_home_updated.csv", "ff_home.csv", "home.csv"],
-    }
-    for fname in raw_files.get(product, [f"{product.lower()}.csv"]):
-        candidate = RAW_DIR / fname
-        if candidate.exists():
-            df = _read_csv(candidate)
-            df = transform(df, product)
-            metadata["source"] = str(candidate)
-            metadata["row_count"] = len(df)
-            return df, metadata
-
-    # 3. Fallback: ../public/data/
-    fallback_files = {
-        "Motor": ["motor all data.csv", "motor_main_data.csv", "motor_main_data_demo.csv", "motor main data.csv", "motor main data demo.csv"],
-        "Home": ["all home data.csv", "home_main_data.csv", "ff_home_updated.csv", "ff_home.csv"],
-    }
-    for fname in fallback_files.get(product, []):
-        candidate = FALLBACK_DIR / fname
-        if candidate.exists():
-            df = _read_csv(candidate)
-            df = transform(df, product)
-            metadata["source"] = str(candidate)
-            metadata["row_count"] = len(df)
-            return df, metadata
+        df = apply_schema(pd.read_parquet(parquet_path))
+        return _with_metadata(_apply_predicates(df, *predicates), metadata, "parquet")
+
+    # 2. Try CSV in data/raw/ then 3. fallback ../public/data/ - apply transforms
+    for base, files in ((RAW_DIR, RAW_FILES.get(product, [f"{product.lower()}.csv"])), (FALLBACK_DIR, FALLBACK_FILES.get(product, []))):
+        for fname in files:
+            candidate = base / fname
+            if candidate.exists():
+                df, metadata["cache"] = _load_source_csv(candidate, product, columns=columns)
+                return _with_metadata(_apply_predicates(df, *predicates), metadata, str(candidate))
 
     raise FileNotFoundError(
         f"No data file found for {product}. "
-        f"Tried: DATA_DIR={_DATA_DIR_PATH}, {parquet_path}, {RAW_DIR}, {FALLBACK_DIR}"
+        f"Tried: DATA_DIR={_DATA_DIR_PATH}, store, {parquet_path}, {RAW_DIR}, {FALLBACK_DIR}"
     )
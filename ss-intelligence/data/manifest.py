@@ -0,0 +1,114 @@
+"""
+Refresh manifest: fingerprints of processed source files and per-month row hashes.
+Stored in data/processed/manifest.json and used by incremental refresh to
+transform only new or changed RenewalYearMonth waves.
+"""
+import hashlib
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data.loader import PROCESSED_DIR
+
+MANIFEST_PATH = PROCESSED_DIR / "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_fingerprint(path: Path, content_hash: bool = True) -> dict:
+    """Size, mtime and (optionally) SHA-256 of a source file."""
+    path = Path(path)
+    stat = path.stat()
+    fp = {"path": str(path), "size": stat.st_size, "mtime": stat.st_mtime}
+    if content_hash:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        fp["sha256"] = h.hexdigest()
+    return fp
+
+
+def same_file(a: dict | None, b: dict | None) -> bool:
+    """True if two fingerprints describe the same content (hash if both have one, else size+mtime)."""
+    if not a or not b:
+        return False
+    if a.get("sha256") and b.get("sha256"):
+        return a["sha256"] == b["sha256"]
+    return a.get("size") == b.get("size") and a.get("mtime") == b.get("mtime")
+
+
+def month_hashes(df: pd.DataFrame, month_col: str = "RenewalYearMonth") -> dict[str, dict]:
+    """
+    Order-independent content hash per month: {"202501": {"rows": n, "hash": "..."}}.
+    Row hashes (pd.util.hash_pandas_object) are summed per month modulo 2**64.
+    """
+    if df is None or len(df) == 0 or month_col not in df.columns:
+        return {}
+    row_hash = pd.util.hash_pandas_object(df, index=False).to_numpy(dtype=np.uint64)
+    codes, months = pd.factorize(df[month_col])
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    sums = np.add.reduceat(row_hash[order], starts)
+    counts = np.diff(np.r_[starts, len(sorted_codes)])
+    out = {}
+    for code, total, n in zip(sorted_codes[starts], sums, counts):
+        key = "missing" if code < 0 else str(int(months[code]))
+        out[key] = {"rows": int(n), "hash": f"{int(total):016x}"}
+    return out
+
+
+def merge_month_hashes(parts: list[dict]) -> dict[str, dict]:
+    """Combine month_hashes from several chunks of the same file."""
+    out: dict[str, dict] = {}
+    for part in parts:
+        for month, entry in part.items():
+            if month not in out:
+                out[month] = dict(entry)
+                continue
+            total = (int(out[month]["hash"], 16) + int(entry["hash"], 16)) % (1 << 64)
+            out[month] = {"rows": out[month]["rows"] + entry["rows"], "hash": f"{total:016x}"}
+    return out
+
+
+def diff_months(old: dict | None, new: dict) -> tuple[list[str], list[str]]:
+    """(changed_or_new, removed) month keys comparing two month_hashes dicts."""
+    old = old or {}
+    changed = sorted(m for m, e in new.items() if old.get(m) != e)
+    removed = sorted(m for m in old if m not in new)
+    return changed, removed
+
+
+def load_manifest(path: Path = MANIFEST_PATH) -> dict:
+    """Read manifest (empty structure if missing or unreadable)."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "products": {}}
+
+
+def save_manifest(manifest: dict, path: Path = MANIFEST_PATH) -> Path:
+    """Write manifest atomically."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp.replace(path)
+    return path
+
+
+def record_product(manifest: dict, product: str, source: dict, months: dict) -> None:
+    """Store source fingerprint and month hashes for product."""
+    manifest.setdefault("products", {})[product] = {
+        "source": source,
+        "months": months,
+        "updated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
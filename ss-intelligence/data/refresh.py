@@ -1,90 +1,333 @@
 """
-Monthly data refresh: validate CSV, transform, build dimensions, save Parquet.
+Monthly data refresh: validate CSV, transform, build dimensions, save the
+Hive-partitioned Parquet store (data/processed/store/Product=/RenewalYearMonth=), the
+memory-mappable app snapshot (data/processed/snapshot/<product>.arrow) and the rate
+count cube (data/processed/cube/<product>.npz).
+The full refresh is a staged pipeline (ingest per product, then Bayesian pre-compute per
+product x time window); independent tasks run in a process pool and each stage reports wall time.
 Run: python -m data.refresh
+     python -m data.refresh --workers 8           (process pool size; 1 = run in-process)
+     python -m data.refresh --chunk-size 250000   (streaming mode for multi-GB CSVs)
+     python -m data.refresh --incremental         (only new/changed RenewalYearMonth waves)
 """
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Callable
 
 import pandas as pd
 
-from data.loader import RAW_DIR, PROCESSED_DIR, load_data
-from data.transforms import transform
+from config import APP_HISTORY_MONTHS
+from data.loader import (
+    DEFAULT_CHUNK_SIZE,
+    RAW_DIR,
+    PROCESSED_DIR,
+    _apply_predicates,
+    _month_bounds,
+    _read_csv,
+    find_source_csv,
+    iter_csv_chunks,
+    load_data,
+    source_fingerprint,
+)
+from data.manifest import (
+    diff_months,
+    file_fingerprint,
+    load_manifest,
+    merge_month_hashes,
+    month_hashes,
+    record_product,
+    same_file,
+    save_manifest,
+)
+from data.snapshot import SNAPSHOT_DIR, write_snapshot
+from data.store import STORE_DIR, clear_product, delete_months, has_product, read_store, store_months, write_partitions
+from data.transforms import source_columns, transform
 from data.dimensions import get_all_dimensions
 
-
-def _normalise_column_name(name: str) -> str:
-    """Strip MainData[, RespondentProfile[, etc. prefixes."""
-    if not name:
-        return name
-    name = name.replace("\ufeff", "").strip()
-    for prefix in ("MainData_Motor[", "MainData[", "RespondentProfile["):
-        if name.startswith(prefix):
-            name = name[len(prefix) :]
-    if name.endswith("]"):
-        name = name[:-1]
-    return name.strip()
-
-
-def _read_csv(path: Path) -> pd.DataFrame:
-    """Read CSV and normalise column names."""
-    df = pd.read_csv(path, dtype=str, low_memory=False)
-    df.columns = [_normalise_column_name(c) for c in df.columns]
-    return df
+PRODUCTS = ("Motor", "Home")
+# Process pool size for the full refresh (REFRESH_WORKERS env, default: one per CPU)
+DEFAULT_WORKERS = int(os.getenv("REFRESH_WORKERS", "0")) or (os.cpu_count() or 1)
 
 
 def refresh_product(product: str, csv_path: Path | None = None) -> pd.DataFrame:
     """
     Load CSV from path or default location, transform, return DataFrame.
-    Uses load_data (same as app) so DATA_DIR, raw, fallback are all respected.
+    Source CSVs (DATA_DIR, raw, fallback) take precedence over processed data so a
+    refresh never re-reads its own output; load_data is the last resort.
     """
-    if csv_path and csv_path.exists():
-        df = _read_csv(csv_path)
-        return transform(df, product)
+    source = csv_path if csv_path and csv_path.exists() else find_source_csv(product)
+    if source is not None:
+        return transform(_read_csv(source), product, copy=False)
     df, _ = load_data(product)
     return df
 
 
-def run_refresh() -> None:
+def _app_source_columns() -> list[str]:
+    """Columns the app loads: those analytics modules declare plus their transform inputs."""
+    from analytics.columns import app_columns
+
+    return source_columns(app_columns())
+
+
+def app_window(df: pd.DataFrame) -> pd.DataFrame:
+    """The app dataset within df: last APP_HISTORY_MONTHS, app columns (what workers load)."""
+    return _apply_predicates(df, APP_HISTORY_MONTHS, None, None, _app_source_columns())
+
+
+def save_snapshot(df: pd.DataFrame, product: str, snapshot_dir: Path = SNAPSHOT_DIR) -> Path:
+    """
+    Write the app dataset (app_window) as the Arrow IPC snapshot workers memory-map, sorted
+    by Product and RenewalYearMonth so the app's time windows are contiguous slices
+    (analytics.filter_index). Call after the store is written: the snapshot records the
+    fingerprint of the source workers would load (source_fingerprint) and is used while it matches.
+    """
+    from analytics.columns import app_columns
+    from analytics.filter_index import sort_for_index
+
+    source = source_fingerprint(product, APP_HISTORY_MONTHS, app_columns())
+    return write_snapshot(sort_for_index(app_window(df)), product, snapshot_dir, source)
+
+
+def stream_product(
+    product: str,
+    chunk_size: int,
+    csv_path: Path | None = None,
+    store_dir: Path = STORE_DIR,
+) -> tuple[int, pd.DataFrame]:
+    """
+    Streaming refresh: chunked CSV -> transform -> store partitions, then read back only the
+    app window (app_window: last APP_HISTORY_MONTHS, app columns) for the snapshot, cube and
+    dimensions. Returns (rows written, app window). Peak memory is bounded by chunk_size
+    during ingestion and by the app dataset afterwards, not by the full history.
+    """
+    source = csv_path if csv_path and csv_path.exists() else find_source_csv(product)
+    if source is None:
+        raise FileNotFoundError(f"No source CSV found for {product}")
+    clear_product(product, store_dir)
+    rows = 0
+    for i, chunk in enumerate(iter_csv_chunks(source, chunk_size)):
+        rows += write_partitions(transform(chunk, product, copy=False), product, store_dir, basename=f"chunk{i:05d}", replace=False)
+    if not has_product(product, store_dir):
+        return rows, pd.DataFrame()
+    start, _ = _month_bounds(store_months(product, store_dir), APP_HISTORY_MONTHS, None, None)
+    return rows, read_store(product, start_month=start, columns=_app_source_columns(), store_dir=store_dir)
+
+
+def _month_mask(months: pd.Series, keys: list[str]) -> pd.Series:
+    """Rows whose RenewalYearMonth is in keys (manifest month keys, "missing" = NA)."""
+    mask = months.isin([int(k) for k in keys if k != "missing"])
+    if "missing" in keys:
+        mask |= months.isna()
+    return mask
+
+
+def refresh_product_incremental(
+    product: str,
+    manifest: dict,
+    store_dir: Path = STORE_DIR,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> dict:
+    """
+    Incremental refresh for one product. Skips the source if its fingerprint is unchanged;
+    otherwise hashes rows per RenewalYearMonth, transforms only new/changed months and
+    replaces just those month partitions in the store.
+    Returns dict: status (unchanged/updated), changed, removed (month keys), df (or None).
+    """
+    source = find_source_csv(product)
+    if source is None:
+        raise FileNotFoundError(f"No source CSV found for {product}")
+    fingerprint = file_fingerprint(source)
+    entry = manifest.get("products", {}).get(product)
+    have_output = has_product(product, store_dir)
+    if entry and have_output and same_file(entry.get("source"), fingerprint):
+        return {"status": "unchanged", "changed": [], "removed": [], "df": None}
+
+    # Pass 1: per-month content hashes of the raw source (bounded memory)
+    hashes = merge_month_hashes([month_hashes(chunk) for chunk in iter_csv_chunks(source, chunk_size)])
+    if entry and have_output:
+        changed, removed = diff_months(entry.get("months"), hashes)
+    else:
+        changed, removed = sorted(hashes), []
+
+    # Pass 2: drop stale partitions, transform and write only rows in changed months
+    if not (entry and have_output):
+        clear_product(product, store_dir)
+    delete_months(product, changed + removed, store_dir)
+    if changed:
+        for i, chunk in enumerate(iter_csv_chunks(source, chunk_size)):
+            chunk = chunk[_month_mask(chunk["RenewalYearMonth"], changed)]
+            if len(chunk) > 0:
+                write_partitions(transform(chunk, product, copy=False), product, store_dir, basename=f"chunk{i:05d}", replace=False)
+    df = read_store(product, store_dir=store_dir) if has_product(product, store_dir) else pd.DataFrame()
+    record_product(manifest, product, fingerprint, hashes)
+    return {"status": "updated", "changed": changed, "removed": removed, "df": df}
+
+
+def run_incremental_refresh(chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """
+    Incremental refresh: only new or changed waves are transformed, and only the
+    Bayesian cache windows and dimensions those waves touch are rebuilt.
+    """
+    from analytics.bayesian_precompute import affected_windows, update_precompute
+    from analytics.count_cube import save_cube
+
+    PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest()
+    for product in PRODUCTS:
+        try:
+            result = refresh_product_incremental(product, manifest, chunk_size=chunk_size)
+        except FileNotFoundError as e:
+            print(f"{product}: skipped - {e}")
+            continue
+        if result["status"] == "unchanged":
+            print(f"{product}: source unchanged - nothing to do")
+            continue
+        df = result["df"]
+        changed, removed = result["changed"], result["removed"]
+        print(f"{product}: {len(df)} rows -> {STORE_DIR} (changed months: {changed or 'none'}, removed: {removed or 'none'})")
+        if not (changed or removed):
+            continue
+        get_all_dimensions(df)  # validate dimensions build
+        save_snapshot(df, product)
+        save_cube(app_window(df), product)
+        months = [int(m) for m in changed + removed if m != "missing"]
+        windows = affected_windows(months, df["RenewalYearMonth"].max() if len(df) else None)
+        try:
+            path = update_precompute(df, product, windows)
+            print(f"{product}: Bayesian cache windows {windows or 'none'} -> {path}")
+        except Exception as e:
+            print(f"{product}: Bayesian pre-compute: {e}")
+    save_manifest(manifest)
+
+
+def run_stage(name: str, func: Callable, tasks: list[tuple], workers: int) -> list:
     """
-    Main refresh: load Motor (and Home if available), save Parquet, build dimensions,
-    pre-compute Bayesian cache.
+    Run func(*args) for every task, in a process pool when workers > 1 and there is more than
+    one task (else in-process). Results keep task order; prints the stage wall time.
+    """
+    t0 = time.perf_counter()
+    n_workers = max(1, min(workers, len(tasks)))
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(func, *zip(*tasks)))
+    else:
+        results = [func(*args) for args in tasks]
+    print(f"Stage {name}: {time.perf_counter() - t0:.2f}s wall ({len(tasks)} tasks, workers={n_workers})")
+    return results
+
+
+def ingest_product(
+    product: str,
+    chunk_size: int | None = None,
+    store_dir: Path = STORE_DIR,
+    snapshot_dir: Path = SNAPSHOT_DIR,
+    cube_dir: Path | None = None,
+) -> dict:
+    """
+    Pipeline stage 1 for one product: load/transform, write store partitions, snapshot and
+    count cube, build dimensions. The snapshot, cube and dimensions cover the app window
+    (what workers load); with chunk_size only that window is read back from the store.
+    Returns product, rows, per-step timings (s) and skipped (reason or None).
+    """
+    from analytics.count_cube import CUBE_DIR, save_cube
+
+    timings = {}
+    t0 = time.perf_counter()
+    try:
+        if chunk_size:
+            rows, df = stream_product(product, chunk_size, store_dir=store_dir)  # transform + write per chunk
+            timings["load_transform_write"] = time.perf_counter() - t0
+        else:
+            df = refresh_product(product)
+            rows = len(df)
+            timings["load_transform"] = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            clear_product(product, store_dir)
+            write_partitions(df, product, store_dir)
+            timings["write"] = time.perf_counter() - t0
+    except FileNotFoundError as e:
+        return {"product": product, "rows": 0, "timings": timings, "skipped": str(e)}
+    except ImportError:
+        return {"product": product, "rows": 0, "timings": timings, "skipped": "pyarrow not installed (pip install pyarrow)"}
+    df = app_window(df)
+    t0 = time.perf_counter()
+    save_snapshot(df, product, snapshot_dir)
+    timings["snapshot"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    save_cube(df, product, cube_dir or CUBE_DIR)
+    timings["cube"] = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    get_all_dimensions(df)  # validate dimensions build
+    timings["dimensions"] = time.perf_counter() - t0
+    return {"product": product, "rows": rows, "timings": timings, "skipped": None}
+
+
+def precompute_window(product: str, time_window_months: int, store_dir: Path = STORE_DIR) -> pd.DataFrame:
+    """
+    Pipeline stage 2 for one product x time window: read only the window's partitions,
+    pre-compute Bayesian rates per insurer and per insurer x demographic cell.
+    """
+    from analytics.bayesian_precompute import precompute_rates
+
+    start, end = _month_bounds(store_months(product, store_dir), time_window_months, None, None)
+    df = read_store(product, start_month=start, end_month=end, store_dir=store_dir)
+    return precompute_rates(df, product, time_window_months)
+
+
+def run_refresh(chunk_size: int | None = None, workers: int = DEFAULT_WORKERS) -> None:
+    """
+    Main refresh pipeline. Stage 1 (one task per product): load Motor/Home, rewrite store
+    partitions and snapshot, build dimensions. Stage 2 (one task per product x time window):
+    pre-compute the Bayesian cache. chunk_size enables streaming ingestion (requires pyarrow).
+    A full refresh clears the incremental manifest so the next incremental run starts clean.
     """
     import sys
     sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    from analytics.bayesian_precompute import TIME_WINDOWS, save_precompute
 
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
     RAW_DIR.mkdir(parents=True, exist_ok=True)
 
-    dfs = {}
-    for product in ("Motor", "Home"):
-        try:
-            df = refresh_product(product)
-            dfs[product] = df
-            out_path = PROCESSED_DIR / f"{product.lower()}.parquet"
-            try:
-                df.to_parquet(out_path, index=False)
-            except ImportError:
-                print(f"Warning: pyarrow not installed. Run: pip install pyarrow")
-                print(f"{product}: {len(df)} rows (Parquet not saved)")
-            else:
-                get_all_dimensions(df)  # validate dimensions build
-                print(f"{product}: {len(df)} rows -> {out_path}")
-        except FileNotFoundError as e:
-            print(f"{product}: skipped - {e}")
+    manifest = load_manifest()
+    manifest["products"] = {}
+    save_manifest(manifest)
+
+    ingested = []
+    for result in run_stage("ingest", ingest_product, [(p, chunk_size) for p in PRODUCTS], workers):
+        product = result["product"]
+        if result["skipped"]:
+            print(f"{product}: skipped - {result['skipped']}")
+            continue
+        ingested.append(product)
+        steps = ", ".join(f"{k} {v:.2f}s" for k, v in result["timings"].items())
+        mode = f"streamed, chunk_size={chunk_size}; " if chunk_size else ""
+        print(f"{product}: {result['rows']} rows -> {STORE_DIR} ({mode}{steps})")
 
-    # Bayesian pre-compute
+    # Bayesian pre-compute (Motor required, as before)
+    if "Motor" not in ingested:
+        return
     try:
-        from analytics.bayesian_precompute import run_precompute
-        df_motor = dfs.get("Motor")
-        df_home = dfs.get("Home")
-        if df_motor is not None and len(df_motor) > 0:
-            path = run_precompute(df_motor, df_home if df_home is not None and len(df_home) > 0 else None)
-            if path:
-                print(f"Bayesian cache -> {path}")
-            else:
-                print("Bayesian cache: skipped (pyarrow required)")
+        tasks = [(p, tw) for p in ingested for tw in TIME_WINDOWS]
+        path = save_precompute(run_stage("precompute", precompute_window, tasks, workers))
+        if path:
+            print(f"Bayesian cache -> {path}")
+        else:
+            print("Bayesian cache: skipped (pyarrow required)")
     except Exception as e:
         print(f"Bayesian pre-compute: {e}")
 
 
 if __name__ == "__main__":
-    run_refresh()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Refresh processed data and caches.")
+    parser.add_argument("--chunk-size", type=int, default=None, help="stream CSVs in chunks of N rows")
+    parser.add_argument("--incremental", action="store_true", help="only process new or changed months")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="process pool size for the full refresh (1 = in-process)")
+    args = parser.parse_args()
+    if args.incremental:
+        run_incremental_refresh(chunk_size=args.chunk_size or DEFAULT_CHUNK_SIZE)
+    else:
+        run_refresh(chunk_size=args.chunk_size, workers=args.workers)
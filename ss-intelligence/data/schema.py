@@ -0,0 +1,185 @@
+"""
+Declared column schema for survey extracts.
+Maps low-cardinality columns to category, flags to bool, year-month keys to int32
+and multi-code Q columns (Q9b*, Q11_*) to uint8. Applied at parse time by the loader
+and again at the end of transform so derived columns keep compact dtypes.
+"""
+import numpy as np
+import pandas as pd
+
+# Low-cardinality text columns (source and derived) stored as pandas category
+CATEGORY_COLUMNS = (
+    "Product",
+    "Shoppers",
+    "Switchers",
+    "Retained",
+    "CurrentCompany",
+    "PreRenewalCompany",
+    "PreviousCompany",
+    "Region",
+    "Age Group",
+    "AgeBand",
+    "Gender",
+    "Employment status",
+    "Are you insured",
+    "Claimants",
+    "Did you use a PCW for shopping",
+    "Renewal premium change",
+    "Renewal premium change combined",
+    "Renewal  premium change combined",
+    "How much higher",
+    "How much lower",
+    "PaymentType",
+    "PriceDirection",
+    "Q6a",
+    "Q6b",
+    "Q8",
+    "Q13a",
+    "Q18",
+    "Q19",
+    "Q30",
+    "Q31",
+    "Q33",
+    "Q36",
+    "Q37",
+    "Q43",
+)
+
+# YYYYMM keys
+INT32_COLUMNS = ("RenewalYearMonth", "SurveyYearMonth")
+
+# Derived respondent flags
+BOOL_COLUMNS = ("IsShopper", "IsSwitcher", "IsNewToMarket", "IsRetained", "UsedPCW")
+
+# Multi-code blocks: one 0/1 column per code (Q9b_1, Q9b_2, Q11_1, ...)
+MULTI_CODE_PREFIXES = ("Q9b", "Q11_")
+
+
+def column_dtype(name: str) -> str | None:
+    """Declared dtype for a (normalised) column name, or None if undeclared."""
+    if name in CATEGORY_COLUMNS:
+        return "category"
+    if name in INT32_COLUMNS:
+        return "int32"
+    if name in BOOL_COLUMNS:
+        return "bool"
+    if name.startswith(MULTI_CODE_PREFIXES):
+        return "uint8"
+    return None
+
+
+def select_columns(available, patterns) -> list[str]:
+    """
+    Names in available (kept in that order) matching patterns: exact names, or prefixes
+    written with a trailing "*" (e.g. "Q9b*" for the Q9b_1, Q9b_2, ... multi-code block).
+    """
+    exact = {p for p in patterns if not p.endswith("*")}
+    prefixes = tuple(p[:-1] for p in patterns if p.endswith("*"))
+    return [c for c in available if c in exact or (prefixes and c.startswith(prefixes))]
+
+
+def read_dtypes(columns: list[str]) -> dict:
+    """
+    dtype mapping for pd.read_csv, keyed by normalised column name.
+    Categories are parsed directly; everything else is read as str and coerced by apply_schema.
+    """
+    return {c: ("category" if column_dtype(c) == "category" else str) for c in columns}
+
+
+def _to_int32(series: pd.Series) -> pd.Series:
+    """YYYYMM to int32; nullable Int32 when some values are missing or unparseable."""
+    values = pd.to_numeric(series, errors="coerce")
+    if values.isna().any():
+        return values.round().astype("Int32")
+    return values.astype("int32")
+
+
+def _to_bool(series: pd.Series) -> pd.Series:
+    """Flags to bool. Missing counts as False."""
+    if series.dtype == bool:
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        return series.fillna(0).astype(bool)
+    s = series.astype(str).str.strip().str.lower()
+    return s.isin(("true", "1", "yes"))
+
+
+def _to_uint8(series: pd.Series) -> pd.Series:
+    """Multi-code 0/1 (or small code) values to uint8. Blank = 0."""
+    if series.dtype == np.uint8:
+        return series
+    values = pd.to_numeric(series, errors="coerce").fillna(0)
+    return values.clip(0, 255).astype(np.uint8)
+
+
+def coerce_column(series: pd.Series, dtype: str) -> pd.Series:
+    """Coerce one column to its declared dtype."""
+    if dtype == "category":
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+    if dtype == "int32":
+        if series.dtype == np.int32:
+            return series
+        if str(series.dtype) == "Int32":
+            return series if series.isna().any() else series.astype("int32")
+        return _to_int32(series)
+    if dtype == "bool":
+        return _to_bool(series)
+    if dtype == "uint8":
+        return _to_uint8(series)
+    return series
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Coerce every declared column present in df to its schema dtype (in place, returns df)."""
+    if df is None or len(df.columns) == 0:
+        return df
+    for col in df.columns:
+        dtype = column_dtype(col)
+        if dtype is not None:
+            df[col] = coerce_column(df[col], dtype)
+    return df
+
+
+def concat_typed(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Concatenate frames without losing categorical dtypes: categories are unioned first,
+    since pd.concat falls back to object when category sets differ.
+    """
+    frames = [f for f in frames if f is not None and len(f.columns) > 0]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    cat_cols = [
+        c for c in frames[0].columns
+        if isinstance(frames[0][c].dtype, pd.CategoricalDtype)
+        and all(c in f.columns and isinstance(f[c].dtype, pd.CategoricalDtype) for f in frames)
+    ]
+    if cat_cols:
+        frames = [f.copy(deep=False) for f in frames]
+        for col in cat_cols:
+            categories = pd.Index(pd.unique(np.concatenate([np.asarray(f[col].cat.categories, dtype=object) for f in frames])))
+            for f in frames:
+                f[col] = f[col].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_report(df: pd.DataFrame, top_n: int = 10) -> dict:
+    """
+    Memory footprint of a DataFrame.
+    Returns total_mb, by_dtype (MB per dtype) and top_columns (largest columns, MB).
+    """
+    if df is None:
+        return {"total_mb": 0.0, "by_dtype": {}, "top_columns": []}
+    usage = df.memory_usage(deep=True, index=True)
+    col_usage = usage.drop("Index", errors="ignore")
+    by_dtype: dict[str, float] = {}
+    for col, nbytes in col_usage.items():
+        key = str(df[col].dtype)
+        by_dtype[key] = by_dtype.get(key, 0.0) + float(nbytes) / 1e6
+    top = col_usage.sort_values(ascending=False).head(top_n)
+    return {
+        "total_mb": round(float(usage.sum()) / 1e6, 2),
+        "by_dtype": {k: round(v, 2) for k, v in sorted(by_dtype.items(), key=lambda kv: -kv[1])},
+        "top_columns": [(str(c), round(float(b) / 1e6, 2)) for c, b in top.items()],
+    }
@@ -0,0 +1,169 @@
+"""
+Immutable app dataset as an Arrow IPC (Feather v2) file per product, written by the refresh.
+Workers memory-map the file instead of building their own copy, so gunicorn workers share
+one physical copy through the OS page cache. write_frame / read_frame are also used by the
+loader's transformed-frame cache.
+
+Columns are stored in pandas' own memory layout so reading back needs no conversion:
+categoricals as their integer codes (categories in the field metadata), bools as uint8.
+Numeric, bool, category-code and str columns are then views over the mapped file; only
+nullable (Int32) columns are copied. The mapped frame is read-only - callers filter and
+derive new frames as they already do, they must not modify it in place.
+A snapshot records the loader.source_fingerprint it was built from and is only used while
+that still matches the source (load_snapshot), so a newer CSV or store is never hidden by it.
+Set DATA_SNAPSHOT=0 to ignore snapshots and load from the store/CSV in every worker.
+Requires pyarrow.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent / "processed" / "snapshot"
+SNAPSHOT_ENABLED = os.getenv("DATA_SNAPSHOT", "1") != "0"
+
+_CATEGORIES_KEY = b"ss.categories"
+_DTYPE_KEY = b"ss.dtype"
+_SOURCE_KEY = b"ss.source"
+# Default string dtype: Arrow-backed "str" on pandas 3, which can wrap the mapped buffers as-is
+_STR_DTYPE = pd.Series([""]).dtype
+
+
+def snapshot_path(product: str, snapshot_dir: Path = SNAPSHOT_DIR) -> Path:
+    """Snapshot file for one product."""
+    return Path(snapshot_dir) / f"{product.lower()}.arrow"
+
+
+def has_snapshot(product: str, snapshot_dir: Path = SNAPSHOT_DIR) -> bool:
+    """True if a snapshot exists for product."""
+    return snapshot_path(product, snapshot_dir).exists()
+
+
+def _column_array(series: pd.Series):
+    """(Arrow array, field metadata) for one column in pandas' memory layout."""
+    import pyarrow as pa
+
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = [str(c) for c in series.cat.categories]
+        meta = {_CATEGORIES_KEY: json.dumps(categories).encode()}
+        return pa.array(series.cat.codes.to_numpy()), meta
+    if series.dtype == bool:
+        return pa.array(series.to_numpy().view(np.uint8)), {_DTYPE_KEY: b"bool"}
+    return pa.Array.from_pandas(series), None
+
+
+def write_frame(df: pd.DataFrame, path: Path, metadata: dict[bytes, bytes] | None = None) -> Path:
+    """
+    Write df as an uncompressed Arrow IPC file in pandas' layout (atomic replace), with
+    optional schema metadata. Returns the path.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    df = df.loc[:, ~df.columns.duplicated()]
+    arrays, fields = [], []
+    for col in df.columns:
+        array, meta = _column_array(df[col])
+        arrays.append(array)
+        fields.append(pa.field(str(col), array.type, metadata=meta))
+    table = pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=metadata))
+    # Own temp file per writer (gunicorn workers may fill the same cache entry at once)
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False) as f:
+        tmp = Path(f.name)
+    try:
+        with pa.OSFile(str(tmp), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
+def _nullable_int_dtype(arrow_type):
+    """pandas nullable integer dtype (Int32, UInt8, ...) for an Arrow integer type."""
+    name = str(arrow_type)
+    return pd.api.types.pandas_dtype("UInt" + name[4:] if name.startswith("uint") else "I" + name[1:])
+
+
+def read_frame(path: Path) -> pd.DataFrame:
+    """Memory-map a file written by write_frame (zero-copy where the layout allows, see module docstring)."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    source = pa.memory_map(str(path), "r")
+    table = ipc.open_file(source).read_all()
+    types_mapper = None
+    if isinstance(_STR_DTYPE, pd.StringDtype):
+        types_mapper = lambda t: _STR_DTYPE if pa.types.is_large_string(t) or pa.types.is_string(t) else None
+    df = table.to_pandas(split_blocks=True, types_mapper=types_mapper)
+    columns = {}
+    for field in table.schema:
+        meta = field.metadata or {}
+        values = df[field.name]
+        if pa.types.is_integer(field.type) and table.column(field.name).null_count:
+            # Nullable ints (e.g. Int32 RenewalYearMonth with gaps) come back as float otherwise
+            values = table.column(field.name).to_pandas(types_mapper=_nullable_int_dtype)
+        elif _CATEGORIES_KEY in meta:
+            dtype = pd.CategoricalDtype(json.loads(meta[_CATEGORIES_KEY]))
+            values = pd.Categorical.from_codes(values.to_numpy(), dtype=dtype, validate=False)
+        elif meta.get(_DTYPE_KEY) == b"bool":
+            values = values.to_numpy().view(bool)
+        columns[field.name] = pd.Series(values, name=field.name, copy=False)
+    # Build from per-column Series (not setitem) so no column is copied or consolidated
+    return pd.DataFrame(columns, copy=False)
+
+
+def write_snapshot(df: pd.DataFrame, product: str, snapshot_dir: Path = SNAPSHOT_DIR, source: str | None = None) -> Path:
+    """Write the snapshot for product, recording the source fingerprint it was built from. Returns the path."""
+    metadata = {_SOURCE_KEY: source.encode()} if source else None
+    return write_frame(df, snapshot_path(product, snapshot_dir), metadata)
+
+
+def snapshot_source(product: str, snapshot_dir: Path = SNAPSHOT_DIR) -> str | None:
+    """Source fingerprint recorded in product's snapshot (schema only), None if absent or unreadable."""
+    path = snapshot_path(product, snapshot_dir)
+    if not path.exists():
+        return None
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        with pa.memory_map(str(path), "r") as source:
+            metadata = ipc.open_file(source).schema.metadata or {}
+    except (ImportError, OSError, ValueError):  # pa.ArrowInvalid is a ValueError
+        return None
+    return metadata[_SOURCE_KEY].decode() if _SOURCE_KEY in metadata else None
+
+
+def read_snapshot(product: str, snapshot_dir: Path = SNAPSHOT_DIR) -> pd.DataFrame:
+    """Memory-map the snapshot for product."""
+    return read_frame(snapshot_path(product, snapshot_dir))
+
+
+def load_snapshot(
+    product: str,
+    source: str | None,
+    load: Callable[[], pd.DataFrame],
+    snapshot_dir: Path = SNAPSHOT_DIR,
+) -> pd.DataFrame:
+    """
+    product's snapshot if it was built from `source` (a loader.source_fingerprint), else
+    load() - written as the new snapshot for the next worker, best effort. Snapshots without
+    a fingerprint (or source None) are never trusted.
+    """
+    if source is not None and snapshot_source(product, snapshot_dir) == source:
+        return read_snapshot(product, snapshot_dir)
+    df = load()
+    if source is not None:
+        try:
+            write_snapshot(df, product, snapshot_dir, source)
+        except (ImportError, OSError):
+            pass
+    return df
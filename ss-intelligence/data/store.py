@@ -0,0 +1,149 @@
+"""
+Hive-partitioned Parquet store: data/processed/store/Product=<p>/RenewalYearMonth=<yyyymm>/.
+Reads push product / month-range predicates and column projection down to Parquet,
+so only the partitions and columns a caller asks for are read.
+Requires pyarrow.
+"""
+import shutil
+from pathlib import Path
+
+import pandas as pd
+
+from data.schema import apply_schema, select_columns
+
+STORE_DIR = Path(__file__).resolve().parent / "processed" / "store"
+_MISSING_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def _partitioning():
+    """Hive partitioning below a product directory (int32 month key)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    return ds.partitioning(pa.schema([("RenewalYearMonth", pa.int32())]), flavor="hive")
+
+
+def stable_schema(table):
+    """
+    Arrow schema that is stable across chunks and partitions: every dictionary (category)
+    column becomes dictionary<int32, large_string> and all-null columns become large_string.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), pa.large_string()))
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.large_string())
+        fields.append(field)
+    return pa.schema(fields, metadata=table.schema.metadata)
+
+
+def product_dir(product: str, store_dir: Path = STORE_DIR) -> Path:
+    """Partition directory for one product."""
+    return Path(store_dir) / f"Product={product}"
+
+
+def has_product(product: str, store_dir: Path = STORE_DIR) -> bool:
+    """True if the store holds at least one partition for product."""
+    d = product_dir(product, store_dir)
+    return d.exists() and any(d.iterdir())
+
+
+def store_months(product: str, store_dir: Path = STORE_DIR) -> list[int]:
+    """Sorted RenewalYearMonth partitions available for product (from directory names only)."""
+    d = product_dir(product, store_dir)
+    if not d.exists():
+        return []
+    months = []
+    for p in d.iterdir():
+        key, _, value = p.name.partition("=")
+        if key == "RenewalYearMonth" and value != _MISSING_PARTITION and value.isdigit():
+            months.append(int(value))
+    return sorted(months)
+
+
+def clear_product(product: str, store_dir: Path = STORE_DIR) -> None:
+    """Remove every partition for product."""
+    shutil.rmtree(product_dir(product, store_dir), ignore_errors=True)
+
+
+def delete_months(product: str, months: list, store_dir: Path = STORE_DIR) -> None:
+    """Remove specific month partitions (None / "missing" = rows without a month)."""
+    d = product_dir(product, store_dir)
+    for m in months:
+        name = _MISSING_PARTITION if m in (None, "missing") else str(int(m))
+        shutil.rmtree(d / f"RenewalYearMonth={name}", ignore_errors=True)
+
+
+def write_partitions(
+    df: pd.DataFrame,
+    product: str,
+    store_dir: Path = STORE_DIR,
+    basename: str = "part",
+    replace: bool = True,
+) -> int:
+    """
+    Write df into month partitions of product. replace=True replaces every partition df
+    touches (others are kept); replace=False adds files next to existing ones (streaming
+    chunks, use a distinct basename per chunk). Returns rows written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if df is None or len(df) == 0:
+        return 0
+    table = pa.Table.from_pandas(df.drop(columns=["Product"], errors="ignore"), preserve_index=False)
+    table = table.cast(stable_schema(table))
+    pq.write_to_dataset(
+        table,
+        str(product_dir(product, store_dir)),
+        partitioning=_partitioning(),
+        basename_template=f"{basename}-{{i}}.parquet",
+        existing_data_behavior="delete_matching" if replace else "overwrite_or_ignore",
+    )
+    return len(df)
+
+
+def _dataset(product: str, store_dir: Path):
+    """Dataset over one product's partitions, with file schemas unified (later waves may add columns)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    path = str(product_dir(product, store_dir))
+    dataset = ds.dataset(path, format="parquet", partitioning=_partitioning())
+    try:
+        schemas = [frag.physical_schema for frag in dataset.get_fragments()]
+        schema = pa.unify_schemas(schemas + [dataset.schema], promote_options="permissive")
+        return ds.dataset(path, format="parquet", partitioning=_partitioning(), schema=schema)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return dataset
+
+
+def read_store(
+    product: str,
+    start_month: int | None = None,
+    end_month: int | None = None,
+    columns: list[str] | None = None,
+    store_dir: Path = STORE_DIR,
+) -> pd.DataFrame:
+    """
+    Read one product from the store. Month bounds (inclusive YYYYMM) prune partitions;
+    columns (names or "prefix*" patterns) restricts the Parquet columns read. Result has schema dtypes applied and a
+    Product column.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = _dataset(product, store_dir)
+    expr = None
+    if start_month is not None:
+        expr = ds.field("RenewalYearMonth") >= int(start_month)
+    if end_month is not None:
+        upper = ds.field("RenewalYearMonth") <= int(end_month)
+        expr = upper if expr is None else expr & upper
+    if columns is not None:
+        columns = select_columns(dataset.schema.names, list(columns) + ["RenewalYearMonth"])
+    df = dataset.to_table(filter=expr, columns=columns).to_pandas()
+    df.insert(0, "Product", product)
+    return apply_schema(df)
@@ -2,13 +2,70 @@
 Derived fields, cleaning, and mapping.
 Mirrors logic from src/utils/deriveFields.js and normaliseColumns.js.
 """
+import numpy as np
 import pandas as pd
 
+from data.schema import apply_schema
 
-def _derive_price_direction(row: pd.Series) -> str | None:
-    """Map renewal premium change to PriceDirection (Up, Down, Unchanged, New)."""
-    change = row.get("Renewal premium change combined") or row.get("Renewal premium change") or ""
-    s = str(change).lower().strip()
+PRICE_DIRECTIONS = ["Higher", "Lower", "Unchanged", "New"]
+
+# Source columns each derived column is built from (any one is enough). Used to turn a
+# projection of output columns into the source columns a loader must read.
+DERIVED_FROM = {
+    "IsShopper": ("Shoppers",),
+    "IsSwitcher": ("Switchers",),
+    "IsNewToMarket": ("Switchers",),
+    "IsRetained": ("Switchers",),
+    "PreviousCompany": ("PreviousCompany", "PreRenewalCompany"),
+    "AgeBand": ("AgeBand", "Age Group"),
+    "PaymentType": ("PaymentType", "Q43"),
+    "PriceDirection": ("Renewal premium change combined", "Renewal premium change"),
+    "UsedPCW": ("Did you use a PCW for shopping",),
+}
+
+
+def _unique_codes(series: pd.Series) -> tuple[np.ndarray, list]:
+    """Integer codes (-1 = missing) and unique values. Categoricals reuse their existing codes."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), list(series.cat.categories)
+    codes, uniques = pd.factorize(series)
+    return codes, list(uniques)
+
+
+def map_categories(series: pd.Series, func, categories: list | None = None) -> pd.Series:
+    """
+    Vectorised derivation: evaluate func once per unique value (and once for missing),
+    then broadcast the result to every row through integer codes. Returns a categorical;
+    pass categories to fix the category order (other results become missing).
+    """
+    codes, uniques = _unique_codes(series)
+    mapped = [func(v) for v in uniques] + [func(None)]
+    if categories is None:
+        categories = list(dict.fromkeys(m for m in mapped if m is not None))
+    position = {c: i for i, c in enumerate(categories)}
+    lut = np.array([position.get(m, -1) for m in mapped], dtype=np.int32)
+    # codes == -1 (missing) indexes the last entry, which holds func(None)
+    result = pd.Categorical.from_codes(lut[codes], categories=categories)
+    return pd.Series(result, index=series.index)
+
+
+def map_flags(series: pd.Series, func) -> np.ndarray:
+    """Like map_categories but for boolean results; returns a bool array aligned to series."""
+    codes, uniques = _unique_codes(series)
+    lut = np.array([bool(func(v)) for v in uniques] + [bool(func(None))], dtype=bool)
+    return lut[codes]
+
+
+def _normalised(val) -> str:
+    """Lower-cased, stripped string; empty for missing."""
+    if val is None or (not isinstance(val, str) and pd.isna(val)):
+        return ""
+    return str(val).strip().lower()
+
+
+def _price_direction(change) -> str | None:
+    """Map renewal premium change to PriceDirection (Higher, Lower, Unchanged, New)."""
+    s = _normalised(change)
     if not s or s == "nan":
         return None
     if "higher" in s or s == "up":
@@ -24,7 +81,7 @@ def _derive_price_direction(row: pd.Series) -> str | None:
 
 def _derive_age_band(age_group: str) -> str | None:
     """Map Age Group to AgeBand (spec format: 17-24, 25-34, 35-44, 45-54, 55-64, 65+)."""
-    if pd.isna(age_group) or not str(age_group).strip():
+    if age_group is None or pd.isna(age_group) or not str(age_group).strip():
         return None
     s = str(age_group).strip()
     # Already in spec format
@@ -34,24 +91,47 @@ def _derive_age_band(age_group: str) -> str | None:
     return s
 
 
-def _derive_used_pcw(row: pd.Series) -> bool:
+def _used_pcw(val) -> bool:
     """Did you use a PCW for shopping -> UsedPCW boolean."""
-    val = row.get("Did you use a PCW for shopping")
     return val in ("Yes", "1", True, "yes", "true")
 
 
-def transform(df: pd.DataFrame, product: str = "Motor") -> pd.DataFrame:
+def _derive_price_direction(df: pd.DataFrame) -> pd.Series:
+    """
+    PriceDirection from "Renewal premium change combined", falling back to
+    "Renewal premium change" where the combined answer is missing.
+    """
+    codes = np.full(len(df), -1, dtype=np.int8)
+    for col in ("Renewal premium change combined", "Renewal premium change"):
+        if col in df.columns:
+            mapped = map_categories(df[col], _price_direction, categories=PRICE_DIRECTIONS)
+            codes = np.where(codes >= 0, codes, mapped.cat.codes.to_numpy())
+    return pd.Series(pd.Categorical.from_codes(codes, categories=PRICE_DIRECTIONS), index=df.index)
+
+
+def source_columns(columns) -> list[str]:
+    """Output column names (or "prefix*" patterns) plus the source columns their derivations read."""
+    out = []
+    for col in columns:
+        out.append(col)
+        out.extend(DERIVED_FROM.get(col, ()))
+    return list(dict.fromkeys(out))
+
+
+def transform(df: pd.DataFrame, product: str = "Motor", copy: bool = True) -> pd.DataFrame:
     """
     Clean and derive fields. Returns DataFrame with:
     - Product, CurrentCompany, PreRenewalCompany, PreviousCompany
     - RenewalYearMonth, AgeBand, Region, PaymentType
     - IsShopper, IsSwitcher, IsNewToMarket
     - PriceDirection, UsedPCW
+    Declared schema dtypes (data.schema) are applied to source and derived columns.
+    copy=False modifies df in place (loaders pass freshly parsed frames).
     """
     if df is None or len(df) == 0:
         return df
 
-    out = df.copy()
+    out = df.copy() if copy else df
 
     # Product
     out["Product"] = product
@@ -60,26 +140,22 @@ def transform(df: pd.DataFrame, product: str = "Motor") -> pd.DataFrame:
     if "PreRenewalCompany" in out.columns and "PreviousCompany" not in out.columns:
         out["PreviousCompany"] = out["PreRenewalCompany"]
 
-    # RenewalYearMonth as numeric
-    if "RenewalYearMonth" in out.columns:
-        out["RenewalYearMonth"] = pd.to_numeric(out["RenewalYearMonth"], errors="coerce")
-
     # UniqueID
     if "UniqueID" in out.columns:
         out["UniqueID"] = out["UniqueID"].astype(str)
 
-    # Shoppers -> IsShopper
+    # Shoppers -> IsShopper (evaluated once per unique answer)
     if "Shoppers" in out.columns:
-        out["IsShopper"] = out["Shoppers"].astype(str).str.strip().str.lower() == "shoppers"
+        out["IsShopper"] = map_flags(out["Shoppers"], lambda v: _normalised(v) == "shoppers")
     else:
         out["IsShopper"] = False
 
     # Switchers -> IsSwitcher, IsNewToMarket, IsRetained
     if "Switchers" in out.columns:
-        sw = out["Switchers"].astype(str).str.strip()
-        out["IsSwitcher"] = sw.str.lower() == "switcher"
-        out["IsNewToMarket"] = sw.str.lower().str.contains("new-to-market", na=False)
-        out["IsRetained"] = sw.str.lower().isin(("retained", "non-switcher"))
+        sw = out["Switchers"]
+        out["IsSwitcher"] = map_flags(sw, lambda v: _normalised(v) == "switcher")
+        out["IsNewToMarket"] = map_flags(sw, lambda v: "new-to-market" in _normalised(v))
+        out["IsRetained"] = map_flags(sw, lambda v: _normalised(v) in ("retained", "non-switcher"))
     else:
         out["IsSwitcher"] = False
         out["IsNewToMarket"] = False
@@ -87,7 +163,7 @@ def transform(df: pd.DataFrame, product: str = "Motor") -> pd.DataFrame:
 
     # AgeBand from Age Group
     if "Age Group" in out.columns:
-        out["AgeBand"] = out["Age Group"].apply(_derive_age_band)
+        out["AgeBand"] = map_categories(out["Age Group"], _derive_age_band)
     elif "AgeBand" not in out.columns:
         out["AgeBand"] = None
 
@@ -97,14 +173,18 @@ def transform(df: pd.DataFrame, product: str = "Motor") -> pd.DataFrame:
 
     # PaymentType (Q43 maps to payment; demo data often lacks it)
     if "PaymentType" not in out.columns and "Q43" in out.columns:
-        out["PaymentType"] = out["Q43"].astype(str)
+        out["PaymentType"] = map_categories(out["Q43"], lambda v: None if v is None or pd.isna(v) else str(v))
     elif "PaymentType" not in out.columns:
         out["PaymentType"] = "All"
 
     # PriceDirection
-    out["PriceDirection"] = out.apply(_derive_price_direction, axis=1)
+    out["PriceDirection"] = _derive_price_direction(out)
 
     # UsedPCW
-    out["UsedPCW"] = out.apply(_derive_used_pcw, axis=1)
+    if "Did you use a PCW for shopping" in out.columns:
+        out["UsedPCW"] = map_flags(out["Did you use a PCW for shopping"], _used_pcw)
+    else:
+        out["UsedPCW"] = False
 
-    return out
+    # Categories, bool flags, int32 year-months, uint8 multi-code columns
+    return apply_schema(out)
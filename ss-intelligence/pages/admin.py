@@ -9,7 +9,7 @@ import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 import pandas as pd
 
-from shared import DF_MOTOR, DIMENSIONS, format_year_month
+from shared import df_motor, dimensions, format_year_month
 from analytics.demographics import apply_filters
 from analytics.flows import calc_flow_matrix
 from config import MIN_BASE_PUBLISHABLE
@@ -101,16 +101,18 @@ def layout():
     prevent_initial_call=False,
 )
 def update_admin(_path):
-    total = len(DF_MOTOR)
-    insurers = DIMENSIONS["DimInsurer"]["Insurer"].dropna().astype(str).tolist()
+    data = df_motor()
+    dims = dimensions()
+    total = len(data)
+    insurers = dims["DimInsurer"]["Insurer"].dropna().astype(str).tolist()
     eligible = 0
     for ins in insurers:
-        df = apply_filters(DF_MOTOR, insurer=ins)
+        df = apply_filters(data, insurer=ins)
         if len(df) >= MIN_BASE_PUBLISHABLE:
             eligible += 1
-    suppressed = len(DIMENSIONS["DimInsurer"]) - eligible
+    suppressed = len(dims["DimInsurer"]) - eligible
 
-    max_ym = DF_MOTOR["RenewalYearMonth"].max()
+    max_ym = data["RenewalYearMonth"].max()
     freshness = "N/A"
     if pd.notna(max_ym):
         y, m = int(max_ym // 100), int(max_ym % 100)
@@ -125,7 +127,7 @@ def update_admin(_path):
         ]
     )
 
-    by_month = DF_MOTOR.groupby("RenewalYearMonth").size().reset_index(name="count")
+    by_month = data.groupby("RenewalYearMonth").size().reset_index(name="count")
     by_month["month_label"] = by_month["RenewalYearMonth"].apply(format_year_month)
     fig = go.Figure(go.Bar(x=by_month["month_label"], y=by_month["count"]))
     fig = fig.update_layout(title="Respondents by Renewal Month")
@@ -141,7 +143,7 @@ def update_admin(_path):
     config_div = html.Pre(config_text, className="small bg-light p-3")
 
     # Data validation
-    val_results = _run_data_validation(DF_MOTOR)
+    val_results = _run_data_validation(data)
     val_rows = [
         html.Tr([
             html.Td(r["check"]),
@@ -6,15 +6,17 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from dash import html, dcc, callback, Input, Output
 import dash_bootstrap_components as dbc
+import pandas as pd
 import plotly.graph_objects as go
 
-from shared import DF_MOTOR
-from analytics.channels import calc_channel_usage, calc_quote_buy_mismatch
-from analytics.demographics import apply_filters
+from shared import df_motor
+from analytics.channels import CHANNEL_PREFIX, calc_co_usage, calc_code_usage_pair, calc_quote_buy_mismatch_pair, pcw_scorecard
+from analytics.demographics import select_market
 from analytics.suppression import check_suppression
 from components.filter_bar import filter_bar
 from components.cards import kpi_card
 from components.branded_chart import create_branded_figure
+from config import MIN_BASE_CHANNEL, MIN_BASE_NPS, MIN_BASE_PCW
 import dash
 
 dash.register_page(__name__, path="/channel-pcw", name="Channel & PCW")
@@ -28,6 +30,8 @@ def layout():
                 [dbc.Col(html.Div(id="mismatch-ch"), md=6), dbc.Col(html.Div(id="channel-usage-ch"), md=6)],
                 className="mb-4",
             ),
+            dbc.Row([dbc.Col(html.Div(id="co-usage-ch"), md=12)], className="mb-4"),
+            dbc.Row([dbc.Col(html.Div(id="pcw-scorecard-ch"), md=12)], className="mb-4"),
         ],
         fluid=True,
     )
@@ -37,24 +41,64 @@ def _norm(val):
     return None if val in (None, "ALL", "") else val
 
 
+def _co_usage(sel, insurer_view):
+    """Heatmap of % of shoppers who used both channels (diagonal = single-channel usage)."""
+    result = calc_co_usage(sel, CHANNEL_PREFIX, insurer=insurer_view)
+    if result is None:
+        return html.P("Data not available", className="text-muted")
+    both, base = result
+    if base < MIN_BASE_CHANNEL:
+        return html.P(f"Insufficient data: {base} shoppers (minimum {MIN_BASE_CHANNEL} required).", className="text-muted")
+    pct = both / base
+    fig = go.Figure(go.Heatmap(z=pct.values, x=list(pct.columns), y=list(pct.index), colorscale="Blues", texttemplate="%{z:.0%}"))
+    fig.update_layout(yaxis_autorange="reversed")
+    return dcc.Graph(figure=create_branded_figure(fig, title="Channel Co-usage (% of shoppers using both)"))
+
+
+def _ci_text(value, lower, upper, fmt):
+    return "-" if pd.isna(value) else f"{fmt(value)} ({fmt(lower)} to {fmt(upper)})"
+
+
+def _pcw_scorecard(card):
+    """PCW scorecard table: base, NPS and purchase rate with 95% CIs, PCWs under MIN_BASE_PCW dropped."""
+    card = card[card["n"] >= MIN_BASE_PCW] if card is not None else None
+    if card is None or len(card) == 0:
+        return html.P(f"Insufficient data: no PCW with {MIN_BASE_PCW}+ users.", className="text-muted")
+    rows = pd.DataFrame({"PCW": card.index, "Users": card["n"].to_numpy()})
+    if "nps" in card.columns:
+        nps = [
+            _ci_text(v, lo, hi, lambda x: f"{x:+.0f}") if n >= MIN_BASE_NPS else "-"
+            for v, lo, hi, n in zip(card["nps"], card["nps_ci_lower"], card["nps_ci_upper"], card["n"])
+        ]
+        rows["NPS (95% CI)"] = nps
+    if "purchase_rate" in card.columns:
+        rows["Purchased via PCW (95% CI)"] = [
+            _ci_text(v, lo, hi, lambda x: f"{x:.0%}")
+            for v, lo, hi in zip(card["purchase_rate"], card["purchase_ci_lower"], card["purchase_ci_upper"])
+        ]
+    return html.Div([html.H5("PCW Scorecard"), dbc.Table.from_dataframe(rows, striped=True, size="sm")])
+
+
 @callback(
-    [Output("filter-bar-ch", "children"), Output("mismatch-ch", "children"), Output("channel-usage-ch", "children")],
+    [Output("filter-bar-ch", "children"), Output("mismatch-ch", "children"), Output("channel-usage-ch", "children"), Output("co-usage-ch", "children"), Output("pcw-scorecard-ch", "children")],
     [Input("global-insurer", "value"), Input("global-age-band", "value"), Input("global-region", "value"), Input("global-payment-type", "value"), Input("global-product", "value"), Input("global-time-window", "value")],
 )
 def update_channel(insurer, age_band, region, payment_type, product, time_window):
+    data = df_motor()
     product = product or "Motor"
     tw = int(time_window or 24)
     age_band, region, payment_type = _norm(age_band), _norm(region), _norm(payment_type)
-    df_ins = apply_filters(DF_MOTOR, insurer=insurer, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
-    df_mkt = apply_filters(DF_MOTOR, insurer=None, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
-    sup = check_suppression(df_ins, df_mkt)
+    sel = select_market(data, insurer=insurer, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
+    sup = check_suppression(sel.insurer_n, sel.market_n)
     filter_bar_el = filter_bar(age_band, region, payment_type)
 
-    mis_ins = calc_quote_buy_mismatch(df_ins) if insurer and sup.can_show_insurer else None
-    mis_mkt = calc_quote_buy_mismatch(df_mkt)
+    mis_ins, mis_mkt = calc_quote_buy_mismatch_pair(sel)
+    mis_ins = mis_ins if insurer and sup.can_show_insurer else None
     mismatch_div = kpi_card("Quote-to-Buy Mismatch", mis_ins, mis_mkt) if mis_mkt is not None else html.P("Data not available", className="text-muted")
 
-    ch = calc_channel_usage(df_ins if insurer and sup.can_show_insurer else df_mkt)
+    insurer_view = bool(insurer and sup.can_show_insurer)
+    ch_ins, ch_mkt = calc_code_usage_pair(sel, CHANNEL_PREFIX)
+    ch = ch_ins if insurer_view else ch_mkt
     if ch is not None and len(ch) > 0:
         fig = go.Figure(go.Bar(x=ch.values, y=ch.index, orientation="h"))
         fig = create_branded_figure(fig, title="Channel Usage")
@@ -62,4 +106,8 @@ def update_channel(insurer, age_band, region, payment_type, product, time_window
     else:
         channel_div = html.P("Data not available", className="text-muted")
 
-    return filter_bar_el, mismatch_div, channel_div
+    card = pcw_scorecard(
+        data, insurer=insurer if insurer_view else None, product=product, time_window_months=tw,
+        age_band=age_band, region=region, payment_type=payment_type,
+    )
+    return filter_bar_el, mismatch_div, channel_div, _co_usage(sel, insurer_view), _pcw_scorecard(card)
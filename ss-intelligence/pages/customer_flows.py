@@ -5,10 +5,11 @@ sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from dash import html, dcc, callback, Input, Output
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
-from shared import DF_MOTOR
-from analytics.flows import calc_net_flow, calc_top_sources, calc_top_destinations
-from analytics.demographics import apply_filters
+from shared import df_motor
+from analytics.flows import flow_matrix
+from analytics.demographics import select_market
 from analytics.suppression import check_suppression
+from auth.access import get_authorized_insurers
 from components.filter_bar import filter_bar
 from components.cards import kpi_card
 from components.branded_chart import create_branded_figure
@@ -20,35 +21,50 @@ def layout():
         html.Div(id="filter-bar-cf"),
         dbc.Row([dbc.Col(html.Div(id="net-flow-cf"), md=12)], className="mb-4"),
         dbc.Row([dbc.Col(html.Div(id="sources-cf"), md=6), dbc.Col(html.Div(id="destinations-cf"), md=6)], className="mb-4"),
+        dbc.Row([dbc.Col(html.Div(id="heatmap-cf"), md=12)], className="mb-4"),
     ], fluid=True)
 
 def _norm(val):
     return None if val in (None, "ALL", "") else val
 
+def _heatmap(flows):
+    """
+    Previous x current insurer matrix for the top insurers by flow; suppressed cells are blank.
+    Only flows involving an insurer the user is authorised for are shown.
+    """
+    hm = flows.heatmap(top_n=20, insurers=get_authorized_insurers(list(flows.labels)))
+    if hm.empty:
+        return html.P("No switching in this selection", className="text-muted")
+    fig = go.Figure(go.Heatmap(z=hm.values, x=list(hm.columns), y=list(hm.index), hoverongaps=False, colorscale="Blues"))
+    fig.update_layout(xaxis_title="Switched to", yaxis_title="Switched from", yaxis_autorange="reversed")
+    return dcc.Graph(figure=create_branded_figure(fig, title="Switching Flows (top 20 insurers)"))
+
 @callback(
-    [Output("filter-bar-cf", "children"), Output("net-flow-cf", "children"), Output("sources-cf", "children"), Output("destinations-cf", "children")],
+    [Output("filter-bar-cf", "children"), Output("net-flow-cf", "children"), Output("sources-cf", "children"), Output("destinations-cf", "children"), Output("heatmap-cf", "children")],
     [Input("global-insurer", "value"), Input("global-age-band", "value"), Input("global-region", "value"), Input("global-payment-type", "value"), Input("global-product", "value"), Input("global-time-window", "value")],
 )
 def update_flows(insurer, age_band, region, payment_type, product, time_window):
+    data = df_motor()
     product = product or "Motor"
     tw = int(time_window or 24)
     age_band, region, payment_type = _norm(age_band), _norm(region), _norm(payment_type)
-    df = apply_filters(DF_MOTOR, insurer=insurer, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
-    df_mkt = apply_filters(DF_MOTOR, insurer=None, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
-    sup = check_suppression(df, df_mkt)
+    sel = select_market(data, insurer=insurer, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
+    flows = flow_matrix(data, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
+    sup = check_suppression(sel.insurer_n, sel.market_n)
     filter_bar_el = filter_bar(age_band, region, payment_type)
+    heatmap_el = _heatmap(flows) if sup.can_show_market else html.P("Insufficient market data for the flow matrix", className="text-muted")
     if not insurer:
-        return filter_bar_el, html.P("Select an insurer", className="text-muted"), html.P("Select an insurer", className="text-muted"), html.P("Select an insurer", className="text-muted")
+        return filter_bar_el, html.P("Select an insurer", className="text-muted"), html.P("Select an insurer", className="text-muted"), html.P("Select an insurer", className="text-muted"), heatmap_el
     if not sup.can_show_insurer:
-        return filter_bar_el, html.P(sup.message, className="text-muted"), html.Div("—", className="text-muted"), html.Div("—", className="text-muted")
-    nf = calc_net_flow(df_mkt, insurer)
+        return filter_bar_el, html.P(sup.message, className="text-muted"), html.Div("—", className="text-muted"), html.Div("—", className="text-muted"), heatmap_el
+    nf = flows.net_flow(insurer)
     net_div = dbc.Row([
         dbc.Col(kpi_card("Gained", nf["gained"], nf["gained"], format_str="{:.0f}"), md=4),
         dbc.Col(kpi_card("Lost", nf["lost"], nf["lost"], format_str="{:.0f}"), md=4),
         dbc.Col(kpi_card("Net", nf["net"], nf["net"], format_str="{:.0f}"), md=4),
     ])
-    src = calc_top_sources(df_mkt, insurer, 10)
-    dst = calc_top_destinations(df_mkt, insurer, 10)
+    src = flows.top_sources(insurer, 10)
+    dst = flows.top_destinations(insurer, 10)
     # Sort ascending so largest appears at top (Plotly renders first y at bottom)
     src = src.sort_values(ascending=True) if len(src) > 0 else src
     dst = dst.sort_values(ascending=True) if len(dst) > 0 else dst
@@ -56,4 +72,4 @@ def update_flows(insurer, age_band, region, payment_type, product, time_window):
     fig_dst = go.Figure(go.Bar(x=dst.values, y=dst.index, orientation="h")) if len(dst) > 0 else go.Figure()
     fig_src = create_branded_figure(fig_src, title="Gaining From")
     fig_dst = create_branded_figure(fig_dst, title="Losing To")
-    return filter_bar_el, net_div, dcc.Graph(figure=fig_src), dcc.Graph(figure=fig_dst)
+    return filter_bar_el, net_div, dcc.Graph(figure=fig_src), dcc.Graph(figure=fig_dst), heatmap_el
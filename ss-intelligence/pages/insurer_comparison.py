@@ -6,9 +6,9 @@ from dash import html, dcc, callback, Input, Output
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 import pandas as pd
-from shared import DF_MOTOR, DIMENSIONS
+from shared import df_motor, dimensions
 from analytics.rates import calc_retention_rate
-from analytics.bayesian import bayesian_smooth_rate
+from analytics.bayesian_precompute import smoothed_retention_by_insurer
 from analytics.demographics import apply_filters
 from config import MIN_BASE_PUBLISHABLE
 from components.filter_bar import filter_bar
@@ -27,28 +27,34 @@ def layout():
 def _norm(val):
     return None if val in (None, "ALL", "") else val
 
+def retention_table(df_mkt: pd.DataFrame, insurers: list[str], market_ret: float | None) -> pd.DataFrame:
+    """Insurer, n, Retention for every eligible insurer (one groupby + one batched smoothing call)."""
+    if market_ret is None:
+        return pd.DataFrame()
+    bay = smoothed_retention_by_insurer(df_mkt, market_ret, insurers=insurers, min_base=MIN_BASE_PUBLISHABLE)
+    if len(bay) == 0:
+        return pd.DataFrame()
+    return pd.DataFrame({
+        "Insurer": bay["insurer"],
+        "n": bay["n"],
+        "Retention": ["%.1f%%" % (r * 100) for r in bay["posterior_mean"]],
+    })
+
 @callback(
     [Output("filter-bar-comp", "children"), Output("retention-chart-comp", "children"), Output("metrics-table-comp", "children")],
     [Input("global-age-band", "value"), Input("global-region", "value"), Input("global-payment-type", "value"), Input("global-product", "value"), Input("global-time-window", "value")],
 )
 def update_comparison(age_band, region, payment_type, product, time_window):
+    data = df_motor()
+    dims = dimensions()
     product = product or "Motor"
     tw = int(time_window or 24)
     age_band, region, payment_type = _norm(age_band), _norm(region), _norm(payment_type)
-    df_mkt = apply_filters(DF_MOTOR, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
+    df_mkt = apply_filters(data, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
     market_ret = calc_retention_rate(df_mkt)
-    all_insurers = DIMENSIONS["DimInsurer"]["Insurer"].dropna().astype(str).tolist()
+    all_insurers = dims["DimInsurer"]["Insurer"].dropna().astype(str).tolist()
     insurers = get_authorized_insurers(all_insurers)
-    rows = []
-    for ins in insurers:
-        df_ins = apply_filters(DF_MOTOR, insurer=ins, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
-        if len(df_ins) < MIN_BASE_PUBLISHABLE:
-            continue
-        retained = (df_ins["IsRetained"] & ~df_ins["IsNewToMarket"]).sum()
-        total = len(df_ins[~df_ins["IsNewToMarket"]])
-        bay = bayesian_smooth_rate(int(retained), total, market_ret)
-        rows.append({"Insurer": ins, "n": total, "Retention": "%.1f%%" % (bay["posterior_mean"] * 100)})
-    df_tbl = pd.DataFrame(rows)
+    df_tbl = retention_table(df_mkt, insurers, market_ret)
     eligible = len(df_tbl)
     filter_bar_el = filter_bar(age_band, region, payment_type, eligible_count=eligible)
     if len(df_tbl) > 0:
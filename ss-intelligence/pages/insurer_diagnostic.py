@@ -8,14 +8,14 @@ from dash import html, dcc, callback, Input, Output
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 
-from shared import DF_MOTOR
-from analytics.rates import calc_retention_rate
+from shared import count_cube, df_motor
+from analytics.rates import calc_rates_pair
 from analytics.bayesian import bayesian_smooth_rate
 from analytics.bayesian_precompute import get_cached_rate
-from analytics.demographics import apply_filters, get_active_filters
+from analytics.demographics import get_active_filters, select_market
 from analytics.suppression import check_suppression
-from analytics.flows import calc_net_flow, calc_top_sources, calc_top_destinations
-from analytics.reasons import calc_reason_comparison
+from analytics.flows import flow_matrix
+from analytics.reasons import calc_reason_comparison_pair
 from components.cards import kpi_card
 from components.filter_bar import filter_bar
 from components.confidence_banner import confidence_banner
@@ -57,6 +57,16 @@ def layout():
     )
 
 
+def _reason_comparison(sel, question, filters):
+    """Insurer vs market ranking from the count cube's reason index, else one pass over the selection."""
+    cube = count_cube("Motor")  # built from the same dataset as df_motor()
+    if cube is not None and question in cube.reasons:
+        return cube.reason_comparison(question, sel.insurer, 5, **filters)
+    if question not in sel.market.columns:
+        return {"insurer": [], "market": []}
+    return calc_reason_comparison_pair(sel, question, 5)
+
+
 def _norm(val):
     if val in (None, "ALL", ""):
         return None
@@ -84,38 +94,41 @@ def _norm(val):
     ],
 )
 def update_insurer_diagnostic(insurer, age_band, region, payment_type, product, time_window):
+    data = df_motor()
     product = product or "Motor"
     tw = int(time_window or 24)
     age_band = _norm(age_band)
     region = _norm(region)
     payment_type = _norm(payment_type)
 
-    df_ins = apply_filters(DF_MOTOR, insurer=insurer, age_band=age_band, region=region, payment_type=payment_type, product=product, time_window_months=tw)
-    df_mkt = apply_filters(DF_MOTOR, insurer=None, age_band=age_band, region=region, payment_type=payment_type, product=product, time_window_months=tw)
+    # Market rows once, insurer rows as a mask over them
+    sel = select_market(data, insurer=insurer, age_band=age_band, region=region, payment_type=payment_type, product=product, time_window_months=tw)
+    rates_ins, rates_mkt = calc_rates_pair(sel)
+    market_ret = rates_mkt["retention"] if rates_mkt else None
 
-    sup = check_suppression(df_ins, df_mkt, active_filters=get_active_filters(age_band, region, payment_type))
+    sup = check_suppression(sel.insurer_n, sel.market_n, active_filters=get_active_filters(age_band, region, payment_type))
     filter_bar_el = filter_bar(age_band, region, payment_type)
     tw_str = "%d months" % tw
-    conf_banner = confidence_banner(df_ins.shape[0], tw_str, age_band, region, payment_type, suppression_message=sup.message)
+    conf_banner = confidence_banner(sel.insurer_n, tw_str, age_band, region, payment_type, suppression_message=sup.message)
 
     # Retention card
     if sup.can_show_insurer and insurer:
-        market_ret = calc_retention_rate(df_mkt)
-        # Use cache only when no demographic filters (cache is insurer × product × time_window only)
-        cached = get_cached_rate(insurer, product, tw) if not (age_band or region or payment_type) else None
+        # Cache holds every insurer × demographic cell, so filtered views hit it too
+        cached = get_cached_rate(insurer, product, tw, age_band, region, payment_type)
         if cached:
             bay = cached
         else:
-            retained = (df_ins["IsRetained"] & ~df_ins["IsNewToMarket"]).sum()
-            total = len(df_ins[~df_ins["IsNewToMarket"]])
+            retained = rates_ins["counts"]["retained"] if rates_ins else 0
+            total = rates_ins["counts"]["base"] if rates_ins else 0
             bay = bayesian_smooth_rate(int(retained), total, market_ret) if total > 0 else {"posterior_mean": market_ret, "ci_lower": market_ret, "ci_upper": market_ret}
         ret_card = kpi_card("Your Retention", bay["posterior_mean"], market_ret, ci_lower=bay.get("ci_lower"), ci_upper=bay.get("ci_upper"))
     else:
-        ret_card = kpi_card("Your Retention", None, calc_retention_rate(df_mkt), suppression_message=sup.message)
+        ret_card = kpi_card("Your Retention", None, market_ret, suppression_message=sup.message)
 
     # Net flow (use filtered df for demographic consistency)
+    flows = flow_matrix(data, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
     if insurer and sup.can_show_insurer:
-        nf = calc_net_flow(df_mkt, insurer)
+        nf = flows.net_flow(insurer)
         net_div = dbc.Row([
             dbc.Col(kpi_card("Gained", nf["gained"], nf["gained"], format_str="{:.0f}"), md=4),
             dbc.Col(kpi_card("Lost", nf["lost"], nf["lost"], format_str="{:.0f}"), md=4),
@@ -126,8 +139,8 @@ def update_insurer_diagnostic(insurer, age_band, region, payment_type, product,
 
     # Top sources / destinations (use filtered df for demographic consistency)
     if insurer and sup.can_show_insurer:
-        src = calc_top_sources(df_mkt, insurer, 10)
-        dst = calc_top_destinations(df_mkt, insurer, 10)
+        src = flows.top_sources(insurer, 10)
+        dst = flows.top_destinations(insurer, 10)
         # Sort ascending so largest appears at top (Plotly renders first y at bottom)
         src = src.sort_values(ascending=True) if len(src) > 0 else src
         dst = dst.sort_values(ascending=True) if len(dst) > 0 else dst
@@ -142,8 +155,9 @@ def update_insurer_diagnostic(insurer, age_band, region, payment_type, product,
         dst_div = html.P("Select an insurer", className="text-muted")
 
     # Why Stay (Q18), Why Leave (Q31)
-    cmp_stay = calc_reason_comparison(df_ins, df_mkt, "Q18", 5) if "Q18" in DF_MOTOR.columns else {"insurer": [], "market": []}
-    cmp_leave = calc_reason_comparison(df_ins, df_mkt, "Q31", 5) if "Q31" in DF_MOTOR.columns else {"insurer": [], "market": []}
+    market_filters = dict(product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
+    cmp_stay = _reason_comparison(sel, "Q18", market_filters)
+    cmp_leave = _reason_comparison(sel, "Q31", market_filters)
     stay_tbl = dual_table(cmp_stay.get("insurer"), cmp_stay.get("market"), "Why Customers Stay", "Market", "stay") if cmp_stay else html.P("Data not available")
     leave_tbl = dual_table(cmp_leave.get("insurer"), cmp_leave.get("market"), "Why Customers Leave", "Market", "leave") if cmp_leave else html.P("Data not available")
 
@@ -4,20 +4,31 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 from dash import html, dcc, callback, Input, Output
 import dash_bootstrap_components as dbc
+import numpy as np
 import plotly.graph_objects as go
-from shared import DF_MOTOR
-from analytics.price import calc_price_direction_dist
-from analytics.demographics import apply_filters
+from shared import df_motor
+from analytics.price import PRICE_DIRECTIONS, calc_price_direction_dist_pair, calc_rates_by_price_band, calc_rates_by_price_direction
+from analytics.demographics import select_market
+from analytics.segments import RATE_BASES, SEGMENT_RATES, rate_grid
 from analytics.suppression import check_suppression
 from components.filter_bar import filter_bar
 from components.branded_chart import create_branded_figure
+from config import MIN_BASE_INDICATIVE
 import dash
 dash.register_page(__name__, path="/price-sensitivity", name="Price Sensitivity")
 
+# Rate grid columns: price change size band (Q6a/Q6b) or a demographic column
+GRID_SEGMENTS = {"band": "Size of price change", "AgeBand": "Age band", "Region": "Region", "PaymentType": "Payment type"}
+
 def layout():
     return dbc.Container([
         html.Div(id="filter-bar-ps"),
         dbc.Row([dbc.Col(html.Div(id="price-direction-ps"), md=12)], className="mb-4"),
+        dbc.Row([
+            dbc.Col(dcc.RadioItems(id="grid-rate-ps", options=[{"label": r.title(), "value": r} for r in SEGMENT_RATES], value="switching", inline=True), md=6),
+            dbc.Col(dcc.Dropdown(id="grid-segment-ps", options=[{"label": label, "value": value} for value, label in GRID_SEGMENTS.items()], value="band", clearable=False), md=6),
+        ], className="mb-2"),
+        dbc.Row([dbc.Col(html.Div(id="rate-grid-ps"), md=12)], className="mb-4"),
     ], fluid=True)
 
 def _norm(val):
@@ -28,15 +39,15 @@ def _norm(val):
     [Input("global-insurer", "value"), Input("global-age-band", "value"), Input("global-region", "value"), Input("global-payment-type", "value"), Input("global-product", "value"), Input("global-time-window", "value")],
 )
 def update_price(insurer, age_band, region, payment_type, product, time_window):
+    data = df_motor()
     product = product or "Motor"
     tw = int(time_window or 24)
     age_band, region, payment_type = _norm(age_band), _norm(region), _norm(payment_type)
-    df_ins = apply_filters(DF_MOTOR, insurer=insurer, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
-    df_mkt = apply_filters(DF_MOTOR, insurer=None, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
-    sup = check_suppression(df_ins, df_mkt)
+    sel = select_market(data, insurer=insurer, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
+    sup = check_suppression(sel.insurer_n, sel.market_n)
     filter_bar_el = filter_bar(age_band, region, payment_type)
-    dist_ins = calc_price_direction_dist(df_ins) if insurer and sup.can_show_insurer else None
-    dist_mkt = calc_price_direction_dist(df_mkt)
+    dist_ins, dist_mkt = calc_price_direction_dist_pair(sel)
+    dist_ins = dist_ins if insurer and sup.can_show_insurer else None
     if dist_mkt is not None and len(dist_mkt) > 0:
         fig = go.Figure()
         if dist_ins is not None and len(dist_ins) > 0:
@@ -48,3 +59,42 @@ def update_price(insurer, age_band, region, payment_type, product, time_window):
     else:
         price_div = html.P("Data not available", className="text-muted")
     return filter_bar_el, price_div
+
+
+def _rate_grid(frame, rate, segment, who):
+    """Heatmap of one rate by price direction × segment; cells under MIN_BASE_INDICATIVE blanked."""
+    if segment == "band":
+        table = calc_rates_by_price_band(frame)
+    else:
+        table = calc_rates_by_price_direction(frame, by=segment) if segment in frame.columns else None
+    if table is None or len(table) == 0:
+        return html.P("Data not available", className="text-muted")
+    rates, base = rate_grid(table, rate, min_base=MIN_BASE_INDICATIVE)
+    rates = rates.reindex([d for d in PRICE_DIRECTIONS if d in rates.index])
+    base = base.reindex(rates.index)
+    if rates.isna().all().all():
+        return html.P(f"Insufficient data: no cell with {MIN_BASE_INDICATIVE}+ in the {RATE_BASES[rate]} base.", className="text-muted")
+    text = np.where(rates.notna(), (rates * 100).round(0).astype("Int64").astype(str) + "%<br>n=" + base.astype(str), "")
+    fig = go.Figure(go.Heatmap(
+        z=rates.values * 100, x=[str(c) for c in rates.columns], y=list(rates.index),
+        text=text, texttemplate="%{text}", colorscale="Purples", hoverongaps=False,
+    ))
+    fig.update_layout(yaxis_autorange="reversed")
+    title = f"{rate.title()} Rate by Price Direction × {GRID_SEGMENTS[segment]} ({who})"
+    return dcc.Graph(figure=create_branded_figure(fig, title=title))
+
+
+@callback(
+    Output("rate-grid-ps", "children"),
+    [Input("global-insurer", "value"), Input("global-age-band", "value"), Input("global-region", "value"), Input("global-payment-type", "value"), Input("global-product", "value"), Input("global-time-window", "value"), Input("grid-rate-ps", "value"), Input("grid-segment-ps", "value")],
+)
+def update_rate_grid(insurer, age_band, region, payment_type, product, time_window, rate, segment):
+    data = df_motor()
+    product = product or "Motor"
+    tw = int(time_window or 24)
+    age_band, region, payment_type = _norm(age_band), _norm(region), _norm(payment_type)
+    sel = select_market(data, insurer=insurer, product=product, time_window_months=tw, age_band=age_band, region=region, payment_type=payment_type)
+    sup = check_suppression(sel.insurer_n, sel.market_n)
+    insurer_view = bool(insurer and sup.can_show_insurer)
+    frame = sel.insurer_frame if insurer_view else sel.market
+    return _rate_grid(frame, rate or "switching", segment or "band", insurer if insurer_view else "Market")
@@ -0,0 +1,84 @@
+"""
+Benchmark the Insurer Comparison computation as the number of insurers grows: the previous
+per-insurer loop (filter + scalar smoothing per insurer, with the original copy-and-mask
+filter and with the indexed apply_filters) against one groupby + batched smoothing.
+Checks the loop and groupby produce the same table.
+Run from ss-intelligence: python scripts/bench_comparison.py [--rows 1000000] [--insurers 10 40 80 160]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from analytics.bayesian import bayesian_smooth_rate
+from analytics.bayesian_precompute import smoothed_retention_by_insurer
+from analytics.demographics import apply_filters
+from analytics.filter_index import ROW_CACHE, sort_for_index
+from analytics.rates import calc_retention_rate
+from bench_filters import _legacy_apply_filters
+from config import MIN_BASE_PUBLISHABLE
+from data.transforms import transform
+from synthetic import make_survey_frame
+
+
+def _loop(data, insurers, filter_func, **filters) -> pd.DataFrame:
+    """The previous update_comparison body."""
+    df_mkt = filter_func(data, **filters)
+    market_ret = calc_retention_rate(df_mkt)
+    rows = []
+    for ins in insurers:
+        df_ins = filter_func(data, insurer=ins, **filters)
+        if len(df_ins) < MIN_BASE_PUBLISHABLE:
+            continue
+        retained = (df_ins["IsRetained"] & ~df_ins["IsNewToMarket"]).sum()
+        total = len(df_ins[~df_ins["IsNewToMarket"]])
+        bay = bayesian_smooth_rate(int(retained), total, market_ret)
+        rows.append({"insurer": ins, "n": total, "posterior_mean": bay["posterior_mean"]})
+    return pd.DataFrame(rows)
+
+
+def _groupby(data, insurers, **filters) -> pd.DataFrame:
+    """The new path: market filter, one groupby, one batched smoothing call."""
+    df_mkt = apply_filters(data, **filters)
+    return smoothed_retention_by_insurer(df_mkt, calc_retention_rate(df_mkt), insurers=insurers, min_base=MIN_BASE_PUBLISHABLE)
+
+
+def _time(func, *args, **kwargs) -> tuple[float, object]:
+    ROW_CACHE.clear()
+    t0 = time.perf_counter()
+    out = func(*args, **kwargs)
+    return time.perf_counter() - t0, out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--insurers", type=int, nargs="+", default=[10, 40, 80, 160])
+    parser.add_argument("--skip-legacy", action="store_true", help="skip the copy-and-mask loop (slowest)")
+    args = parser.parse_args()
+
+    filters = {"product": "Motor", "time_window_months": 24}
+    print(f"{args.rows:,} rows, 24-month window")
+    print(f"{'insurers':>8} {'loop_copy_s':>12} {'loop_index_s':>13} {'groupby_s':>10} {'speedup':>8}")
+    for n_insurers in args.insurers:
+        data = sort_for_index(transform(make_survey_frame(args.rows, n_insurers=n_insurers), "Motor", copy=False))
+        insurers = sorted(data["CurrentCompany"].dropna().astype(str).unique())
+        apply_filters(data)  # build the filter index outside the timings
+        legacy = "-"
+        if not args.skip_legacy:
+            legacy = f"{_time(_loop, data, insurers, _legacy_apply_filters, **filters)[0]:.3f}"
+        loop_s, expected = _time(_loop, data, insurers, apply_filters, **filters)
+        group_s, result = _time(_groupby, data, insurers, **filters)
+        assert list(result["insurer"]) == list(expected["insurer"])
+        assert np.allclose(result["posterior_mean"], expected["posterior_mean"])
+        print(f"{n_insurers:>8} {legacy:>12} {loop_s:>13.3f} {group_s:>10.3f} {loop_s / group_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark analytics.demographics.apply_filters (bitmap index) against the previous
+copy-and-mask implementation, with the row cache cold (every call misses) and warm
+(repeat of the same filters, as when several callbacks or tabs share them).
+Runs on the frame as loaded and on the month-sorted layout the app uses (sort_for_index),
+where time-only filters are zero-copy slices. Checks both return the same rows.
+Run from ss-intelligence: python scripts/bench_filters.py [--rows 1000000] [--repeat 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from analytics.demographics import apply_filters, window_start
+from analytics.filter_index import ROW_CACHE, filtered_rows, get_filter_index, sort_for_index
+from data.transforms import transform
+from synthetic import make_survey_frame
+
+
+def _legacy_apply_filters(df, insurer=None, age_band=None, region=None, payment_type=None,
+                          product="Motor", time_window_months=24):
+    """The old implementation: full copy, then one boolean mask per filter."""
+    filtered = df.copy()
+    filtered = filtered[filtered["Product"] == product]
+    if time_window_months > 0:
+        max_ym = filtered["RenewalYearMonth"].max()
+        if not pd.isna(max_ym):
+            filtered = filtered[filtered["RenewalYearMonth"] >= window_start(max_ym, time_window_months)]
+    if age_band:
+        filtered = filtered[filtered["AgeBand"] == age_band]
+    if region:
+        filtered = filtered[filtered["Region"] == region]
+    if payment_type:
+        filtered = filtered[filtered["PaymentType"] == payment_type]
+    if insurer:
+        filtered = filtered[filtered["CurrentCompany"] == insurer]
+    return filtered
+
+
+def _uncached(df, **filters):
+    """apply_filters with an empty row cache."""
+    ROW_CACHE.clear()
+    return apply_filters(df, **filters)
+
+
+def _time(func, df, repeat: int, **filters) -> float:
+    """Mean seconds per call."""
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        func(df, **filters)
+    return (time.perf_counter() - t0) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    loaded = transform(make_survey_frame(args.rows), "Motor", copy=False)
+    insurer = loaded["CurrentCompany"].value_counts().index[0]
+    cases = {
+        "market, 24m": {},
+        "market, 12m": {"time_window_months": 12},
+        "insurer, 24m": {"insurer": insurer},
+        "insurer, 6m": {"insurer": insurer, "time_window_months": 6},
+        "insurer+age+region": {"insurer": insurer, "age_band": "25-34", "region": "London"},
+        "all filters": {"insurer": insurer, "age_band": "25-34", "region": "London",
+                        "payment_type": "Monthly Instalments"},
+    }
+    for layout, df in (("as loaded", loaded), ("month-sorted", sort_for_index(loaded))):
+        t0 = time.perf_counter()
+        get_filter_index(df)
+        print(f"\n{args.rows:,} rows, {layout}; index build {time.perf_counter() - t0:.3f}s (once per dataset)")
+        print(f"{'filters':<20} {'rows':>9} {'legacy_ms':>10} {'cold_ms':>8} {'warm_ms':>8} {'rows_us':>8}")
+        for label, filters in cases.items():
+            expected = _legacy_apply_filters(df, **filters)
+            result = apply_filters(df, **filters)
+            assert result.index.equals(expected.index), label
+            legacy = _time(_legacy_apply_filters, df, args.repeat, **filters)
+            cold = _time(_uncached, df, args.repeat, **filters)
+            apply_filters(df, **filters)
+            warm = _time(apply_filters, df, args.repeat, **filters)
+            lookup = _time(filtered_rows, df, args.repeat, **filters)
+            print(f"{label:<20} {len(result):>9,} {legacy * 1e3:>10.1f} {cold * 1e3:>8.1f} {warm * 1e3:>8.1f} {lookup * 1e6:>8.1f}")
+    print(f"\nwarm_ms includes materialising the frame; rows_us is the cached row lookup alone. cache: {ROW_CACHE.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Benchmark data.transforms.transform at 100k, 1M and 10M rows.
+Run from ss-intelligence: python scripts/bench_transform.py [--sizes 100000 1000000] [--legacy]
+--legacy also times the previous row-wise apply(axis=1) derivations (sizes <= 1M only).
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from data.transforms import _price_direction, _used_pcw, transform
+from synthetic import make_survey_frame
+
+
+def _legacy_row_wise(df: pd.DataFrame) -> None:
+    """The old per-row derivations (PriceDirection + UsedPCW via apply(axis=1))."""
+    df.apply(lambda r: _price_direction(r.get("Renewal premium change combined") or r.get("Renewal premium change")), axis=1)
+    df.apply(lambda r: _used_pcw(r.get("Did you use a PCW for shopping")), axis=1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--legacy", action="store_true", help="also time the row-wise derivations")
+    args = parser.parse_args()
+
+    print(f"{'rows':>12} {'transform_s':>12} {'legacy_s':>10}")
+    for n in args.sizes:
+        raw = make_survey_frame(n)
+        t0 = time.perf_counter()
+        transform(raw, "Motor")
+        elapsed = time.perf_counter() - t0
+        legacy = "-"
+        if args.legacy and n <= 1_000_000:
+            t0 = time.perf_counter()
+            _legacy_row_wise(raw)
+            legacy = f"{time.perf_counter() - t0:.2f}"
+        print(f"{n:>12,} {elapsed:>12.3f} {legacy:>10}")
+        del raw
+
+
+if __name__ == "__main__":
+    main()
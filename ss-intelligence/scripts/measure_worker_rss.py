@@ -0,0 +1,124 @@
+"""
+Measure memory per gunicorn worker (Linux, reads /proc/<pid>/smaps_rollup).
+RSS counts shared pages in every process; PSS splits them between the processes that map
+them, so the PSS total is the real footprint. Anonymous is private heap (per-worker copies).
+
+Run from ss-intelligence:
+  python scripts/measure_worker_rss.py --pid <gunicorn master pid>
+  python scripts/measure_worker_rss.py --simulate 4 --rows 1000000
+--simulate starts N worker processes that each load the same synthetic dataset, first as a
+private in-memory copy, then memory-mapped from an Arrow IPC snapshot, and compares them.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+FIELDS = ("Rss", "Pss", "Anonymous", "Shared_Clean")
+
+
+def smaps_rollup(pid: int) -> dict[str, float]:
+    """Selected smaps_rollup fields for pid, in MB."""
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            key = parts[0].rstrip(":")
+            if key in FIELDS:
+                out[key] = int(parts[1]) / 1024
+    return out
+
+
+def child_pids(pid: int) -> list[int]:
+    """Direct children of pid (gunicorn workers of a master)."""
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        path = task / "children"
+        if path.exists():
+            children += [int(p) for p in path.read_text().split()]
+    return sorted(children)
+
+
+def report(pids: list[int], label: str) -> None:
+    """Print one row per process plus totals."""
+    print(f"\n{label}")
+    print(f"{'pid':>8} " + " ".join(f"{k + '_mb':>16}" for k in FIELDS))
+    totals = dict.fromkeys(FIELDS, 0.0)
+    for pid in pids:
+        stats = smaps_rollup(pid)
+        for k in FIELDS:
+            totals[k] += stats.get(k, 0.0)
+        print(f"{pid:>8} " + " ".join(f"{stats.get(k, 0.0):>16.1f}" for k in FIELDS))
+    print(f"{'total':>8} " + " ".join(f"{totals[k]:>16.1f}" for k in FIELDS))
+
+
+def _worker(mode: str, path: str, ready, done) -> None:
+    """Load the dataset like shared.py would, touch every column, then wait to be measured."""
+    import pandas as pd
+
+    from data.snapshot import read_snapshot
+
+    if mode == "snapshot":
+        df = read_snapshot("Bench", Path(path))
+    else:
+        df = pd.read_pickle(path)
+    for col in df.columns:
+        df[col].to_numpy()  # fault the pages in, as a first query would
+    ready.set()
+    done.wait()
+
+
+def simulate(n_workers: int, rows: int) -> None:
+    """Compare private copies against a shared memory-mapped snapshot."""
+    from data.snapshot import write_snapshot
+    from data.transforms import transform
+    from synthetic import make_survey_frame
+
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        df = transform(make_survey_frame(rows), "Motor", copy=False)
+        print(f"dataset: {rows:,} rows, {df.memory_usage(deep=True).sum() / 1e6:.1f} MB in pandas")
+        pickle_path = os.path.join(tmp, "bench.pkl")
+        df.to_pickle(pickle_path)
+        write_snapshot(df, "Bench", Path(tmp))
+        del df
+        for mode, path in (("copy", pickle_path), ("snapshot", tmp)):
+            done = ctx.Event()
+            procs, events = [], []
+            for _ in range(n_workers):
+                ready = ctx.Event()
+                p = ctx.Process(target=_worker, args=(mode, path, ready, done))
+                p.start()
+                procs.append(p)
+                events.append(ready)
+            for e in events:
+                e.wait()
+            time.sleep(0.5)
+            report([p.pid for p in procs], f"{n_workers} workers, {mode}")
+            done.set()
+            for p in procs:
+                p.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pid", type=int, help="gunicorn master pid (workers are its children)")
+    parser.add_argument("--simulate", type=int, metavar="N", help="start N synthetic workers instead")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="synthetic rows for --simulate")
+    args = parser.parse_args()
+    if args.simulate:
+        simulate(args.simulate, args.rows)
+    elif args.pid:
+        report([args.pid] + child_pids(args.pid), f"gunicorn master {args.pid} and workers")
+    else:
+        parser.error("pass --pid or --simulate")
+
+
+if __name__ == "__main__":
+    main()
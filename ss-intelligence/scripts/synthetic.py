@@ -0,0 +1,65 @@
+"""
+Synthetic survey extracts for benchmarks.
+Produces frames shaped like data.loader._read_csv output (schema dtypes, normalised names).
+"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data.schema import apply_schema
+
+AGE_GROUPS = ["18-24", "25-34", "35-44", "45-54", "55-64", "65+"]
+REGIONS = ["London", "South East", "South West", "Midlands", "East Anglia", "North West",
+           "North East & Yorkshire", "Scotland", "Wales", "NI"]
+PAYMENT_TYPES = ["Annual (Debit Card)", "Annual (Credit Card)", "Monthly Instalments", "Other"]
+PREMIUM_CHANGES = ["Higher", "Lower", "It was unchanged", "I didn't have a policy", None]
+SHOPPERS = ["Shoppers", "Non-shoppers"]
+SWITCHERS = ["Switcher", "Non-switcher", "New-to-market"]
+
+
+def _months(n_months: int, last: int = 202512) -> list[int]:
+    """The n_months YYYYMM values ending at last."""
+    y, m = divmod(last, 100)
+    out = []
+    for _ in range(n_months):
+        out.append(y * 100 + m)
+        m -= 1
+        if m == 0:
+            y, m = y - 1, 12
+    return sorted(out)
+
+
+def _cat(rng, values, n, p=None) -> pd.Categorical:
+    """Random categorical (None entries become missing)."""
+    idx = rng.choice(len(values), size=n, p=p)
+    cats = [v for v in values if v is not None]
+    lut = np.array([cats.index(v) if v is not None else -1 for v in values])
+    return pd.Categorical.from_codes(lut[idx], categories=cats)
+
+
+def make_survey_frame(n_rows: int, n_insurers: int = 80, n_months: int = 36, seed: int = 0) -> pd.DataFrame:
+    """Raw (untransformed) survey frame with n_rows respondents and n_insurers brands."""
+    rng = np.random.default_rng(seed)
+    insurers = [f"Insurer {i:03d}" for i in range(n_insurers)]
+    months = np.array(_months(n_months), dtype=np.int32)
+    shop = _cat(rng, SHOPPERS, n_rows, p=[0.6, 0.4])
+    switch = _cat(rng, SWITCHERS, n_rows, p=[0.2, 0.75, 0.05])
+    df = pd.DataFrame({
+        "UniqueID": np.arange(1, n_rows + 1).astype(str),
+        "RenewalYearMonth": rng.choice(months, size=n_rows),
+        "SurveyYearMonth": rng.choice(months, size=n_rows),
+        "Shoppers": shop,
+        "Switchers": switch,
+        "CurrentCompany": _cat(rng, insurers, n_rows),
+        "PreRenewalCompany": _cat(rng, insurers, n_rows),
+        "Region": _cat(rng, REGIONS, n_rows),
+        "Age Group": _cat(rng, AGE_GROUPS, n_rows),
+        "Q43": _cat(rng, PAYMENT_TYPES, n_rows),
+        "Renewal premium change": _cat(rng, PREMIUM_CHANGES, n_rows),
+        "Did you use a PCW for shopping": _cat(rng, ["Yes", "No", None], n_rows),
+    })
+    return apply_schema(df)
@@ -2,10 +2,12 @@
 Shared data and dimensions - imported by app and pages.
 Lives in a separate module to avoid circular imports: pages must not import from app,
 otherwise app.py is loaded twice (as __main__ and as app) and callbacks register twice.
+Data loads in a background thread started at import; use df_motor(), df_home() and
+dimensions() inside callbacks rather than at import time.
 """
 import pandas as pd
 
-from data.loader import load_data
+from data.loader import load_data, source_fingerprint
 
 # Month abbreviations for YYYYMM formatting
 _MONTH_ABBR = ["", "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
@@ -20,19 +22,89 @@ def format_year_month(ym) -> str:
     if 1 <= m <= 12:
         return f"{_MONTH_ABBR[m]} {y}"
     return str(ym)
+from analytics.channels import MULTI_CODE_BLOCKS, code_matrix
+from analytics.columns import app_columns, check_required_columns
+from analytics.count_cube import CountCube, load_cube
+from analytics.filter_index import sort_for_index
+from data.dataset import LazyDataset
 from data.dimensions import get_all_dimensions
+from data.snapshot import SNAPSHOT_ENABLED, load_snapshot
+from config import APP_HISTORY_MONTHS, DATA_WAIT_TIMEOUT_S
 
-# Load data on startup (single load, reused by app and pages)
-DF_MOTOR, _ = load_data("Motor")
-try:
-    DF_HOME, _ = load_data("Home")
-except FileNotFoundError:
-    DF_HOME = None
-DIMENSIONS = get_all_dimensions(DF_MOTOR)
-
-DF_ALL = DF_MOTOR.copy()
-if DF_HOME is not None and len(DF_HOME) > 0:
-    # Deduplicate columns before concat (Home/Motor CSVs can have duplicate column names)
-    m = DF_MOTOR.loc[:, ~DF_MOTOR.columns.duplicated()]
-    h = DF_HOME.loc[:, ~DF_HOME.columns.duplicated()]
-    DF_ALL = pd.concat([m, h], ignore_index=True)
+
+def _load_app_data(product: str) -> pd.DataFrame:
+    """
+    Memory-mapped snapshot (one physical copy shared by all gunicorn workers) if it was built
+    from the current source (data.loader.source_fingerprint), else the last APP_HISTORY_MONTHS
+    from the processed store / CSV, reading only the columns analytics modules declare
+    (analytics.columns), which is then written as the new snapshot. Raises
+    MissingColumnsError if a required column is absent. Rows are sorted by Product and
+    RenewalYearMonth (snapshots are written sorted) so time windows are contiguous slices.
+    The channel/PCW code matrices are built here too, so no callback pays for them.
+    The frame is read-only: filter into new frames, never modify it in place.
+    """
+    def load() -> pd.DataFrame:
+        df, _ = load_data(product, time_window_months=APP_HISTORY_MONTHS, columns=app_columns())
+        return sort_for_index(df)
+
+    if SNAPSHOT_ENABLED:
+        df = load_snapshot(product, source_fingerprint(product, APP_HISTORY_MONTHS, app_columns()), load)
+    else:
+        df = load()
+    df = check_required_columns(df, product)
+    for prefix in MULTI_CODE_BLOCKS:
+        code_matrix(df, prefix)
+    return df
+
+
+def _load_optional(product: str) -> pd.DataFrame | None:
+    """Like _load_app_data, but None when the product has no data (Home is optional)."""
+    try:
+        return _load_app_data(product)
+    except FileNotFoundError:
+        return None
+
+
+def _load_cubes(loaded: dict) -> dict:
+    """
+    Count cube per product: the one written by the refresh if it was built from the rows that
+    were loaded (CountCube.matches), else built from the loaded frame, so a newer CSV or
+    snapshot never serves KPIs from an older cube.
+    """
+    cubes = {}
+    for product, df in (("Motor", loaded["motor"]), ("Home", loaded["home"])):
+        cube = load_cube(product)
+        if df is not None and len(df) > 0 and (cube is None or not cube.matches(df)):
+            cube = CountCube.from_frame(df)
+        cubes[product] = cube
+    return cubes
+
+
+# Loaded once per process in the background (Motor, then Home, then dimensions, then count cubes)
+DATASET = LazyDataset([
+    ("motor", lambda _: _load_app_data("Motor")),
+    ("home", lambda _: _load_optional("Home")),
+    ("dimensions", lambda loaded: get_all_dimensions(loaded["motor"])),
+    ("cubes", _load_cubes),
+])
+DATASET.start()
+
+
+def df_motor() -> pd.DataFrame:
+    """Motor dataset (waits up to DATA_WAIT_TIMEOUT_S while loading)."""
+    return DATASET.get("motor", DATA_WAIT_TIMEOUT_S)
+
+
+def df_home() -> pd.DataFrame | None:
+    """Home dataset, or None if there is no Home data."""
+    return DATASET.get("home", DATA_WAIT_TIMEOUT_S)
+
+
+def dimensions() -> dict:
+    """Dimension tables built from Motor."""
+    return DATASET.get("dimensions", DATA_WAIT_TIMEOUT_S)
+
+
+def count_cube(product: str) -> CountCube | None:
+    """Rate count cube for the Motor or Home dataset (None if that product has no data)."""
+    return DATASET.get("cubes", DATA_WAIT_TIMEOUT_S).get(product)
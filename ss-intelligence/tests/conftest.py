@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import pytest
 
@@ -18,3 +19,37 @@ def sample_df():
 @pytest.fixture
 def empty_df():
     return pd.DataFrame()
+
+
+def _make_survey_df(n=400, seed=0, products=("Motor",), months=(202411, 202412, 202501)):
+    """Random transformed survey frame: respondent ids, filter dimensions, rate flags and a few question columns."""
+    rng = np.random.default_rng(seed)
+    month = rng.choice(np.array(months, dtype=object), n)
+    return pd.DataFrame({
+        "UniqueID": np.arange(n),
+        "Product": rng.choice(products, n),
+        "RenewalYearMonth": pd.array(month, dtype="Int32") if None in months else month.astype("int64"),
+        "CurrentCompany": pd.Categorical(rng.choice(["Aviva", "LV", "Admiral"], n)),
+        "AgeBand": rng.choice(["18-24", "25-34", None], n),
+        "Region": rng.choice(["London", "Wales"], n),
+        "PaymentType": rng.choice(["Monthly", "Annual"], n),
+        "IsShopper": rng.random(n) < 0.6,
+        "IsSwitcher": rng.random(n) < 0.2,
+        "IsRetained": rng.random(n) < 0.7,
+        "IsNewToMarket": rng.random(n) < 0.05,
+        "UsedPCW": rng.random(n) < 0.4,
+        "PriceDirection": rng.choice(["Higher", "Lower", "Unchanged", None], n),
+        "Q18": rng.choice(["Price", "Service", " ", None], n),
+        "Q37": rng.choice([1, 2, np.nan], n),
+    })
+
+
+@pytest.fixture
+def make_survey_df():
+    """Factory for random survey frames: make_survey_df(n=..., seed=..., products=..., months=...)."""
+    return _make_survey_df
+
+
+@pytest.fixture
+def survey_df():
+    return _make_survey_df()
@@ -25,3 +25,29 @@ def test_ci_contains_raw_for_large_n():
 def test_zero_trials_returns_prior():
     result = bayesian_smooth_rate(0, 0, 0.5)
     assert result["posterior_mean"] == 0.5
+
+
+def test_batched_matches_scalar():
+    from analytics.bayesian import bayesian_smooth_rates
+
+    successes, trials = [800, 20, 0, 5], [1000, 30, 0, 5]
+    batch = bayesian_smooth_rates(successes, trials, 0.78, exact=True)
+    for i, (s, t) in enumerate(zip(successes, trials)):
+        one = bayesian_smooth_rate(s, t, 0.78)
+        for key in ("posterior_mean", "ci_lower", "ci_upper", "ess", "weight"):
+            assert batch[key][i] == pytest.approx(one[key])
+
+
+def test_normal_approximation_within_tolerance():
+    import numpy as np
+    from analytics.bayesian import NORMAL_APPROX_TOLERANCE, bayesian_smooth_rates
+
+    rng = np.random.default_rng(0)
+    trials = rng.integers(0, 50_000, 2000)
+    successes = (trials * rng.uniform(0.05, 0.95, 2000)).astype(int)
+    prior = rng.uniform(0.3, 0.9, 2000)
+    fast = bayesian_smooth_rates(successes, trials, prior)
+    exact = bayesian_smooth_rates(successes, trials, prior, exact=True)
+    assert np.abs(fast["ci_lower"] - exact["ci_lower"]).max() <= NORMAL_APPROX_TOLERANCE
+    assert np.abs(fast["ci_upper"] - exact["ci_upper"]).max() <= NORMAL_APPROX_TOLERANCE
+    assert np.array_equal(fast["posterior_mean"], exact["posterior_mean"])
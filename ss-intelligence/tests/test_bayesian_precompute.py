@@ -0,0 +1,76 @@
+"""Tests for analytics/bayesian_precompute.py."""
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analytics import bayesian_precompute as bp
+from analytics.bayesian import bayesian_smooth_rate
+from analytics.demographics import apply_filters
+from analytics.rates import calc_retention_rate
+
+pytest.importorskip("pyarrow")
+
+
+def _rows(posterior_mean: float) -> pd.DataFrame:
+    return pd.DataFrame({
+        "insurer": ["Aviva", "LV"], "product": ["Motor", "Motor"], "time_window_months": [24, 24],
+        "n": [120, 80], "raw_rate": [0.8, 0.7], "posterior_mean": [posterior_mean, 0.71],
+        "ci_lower": [0.7, 0.6], "ci_upper": [0.9, 0.8], "market_rate": [0.75, 0.75],
+    })
+
+
+def test_cached_rate_is_indexed_in_memory_and_reloads_on_change(tmp_path, monkeypatch):
+    monkeypatch.setattr(bp, "_CACHE_PATH", tmp_path / "bayesian_cache.parquet")
+    monkeypatch.setattr(bp, "_index", {"stamp": None, "rates": {}})
+    reads = []
+    read_parquet = pd.read_parquet
+    monkeypatch.setattr(bp.pd, "read_parquet", lambda path: reads.append(path) or read_parquet(path))
+
+    assert bp.get_cached_rate("Aviva", "Motor", 24) is None
+    bp.save_precompute([_rows(0.79)])
+    assert bp.get_cached_rate("Aviva", "Motor", 24)["posterior_mean"] == 0.79
+    assert bp.get_cached_rate("LV", "Motor", 24)["n"] == 80
+    assert bp.get_cached_rate("LV", "Motor", 12) is None
+    assert len(reads) == 1
+
+    bp.save_precompute([_rows(0.81)])
+    stat = bp._CACHE_PATH.stat()
+    os.utime(bp._CACHE_PATH, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert bp.get_cached_rate("Aviva", "Motor", 24)["posterior_mean"] == 0.81
+    assert len(reads) == 2
+
+
+@pytest.fixture
+def survey_df(make_survey_df):
+    return make_survey_df(n=3000, seed=3, months=(202410, 202411, 202412, 202501))
+
+
+@pytest.mark.parametrize("cell", [
+    {"age_band": "25-34"},
+    {"region": "Wales", "payment_type": "Annual"},
+    {"age_band": "18-24", "region": "London", "payment_type": "Monthly"},
+])
+def test_cell_rates_match_filtered_smoothing_and_are_served_from_cache(survey_df, cell, tmp_path, monkeypatch):
+    monkeypatch.setattr(bp, "_CACHE_PATH", tmp_path / "bayesian_cache.parquet")
+    monkeypatch.setattr(bp, "_index", {"stamp": None, "rates": {}})
+    bp.save_precompute([bp.precompute_rates(survey_df, "Motor", 2)])
+
+    df_mkt = apply_filters(survey_df, product="Motor", time_window_months=2, **cell)
+    df_ins = df_mkt[(df_mkt["CurrentCompany"] == "LV") & ~df_mkt["IsNewToMarket"]]
+    expected = bayesian_smooth_rate(int(df_ins["IsRetained"].sum()), len(df_ins), calc_retention_rate(df_mkt))
+    cached = bp.get_cached_rate("LV", "Motor", 2, **cell)
+    assert cached["n"] == len(df_ins)
+    assert cached["posterior_mean"] == pytest.approx(expected["posterior_mean"])
+    # Cached CIs are exact (beta.ppf), so they equal the live fallback's
+    assert (cached["ci_lower"], cached["ci_upper"]) == pytest.approx((expected["ci_lower"], expected["ci_upper"]))
+    df_lv = apply_filters(survey_df, insurer="LV", time_window_months=2)
+    df_lv = df_lv[~df_lv["IsNewToMarket"]]
+    live = bayesian_smooth_rate(int(df_lv["IsRetained"].sum()), len(df_lv), calc_retention_rate(apply_filters(survey_df, time_window_months=2)))
+    insurer_row = bp.get_cached_rate("LV", "Motor", 2)
+    assert insurer_row["n"] == len(df_lv)
+    assert (insurer_row["ci_lower"], insurer_row["ci_upper"]) == pytest.approx((live["ci_lower"], live["ci_upper"]))
+    assert bp.get_cached_rate("LV", "Motor", 2, age_band="65+") is None
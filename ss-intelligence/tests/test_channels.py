@@ -0,0 +1,95 @@
+"""Tests for analytics/channels.py code matrices (Q9b*, Q11_* multi-code blocks)."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analytics.channels import (
+    CHANNEL_PREFIX,
+    PCW_PREFIX,
+    calc_channel_usage,
+    calc_co_usage,
+    calc_code_usage_pair,
+    calc_pcw_nps,
+    calc_pcw_purchase_rate,
+    calc_pcw_scorecard,
+    calc_pcw_usage,
+    code_matrix,
+    pcw_scorecard,
+)
+from analytics.demographics import apply_filters, select_market
+from analytics.filter_index import ROW_CACHE
+from analytics.rates import _wilson_score
+
+
+def _with_code_blocks(df, seed=4):
+    """df plus Q9b_1..3 channel and Q11_1..2 PCW 0/1 blocks, Q11d (PCW NPS) and Q36 (bought via PCW)."""
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    df = df.copy()
+    for code in (1, 2, 3):
+        df[f"Q9b_{code}"] = (rng.random(n) < 0.2 * code).astype("uint8")
+    for code in (1, 2):
+        df[f"Q11_{code}"] = (rng.random(n) < 0.5).astype("uint8")
+    df["Q11d"] = pd.Series(rng.integers(0, 11, n)).astype(str).where(rng.random(n) < 0.9)
+    df["Q36"] = pd.Categorical(rng.choice([1, 2], n))
+    return df
+
+
+def _loop_usage(df, prefix, base_col):
+    """The previous per-column loop."""
+    base = df[df[base_col]]
+    cols = [c for c in df.columns if c.startswith(prefix)]
+    return pd.Series({c: base[c].fillna(0).astype(int).sum() / len(base) for c in cols})
+
+
+def test_usage_pair_matches_per_column_loop(survey_df):
+    survey_df = _with_code_blocks(survey_df)
+    sel = select_market(survey_df, insurer="LV", time_window_months=1)
+    df_ins = apply_filters(survey_df, insurer="LV", time_window_months=1)
+    for prefix, base_col in ((CHANNEL_PREFIX, "IsShopper"), (PCW_PREFIX, "UsedPCW")):
+        ins, mkt = calc_code_usage_pair(sel, prefix)
+        pd.testing.assert_series_equal(ins.sort_index(), _loop_usage(df_ins, prefix, base_col))
+        pd.testing.assert_series_equal(mkt.sort_index(), _loop_usage(sel.market, prefix, base_col))
+    pd.testing.assert_series_equal(calc_channel_usage(df_ins).sort_index(), _loop_usage(df_ins, CHANNEL_PREFIX, "IsShopper"))
+    pd.testing.assert_series_equal(calc_pcw_usage(sel.market).sort_index(), _loop_usage(sel.market, PCW_PREFIX, "UsedPCW"))
+    assert calc_code_usage_pair(select_market(survey_df), CHANNEL_PREFIX)[0] is None
+
+
+def test_code_matrix_is_built_once_and_co_usage_counts_both(survey_df):
+    survey_df = _with_code_blocks(survey_df)
+    matrix = code_matrix(survey_df, CHANNEL_PREFIX)
+    assert matrix.bits.dtype == np.uint8 and matrix.bits.flags.c_contiguous
+    assert matrix.bits.shape == ((len(survey_df) + 7) // 8, 3)
+    assert code_matrix(survey_df, CHANNEL_PREFIX) is matrix
+    assert code_matrix(survey_df, "Q99") is None
+
+    sel = select_market(survey_df, insurer="Aviva")
+    both, base = calc_co_usage(sel, CHANNEL_PREFIX, insurer=True)
+    shoppers = sel.insurer_frame[sel.insurer_frame["IsShopper"]]
+    assert base == len(shoppers)
+    assert both.loc["Q9b_1", "Q9b_3"] == int(((shoppers["Q9b_1"] > 0) & (shoppers["Q9b_3"] > 0)).sum())
+    assert both.loc["Q9b_2", "Q9b_2"] == int(shoppers["Q9b_2"].sum())
+    assert (both.to_numpy() == both.to_numpy().T).all()
+
+
+def test_pcw_scorecard_matches_per_pcw_functions(survey_df):
+    survey_df = _with_code_blocks(survey_df)
+    df_ins = apply_filters(survey_df, insurer="Admiral", time_window_months=2)
+    ROW_CACHE.clear()
+    card = pcw_scorecard(survey_df, insurer="Admiral", time_window_months=2)
+    pd.testing.assert_frame_equal(card, calc_pcw_scorecard(df_ins))
+    assert pcw_scorecard(survey_df, insurer="Admiral", time_window_months=2, region="") is not card
+    assert ROW_CACHE.stats()["hits"] >= 1
+
+    for pcw, row in card.iterrows():
+        assert row["n"] == int((df_ins[pcw] == 1).sum())
+        assert row["nps"] == pytest.approx(calc_pcw_nps(df_ins, pcw))
+        assert row["purchase_rate"] == pytest.approx(calc_pcw_purchase_rate(df_ins, pcw))
+        purchased = int(round(row["purchase_rate"] * row["n"]))
+        assert (row["purchase_ci_lower"], row["purchase_ci_upper"]) == pytest.approx(_wilson_score(purchased, int(row["n"])))
+        assert row["nps_ci_lower"] < row["nps"] < row["nps_ci_upper"]
+    assert calc_pcw_scorecard(survey_df.drop(columns=["Q11d", "Q36"])) is None
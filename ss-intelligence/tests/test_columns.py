@@ -0,0 +1,46 @@
+"""Tests for analytics.columns (column projection registry)."""
+import pytest
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analytics.columns import MissingColumnsError, app_columns, check_required_columns, declared_columns
+from data.loader import _read_csv
+from data.transforms import transform
+
+
+def test_app_columns_union_of_module_declarations():
+    required, optional = declared_columns()
+    cols = app_columns()
+    assert {"CurrentCompany", "IsShopper", "PriceDirection"} <= set(required)
+    assert {"Q9b*", "Q11_*", "Q18"} <= set(optional)
+    assert cols[:3] == ["UniqueID", "Product", "RenewalYearMonth"]
+    assert len(cols) == len(set(cols))
+
+
+def test_csv_projection_reads_only_needed_columns(tmp_path):
+    path = tmp_path / "motor.csv"
+    path.write_text(
+        "MainData[UniqueID],MainData[RenewalYearMonth],MainData[Shoppers],MainData[CurrentCompany],"
+        "MainData[StartedDateTime],Q9b_1,Q9b_2,Q99\n"
+        "1,202501,Shoppers,Aviva,2025-01-03,1,0,x\n"
+    )
+    df = _read_csv(path, columns=["IsShopper", "CurrentCompany", "Q9b*"])
+    assert list(df.columns) == ["Shoppers", "CurrentCompany", "Q9b_1", "Q9b_2"]
+
+
+def test_missing_required_column_fails_fast():
+    df = transform(pd.DataFrame({
+        "UniqueID": ["1", "2"],
+        "RenewalYearMonth": ["202501", "202502"],
+        "CurrentCompany": ["Aviva", "LV"],
+        "PreRenewalCompany": ["LV", "LV"],
+        "Switchers": ["Switcher", "Non-switcher"],
+        "Renewal premium change": ["Higher", "Lower"],
+    }), "Motor")
+    # IsShopper is filled with False by transform, but its source (Shoppers) is absent
+    with pytest.raises(MissingColumnsError, match="IsShopper"):
+        check_required_columns(df, "Motor")
+    df["Shoppers"] = "Shoppers"
+    assert check_required_columns(df) is df
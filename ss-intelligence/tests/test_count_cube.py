@@ -0,0 +1,104 @@
+"""Tests for analytics/count_cube.py."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analytics.count_cube import CountCube, load_cube, save_cube
+from analytics.demographics import select_market
+from analytics.rates import calc_rates_pair
+from analytics.reasons import calc_reason_comparison_pair
+
+
+@pytest.fixture
+def survey_df(make_survey_df):
+    return make_survey_df(n=600, seed=1, products=("Motor", "Home"), months=(202410, 202411, 202412, 202501, None))
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"time_window_months": 0},
+    {"insurer": "LV", "age_band": "25-34"},
+    {"product": "Home", "region": "Wales", "time_window_months": 2},
+    {"start_month": "2024-11", "end_month": "2024-12", "payment_type": "Monthly"},
+    {"insurer": "Nobody"},
+])
+def test_cube_counts_match_respondent_level(survey_df, filters):
+    cube = CountCube.from_frame(survey_df)
+    ins, mkt = calc_rates_pair(select_market(survey_df, **filters))
+    expected = (ins if filters.get("insurer") else mkt) or {"counts": dict.fromkeys(cube.query(), 0)}
+    assert cube.query(**filters) == expected["counts"]
+
+
+def test_cube_by_month_and_round_trip(survey_df, tmp_path):
+    save_cube(survey_df, "Motor", tmp_path)
+    cube = load_cube("Motor", tmp_path)
+    assert cube.counts.dtype == np.uint16 or cube.counts.dtype == np.uint8
+    by_month = cube.query(by="RenewalYearMonth", time_window_months=1)
+    assert list(by_month.index) == [202412, 202501]
+    assert by_month["n"].sum() == cube.query(time_window_months=1)["n"]
+    assert load_cube("Home", tmp_path) is None
+
+
+def test_cube_matches_only_the_rows_it_was_built_from(survey_df, tmp_path):
+    motor = survey_df[survey_df["Product"] == "Motor"]
+    save_cube(survey_df, "Motor", tmp_path)
+    cube = load_cube("Motor", tmp_path)
+    assert cube.matches(motor)
+    assert cube.matches(motor[motor["RenewalYearMonth"] >= 202412])  # app loads recent history only
+    assert not cube.matches(motor.iloc[1:])
+    newer = motor.assign(RenewalYearMonth=motor["RenewalYearMonth"].replace(202501, 202502))
+    assert not cube.matches(newer)
+    flipped = motor.assign(IsShopper=~motor["IsShopper"])
+    assert not cube.matches(flipped)
+    assert not CountCube(cube.labels, cube.counts).matches(motor)  # written before fingerprints
+
+
+@pytest.fixture
+def reasons_df(survey_df):
+    rng = np.random.default_rng(2)
+    n = len(survey_df)
+    df = survey_df.assign(Q18=pd.Categorical(rng.choice(["Price", "Service", "Cover", " ", None], n, p=[0.4, 0.25, 0.15, 0.1, 0.1])))
+    for code in (1, 2, 3):
+        df[f"Q19_{code}"] = (rng.random(n) < 0.1 * code).astype("uint8")
+    return df
+
+
+@pytest.mark.parametrize("filters", [
+    {},
+    {"age_band": "25-34", "time_window_months": 2},
+    {"product": "Home", "region": "Wales", "payment_type": "Annual"},
+])
+def test_reason_index_matches_respondent_level(reasons_df, filters):
+    cube = CountCube.from_frame(reasons_df)
+    expected = calc_reason_comparison_pair(select_market(reasons_df, insurer="LV", **filters), "Q18", 3)
+    assert cube.reason_comparison("Q18", "LV", 3, **filters) == pytest.approx(expected)
+    assert cube.reason_ranking("Q18", 3, insurer="LV", **filters) == pytest.approx(expected["insurer"] or None)
+    assert cube.reason_comparison("Q18", "Nobody", **filters)["insurer"] == []
+
+
+def test_reason_ties_rank_by_label_in_both_paths(reasons_df):
+    # Equal counts, category order opposite to the labels' and first-seen order mixed up
+    market = select_market(reasons_df).market
+    market = market.iloc[: 3 * (len(market) // 3)].reset_index(drop=True)
+    tied = market.assign(Q18=pd.Categorical(np.resize(["Service", "Price", "Cover"], len(market)), categories=["Service", "Price", "Cover"]))
+    expected = calc_reason_comparison_pair(select_market(tied), "Q18", 2)["market"]
+    assert [r["reason"] for r in expected] == ["Cover", "Price"]
+    assert CountCube.from_frame(tied).reason_ranking("Q18", 2) == pytest.approx(expected)
+
+
+def test_multi_coded_reasons_use_respondents_as_base(reasons_df, tmp_path):
+    save_cube(reasons_df, "Motor", tmp_path)
+    cube = load_cube("Motor", tmp_path)
+    reasons_df = reasons_df[reasons_df["Product"] == "Motor"]
+    market = select_market(reasons_df).market
+    block = market[["Q19_1", "Q19_2", "Q19_3"]] > 0
+    ranking = cube.reason_ranking("Q19", top_n=3)
+    assert cube.reasons["Q19"].multi
+    assert [r["reason"] for r in ranking] == ["Q19_3", "Q19_2", "Q19_1"]
+    assert [r["count"] for r in ranking] == [int(block[r["reason"]].sum()) for r in ranking]
+    assert ranking[0]["pct"] == pytest.approx(block["Q19_3"].sum() / block.any(axis=1).sum())
+    assert cube.reason_ranking("Q33") is None
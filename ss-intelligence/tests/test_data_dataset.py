@@ -0,0 +1,46 @@
+"""Tests for data.dataset (background-loaded lazy dataset)."""
+import threading
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data.dataset import DatasetNotReady, LazyDataset
+
+
+def test_stages_load_in_order_and_report_timings():
+    ds = LazyDataset([
+        ("motor", lambda _: [1, 2, 3]),
+        ("dimensions", lambda loaded: len(loaded["motor"])),
+    ])
+    assert ds.status()["state"] == "pending"
+    assert ds.get("dimensions", timeout=5) == 3
+    assert ds.wait(5)
+    status = ds.status()
+    assert status["state"] == "ready"
+    assert status["loaded"] == ["motor", "dimensions"]
+    assert set(status["timings_s"]) == {"motor", "dimensions"}
+
+
+def test_get_times_out_while_stage_is_loading():
+    release = threading.Event()
+    ds = LazyDataset([("motor", lambda _: release.wait(5) and "df")])
+    ds.start()
+    with pytest.raises(DatasetNotReady):
+        ds.get("motor", timeout=0.05)
+    assert ds.status()["state"] == "loading"
+    assert ds.status()["stage"] == "motor"
+    release.set()
+    assert ds.get("motor", timeout=5) == "df"
+
+
+def test_failed_load_is_reported_and_reraised():
+    def fail(_):
+        raise FileNotFoundError("no data")
+
+    ds = LazyDataset([("motor", fail), ("dimensions", lambda loaded: loaded["motor"])])
+    assert not ds.wait(5)
+    assert ds.status()["state"] == "failed"
+    assert "no data" in ds.status()["error"]
+    with pytest.raises(FileNotFoundError):
+        ds.get("dimensions", timeout=1)
@@ -0,0 +1,50 @@
+"""Tests for data.loader streaming ingestion and the transformed-frame cache."""
+import pytest
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data.loader import FALLBACK_DIR, _load_source_csv, _read_csv, iter_csv_chunks, stream_csv_to_parquet
+from data.transforms import transform
+
+pytest.importorskip("pyarrow")
+
+DEMO_CSV = FALLBACK_DIR / "motor_main_data_demo.csv"
+
+
+@pytest.mark.skipif(not DEMO_CSV.exists(), reason="demo CSV not available")
+def test_chunks_have_normalised_columns():
+    chunks = list(iter_csv_chunks(DEMO_CSV, chunk_size=50))
+    assert len(chunks) == 4
+    assert "CurrentCompany" in chunks[0].columns
+    assert sum(len(c) for c in chunks) == len(_read_csv(DEMO_CSV))
+
+
+@pytest.mark.skipif(not DEMO_CSV.exists(), reason="demo CSV not available")
+def test_streamed_parquet_matches_full_load(tmp_path):
+    out = tmp_path / "motor.parquet"
+    rows = stream_csv_to_parquet(DEMO_CSV, "Motor", out, chunk_size=40)
+    streamed = pd.read_parquet(out)
+    full = transform(_read_csv(DEMO_CSV), "Motor")
+    assert rows == len(full) == len(streamed)
+    for col in ("CurrentCompany", "PriceDirection", "AgeBand", "IsShopper", "RenewalYearMonth"):
+        assert streamed[col].astype(object).fillna("").tolist() == full[col].astype(object).fillna("").tolist(), col
+    assert isinstance(streamed["CurrentCompany"].dtype, pd.CategoricalDtype)
+
+
+def test_cache_reuses_transformed_frame_until_source_changes(tmp_path):
+    src = tmp_path / "motor.csv"
+    src.write_text("UniqueID,RenewalYearMonth,CurrentCompany,Shoppers\n1,202501,Aviva,Shoppers\n2,202502,LV,Non-shoppers\n")
+    cache = tmp_path / "cache"
+    df, status = _load_source_csv(src, "Motor", cache)
+    assert status == "miss"
+    cached, status = _load_source_csv(src, "Motor", cache)
+    assert status == "hit"
+    pd.testing.assert_frame_equal(cached, df)
+
+    src.write_text(src.read_text() + "3,202503,Aviva,Shoppers\n")
+    df, status = _load_source_csv(src, "Motor", cache)
+    assert status == "miss"
+    assert len(df) == 3
+    assert len(list(cache.glob("motor-*.arrow"))) == 1
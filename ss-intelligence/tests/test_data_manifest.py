@@ -0,0 +1,85 @@
+"""Tests for data.manifest and incremental refresh."""
+import pytest
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data.manifest import diff_months, file_fingerprint, merge_month_hashes, month_hashes, same_file
+from data import refresh as refresh_mod
+from data.store import read_store
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def wave_df():
+    return pd.DataFrame({
+        "UniqueID": [str(i) for i in range(6)],
+        "RenewalYearMonth": [202501, 202501, 202502, 202502, 202503, 202503],
+        "CurrentCompany": ["Aviva", "LV", "Aviva", "LV", "Aviva", "LV"],
+    })
+
+
+def test_month_hashes_order_independent(wave_df):
+    a = month_hashes(wave_df)
+    b = month_hashes(wave_df.iloc[::-1].reset_index(drop=True))
+    assert a == b
+    assert a["202501"]["rows"] == 2
+
+
+def test_merge_chunks_equals_whole(wave_df):
+    whole = month_hashes(wave_df)
+    parts = merge_month_hashes([month_hashes(wave_df.iloc[:3]), month_hashes(wave_df.iloc[3:])])
+    assert whole == parts
+
+
+def test_diff_months_detects_changed_new_removed(wave_df):
+    old = month_hashes(wave_df)
+    new_df = wave_df.copy()
+    new_df.loc[2, "CurrentCompany"] = "Admiral"
+    new_df = new_df[new_df["RenewalYearMonth"] != 202501]
+    new_df = pd.concat([new_df, pd.DataFrame({"UniqueID": ["9"], "RenewalYearMonth": [202504], "CurrentCompany": ["LV"]})])
+    changed, removed = diff_months(old, month_hashes(new_df))
+    assert changed == ["202502", "202504"]
+    assert removed == ["202501"]
+
+
+def test_fingerprint_same_file(tmp_path):
+    p = tmp_path / "a.csv"
+    p.write_text("x\n1\n")
+    assert same_file(file_fingerprint(p), file_fingerprint(p))
+    p.write_text("x\n2\n")
+    assert not same_file(file_fingerprint(p), {"sha256": "0"})
+
+
+def _write_source(path, months):
+    rows = ["UniqueID,RenewalYearMonth,Shoppers,Switchers,CurrentCompany,PreRenewalCompany"]
+    uid = 0
+    for m, company in months:
+        for _ in range(3):
+            uid += 1
+            rows.append(f"{uid},{m},Shoppers,Non-switcher,{company},{company}")
+    path.write_text("\n".join(rows) + "\n")
+
+
+def test_incremental_refresh_only_touches_changed_months(tmp_path, monkeypatch):
+    source = tmp_path / "motor.csv"
+    store = tmp_path / "store"
+    monkeypatch.setattr(refresh_mod, "find_source_csv", lambda product: source)
+    manifest = {"version": 1, "products": {}}
+
+    _write_source(source, [(202501, "Aviva"), (202502, "LV")])
+    first = refresh_mod.refresh_product_incremental("Motor", manifest, store, chunk_size=2)
+    assert first["changed"] == ["202501", "202502"]
+    assert len(read_store("Motor", store_dir=store)) == 6
+
+    again = refresh_mod.refresh_product_incremental("Motor", manifest, store, chunk_size=2)
+    assert again["status"] == "unchanged"
+
+    _write_source(source, [(202501, "Aviva"), (202502, "LV"), (202503, "Admiral")])
+    third = refresh_mod.refresh_product_incremental("Motor", manifest, store, chunk_size=2)
+    assert third["changed"] == ["202503"]
+    df = read_store("Motor", store_dir=store)
+    assert len(df) == 9
+    assert sorted(df["RenewalYearMonth"].unique().tolist()) == [202501, 202502, 202503]
@@ -0,0 +1,75 @@
+"""Tests for the staged refresh pipeline (data.refresh)."""
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analytics.count_cube import load_cube
+from data import refresh as refresh_mod
+from data.snapshot import has_snapshot
+from data.store import store_months
+
+pytest.importorskip("pyarrow")
+
+
+def _square(x):
+    return x * x
+
+
+def test_run_stage_keeps_task_order_in_pool():
+    assert refresh_mod.run_stage("square", _square, [(i,) for i in range(5)], workers=2) == [0, 1, 4, 9, 16]
+    assert refresh_mod.run_stage("square", _square, [(3,)], workers=1) == [9]
+
+
+def test_ingest_then_precompute_window(tmp_path, monkeypatch):
+    source = tmp_path / "motor.csv"
+    rows = ["UniqueID,RenewalYearMonth,CurrentCompany,PreRenewalCompany,Shoppers,Switchers"]
+    for i in range(40):
+        month = 202401 + (i % 12)
+        insurer = "Aviva" if i % 2 else "LV"
+        rows.append(f"{i},{month},{insurer},{insurer},Shoppers,{'Switcher' if i % 5 == 0 else 'Non-switcher'}")
+    source.write_text("\n".join(rows) + "\n")
+    monkeypatch.setattr(refresh_mod, "find_source_csv", lambda product: source)
+    store, snapshots, cubes = tmp_path / "store", tmp_path / "snapshot", tmp_path / "cube"
+
+    result = refresh_mod.ingest_product("Motor", store_dir=store, snapshot_dir=snapshots, cube_dir=cubes)
+    assert result["skipped"] is None
+    assert result["rows"] == 40
+    assert {"load_transform", "write", "snapshot", "cube", "dimensions"} <= set(result["timings"])
+    assert load_cube("Motor", cubes).query(time_window_months=0)["n"] == 40
+    assert len(store_months("Motor", store)) == 12
+    assert has_snapshot("Motor", snapshots)
+
+    rates = refresh_mod.precompute_window("Motor", 6, store_dir=store)
+    assert set(rates["insurer"]) == {"Aviva", "LV"}
+    assert (rates["time_window_months"] == 6).all()
+    insurer_rows = rates[(rates[["age_band", "region", "payment_type"]] == "").all(axis=1)]
+    assert insurer_rows["n"].sum() < 40  # only the window's partitions were read
+
+
+def test_streamed_ingest_reads_back_only_the_app_window(tmp_path, monkeypatch):
+    from analytics.demographics import window_start
+    from config import APP_HISTORY_MONTHS
+    from data.snapshot import read_snapshot
+
+    source = tmp_path / "motor.csv"
+    rows = ["UniqueID,RenewalYearMonth,CurrentCompany,PreRenewalCompany,Shoppers,Switchers"]
+    months = [(2022 + i // 12) * 100 + 1 + i % 12 for i in range(APP_HISTORY_MONTHS + 6)]
+    for i in range(len(months) * 2):
+        rows.append(f"{i},{months[i % len(months)]},LV,Aviva,Shoppers,Non-switcher")
+    source.write_text("\n".join(rows) + "\n")
+    monkeypatch.setattr(refresh_mod, "find_source_csv", lambda product: source)
+    store, snapshots, cubes = tmp_path / "store", tmp_path / "snapshot", tmp_path / "cube"
+    read_back = []
+    real_read_store = refresh_mod.read_store
+    monkeypatch.setattr(refresh_mod, "read_store", lambda *a, **kw: read_back.append(kw) or real_read_store(*a, **kw))
+
+    result = refresh_mod.ingest_product("Motor", chunk_size=7, store_dir=store, snapshot_dir=snapshots, cube_dir=cubes)
+    assert result["rows"] == len(months) * 2
+    assert len(store_months("Motor", store)) == len(months)  # the store keeps the full history
+    start = window_start(months[-1], APP_HISTORY_MONTHS)
+    assert [kw["start_month"] for kw in read_back] == [start] and read_back[0]["columns"] is not None
+    in_window = 2 * sum(m >= start for m in months)
+    assert in_window < len(months) * 2
+    assert load_cube("Motor", cubes).query(time_window_months=0)["n"] == in_window
+    assert len(read_snapshot("Motor", snapshots)) == in_window
@@ -0,0 +1,81 @@
+"""Tests for data.schema and schema-typed loading."""
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data.schema import apply_schema, column_dtype, memory_report
+from data.loader import _read_csv
+from data.transforms import transform
+
+
+@pytest.fixture
+def raw_df():
+    return pd.DataFrame({
+        "UniqueID": ["1", "2", "3"],
+        "RenewalYearMonth": ["202501", "202502", "202502"],
+        "Shoppers": ["Shoppers", "Non-shoppers", "Shoppers"],
+        "Switchers": ["Switcher", "Non-switcher", "Non-switcher"],
+        "CurrentCompany": ["Aviva", "LV", "Aviva"],
+        "PreRenewalCompany": ["LV", "LV", "Aviva"],
+        "Region": ["London", "Scotland", "London"],
+        "Age Group": ["25-34", "55-64", "25-34"],
+        "Q9b_1": ["1", None, "1"],
+    })
+
+
+def test_column_dtype_lookup():
+    assert column_dtype("CurrentCompany") == "category"
+    assert column_dtype("RenewalYearMonth") == "int32"
+    assert column_dtype("IsShopper") == "bool"
+    assert column_dtype("Q9b_3") == "uint8"
+    assert column_dtype("Q11_2") == "uint8"
+    assert column_dtype("StartedDateTime") is None
+
+
+def test_apply_schema_dtypes(raw_df):
+    out = apply_schema(raw_df.copy())
+    assert isinstance(out["CurrentCompany"].dtype, pd.CategoricalDtype)
+    assert out["RenewalYearMonth"].dtype == np.int32
+    assert out["Q9b_1"].dtype == np.uint8
+    assert out["Q9b_1"].tolist() == [1, 0, 1]
+
+
+def test_missing_year_month_is_nullable_int(raw_df):
+    raw_df.loc[0, "RenewalYearMonth"] = None
+    out = apply_schema(raw_df.copy())
+    assert str(out["RenewalYearMonth"].dtype) == "Int32"
+    assert out["RenewalYearMonth"].isna().sum() == 1
+
+
+def test_transform_keeps_schema_dtypes(raw_df):
+    out = transform(apply_schema(raw_df.copy()), "Motor")
+    for col in ("Product", "CurrentCompany", "PreviousCompany", "AgeBand", "Region", "PriceDirection"):
+        assert isinstance(out[col].dtype, pd.CategoricalDtype), col
+    for col in ("IsShopper", "IsSwitcher", "IsNewToMarket", "IsRetained", "UsedPCW"):
+        assert out[col].dtype == bool, col
+    assert out["RenewalYearMonth"].dtype == np.int32
+
+
+def test_read_csv_applies_schema(tmp_path):
+    path = tmp_path / "motor.csv"
+    path.write_text(
+        "﻿MainData[UniqueID],MainData[RenewalYearMonth],MainData[CurrentCompany],MainData[Q11_1]\n"
+        "1,202501,Aviva,1\n"
+        "2,202502,LV,\n",
+        encoding="utf-8",
+    )
+    df = _read_csv(path)
+    assert list(df.columns) == ["UniqueID", "RenewalYearMonth", "CurrentCompany", "Q11_1"]
+    assert isinstance(df["CurrentCompany"].dtype, pd.CategoricalDtype)
+    assert df["RenewalYearMonth"].dtype == np.int32
+    assert df["Q11_1"].tolist() == [1, 0]
+
+
+def test_memory_report(raw_df):
+    report = memory_report(apply_schema(raw_df.copy()))
+    assert report["total_mb"] >= 0
+    assert "category" in report["by_dtype"]
+    assert len(report["top_columns"]) <= 10
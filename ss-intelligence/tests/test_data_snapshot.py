@@ -0,0 +1,106 @@
+"""Tests for data.snapshot (memory-mapped Arrow IPC app dataset)."""
+import pytest
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data.snapshot import has_snapshot, read_snapshot, write_snapshot
+from data.transforms import transform
+
+pytest.importorskip("pyarrow")
+
+
+def _frame():
+    return transform(pd.DataFrame({
+        "UniqueID": [str(i) for i in range(6)],
+        "RenewalYearMonth": ["202501", "202501", "202502", "202502", "202503", None],
+        "Shoppers": ["Shoppers", "Non-shoppers", "Shoppers", None, "Shoppers", "Non-shoppers"],
+        "Switchers": ["Switcher", "Non-switcher"] * 3,
+        "CurrentCompany": ["Aviva", "LV", "Aviva", "Direct Line", "LV", None],
+        "PreRenewalCompany": ["LV", "LV", "Aviva", "Aviva", "LV", "LV"],
+        "Q9b_1": ["1", "0", "", "1", "0", "1"],
+    }), "Motor")
+
+
+def test_snapshot_roundtrip_keeps_values_and_dtypes(tmp_path):
+    df = _frame()
+    assert not has_snapshot("Motor", tmp_path)
+    write_snapshot(df, "Motor", tmp_path)
+    assert has_snapshot("Motor", tmp_path)
+    out = read_snapshot("Motor", tmp_path)
+    assert list(out.columns) == list(df.columns)
+    for col in df.columns:
+        assert out[col].dtype == df[col].dtype, col
+        pd.testing.assert_series_equal(out[col], df[col], check_names=False)
+
+
+def test_snapshot_columns_are_mapped_not_copied(tmp_path):
+    write_snapshot(_frame(), "Motor", tmp_path)
+    out = read_snapshot("Motor", tmp_path)
+    # Views over the read-only mapping; filtering still produces ordinary frames
+    assert not out["IsShopper"].to_numpy().flags.writeable
+    assert not out["CurrentCompany"].cat.codes.to_numpy().flags.writeable
+    shoppers = out[out["IsShopper"]]
+    assert shoppers["CurrentCompany"].value_counts().sum() == len(shoppers) - shoppers["CurrentCompany"].isna().sum()
+
+
+def test_refresh_snapshot_keeps_app_history_window(tmp_path):
+    from data.refresh import save_snapshot
+
+    months = [202301 + i for i in range(12)] + [202401 + i for i in range(12)] + [202501, 202502]
+    df = transform(pd.DataFrame({
+        "UniqueID": [str(i) for i in range(len(months))],
+        "RenewalYearMonth": [str(m) for m in months],
+        "CurrentCompany": ["Aviva"] * len(months),
+    }), "Motor")
+    save_snapshot(df, "Motor", tmp_path)
+    out = read_snapshot("Motor", tmp_path)
+    assert out["RenewalYearMonth"].max() == 202502
+    assert out["RenewalYearMonth"].min() > 202301
+    assert len(out) == int((df["RenewalYearMonth"] >= out["RenewalYearMonth"].min()).sum())
+
+
+def test_concurrent_writers_each_use_their_own_temp_file(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from data.snapshot import read_frame, write_frame
+
+    df = _frame()
+    path = tmp_path / "cache" / "motor-key.arrow"
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        assert list(pool.map(lambda _: write_frame(df, path), range(8))) == [path] * 8
+    pd.testing.assert_frame_equal(read_frame(path), df)
+    assert [p.name for p in path.parent.iterdir()] == [path.name]
+
+
+def test_snapshot_is_only_used_while_its_source_is_unchanged(tmp_path, monkeypatch):
+    import data.loader as loader
+    from data.snapshot import load_snapshot, snapshot_source
+
+    src = tmp_path / "raw" / "motor.csv"
+    src.parent.mkdir()
+    src.write_text("UniqueID,RenewalYearMonth,CurrentCompany,Shoppers\n1,202501,Aviva,Shoppers\n2,202502,LV,Non-shoppers\n")
+    monkeypatch.setattr(loader, "_DATA_DIR_PATH", None)
+    monkeypatch.setattr(loader, "has_product", lambda product: False)
+    monkeypatch.setattr(loader, "PROCESSED_DIR", tmp_path)
+    monkeypatch.setattr(loader, "RAW_DIR", src.parent)
+    monkeypatch.setattr(loader, "CACHE_DIR", tmp_path / "cache")
+    snapshots = tmp_path / "snapshot"
+    loads = []
+
+    def load():
+        loads.append(True)
+        return loader.load_data("Motor")[0]
+
+    def app_frame():
+        return load_snapshot("Motor", loader.source_fingerprint("Motor"), load, snapshots)
+
+    write_snapshot(_frame(), "Motor", snapshots)  # no recorded source: never trusted
+    assert len(app_frame()) == 2 and len(loads) == 1
+    assert snapshot_source("Motor", snapshots) == loader.source_fingerprint("Motor")
+    assert len(app_frame()) == 2 and len(loads) == 1  # served from the snapshot
+
+    src.write_text(src.read_text() + "3,202503,Aviva,Shoppers\n")
+    assert app_frame()["RenewalYearMonth"].tolist() == [202501, 202502, 202503]
+    assert len(loads) == 2
+    assert len(app_frame()) == 3 and len(loads) == 2  # rewritten for the new source
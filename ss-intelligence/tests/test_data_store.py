@@ -0,0 +1,55 @@
+"""Tests for data.store (Hive-partitioned Parquet store)."""
+import pytest
+import numpy as np
+import pandas as pd
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from data.store import has_product, read_store, store_months, write_partitions
+from data.transforms import transform
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def store(tmp_path):
+    df = transform(pd.DataFrame({
+        "UniqueID": [str(i) for i in range(8)],
+        "RenewalYearMonth": ["202501", "202501", "202502", "202502", "202503", "202503", "202504", "202504"],
+        "Shoppers": ["Shoppers", "Non-shoppers"] * 4,
+        "Switchers": ["Switcher", "Non-switcher"] * 4,
+        "CurrentCompany": ["Aviva", "LV"] * 4,
+        "PreRenewalCompany": ["LV", "LV"] * 4,
+        "Region": ["London"] * 8,
+    }), "Motor")
+    path = tmp_path / "store"
+    write_partitions(df, "Motor", path)
+    return path
+
+
+def test_months_listed_from_partitions(store):
+    assert has_product("Motor", store)
+    assert not has_product("Home", store)
+    assert store_months("Motor", store) == [202501, 202502, 202503, 202504]
+
+
+def test_month_range_pushdown(store):
+    df = read_store("Motor", start_month=202503, store_dir=store)
+    assert sorted(df["RenewalYearMonth"].unique().tolist()) == [202503, 202504]
+    assert (df["Product"] == "Motor").all()
+    assert df["RenewalYearMonth"].dtype == np.int32
+    assert isinstance(df["CurrentCompany"].dtype, pd.CategoricalDtype)
+
+
+def test_column_projection(store):
+    df = read_store("Motor", end_month=202501, columns=["IsShopper"], store_dir=store)
+    assert set(df.columns) == {"Product", "RenewalYearMonth", "IsShopper"}
+    assert len(df) == 2
+
+
+def test_write_replaces_touched_partitions_only(store):
+    wave = read_store("Motor", start_month=202504, store_dir=store).iloc[:1]
+    write_partitions(wave, "Motor", store)
+    df = read_store("Motor", store_dir=store)
+    assert len(df) == 7
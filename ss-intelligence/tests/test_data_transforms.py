@@ -5,7 +5,7 @@ import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from data.transforms import transform
+from data.transforms import map_categories, transform
 
 
 def test_transform_adds_isshopper():
@@ -48,3 +48,32 @@ def test_transform_adds_previous_company():
     out = transform(df, "Motor")
     assert "PreviousCompany" in out.columns
     assert out["PreviousCompany"].iloc[0] == "LV"
+
+
+def test_price_direction_vectorised():
+    df = pd.DataFrame({
+        "Renewal premium change combined": ["Higher by £31 to £40 a year", None, "Lower by £10", None],
+        "Renewal premium change": ["Higher", "It was unchanged", "Lower", "I didn't have a policy"],
+    })
+    out = transform(df, "Motor")
+    assert out["PriceDirection"].tolist() == ["Higher", "Unchanged", "Lower", "New"]
+
+
+def test_map_categories_handles_missing():
+    s = pd.Series(["25-34", None, "65+", "25-34"], dtype="category")
+    out = map_categories(s, lambda v: "Missing" if v is None else v)
+    assert out.tolist() == ["25-34", "Missing", "65+", "25-34"]
+
+
+def test_flags_from_categories():
+    df = pd.DataFrame({
+        "Shoppers": pd.Categorical(["Shoppers", " shoppers ", "Non-shoppers", None]),
+        "Switchers": pd.Categorical(["Switcher", "Non-switcher", "New-to-market", None]),
+        "Did you use a PCW for shopping": ["Yes", None, "No", "yes"],
+    })
+    out = transform(df, "Motor")
+    assert out["IsShopper"].tolist() == [True, True, False, False]
+    assert out["IsSwitcher"].tolist() == [True, False, False, False]
+    assert out["IsNewToMarket"].tolist() == [False, False, True, False]
+    assert out["IsRetained"].tolist() == [False, True, False, False]
+    assert out["UsedPCW"].tolist() == [True, False, False, True]
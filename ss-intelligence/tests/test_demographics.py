@@ -1,5 +1,6 @@
 """Tests for analytics/demographics.py."""
 import pytest
+import numpy as np
 import pandas as pd
 import sys
 from pathlib import Path
@@ -61,3 +62,61 @@ def test_multi_filter_compounds(demo_df):
     assert len(f) <= 60
     assert (f["AgeBand"] == "25-34").all()
     assert (f["Region"] == "London").all()
+
+
+def test_time_window_uses_product_max_month():
+    df = pd.DataFrame({
+        "Product": ["Motor"] * 4 + ["Home"] * 2,
+        "RenewalYearMonth": pd.array([202301, 202312, 202401, None, 202312, 202406], dtype="Int32"),
+        "CurrentCompany": pd.Categorical(["Aviva", "LV", "Aviva", "Aviva", "LV", "LV"]),
+    })
+    f = apply_filters(df, product="Motor", time_window_months=1)
+    assert list(f.index) == [1, 2]
+    assert list(apply_filters(df, product="Motor", time_window_months=0).index) == [0, 1, 2, 3]
+    assert list(apply_filters(df, product="Home", insurer="LV", time_window_months=1).index) == [5]
+
+
+def test_unknown_value_returns_empty_and_index_is_reused(demo_df):
+    from analytics.filter_index import get_filter_index
+
+    assert apply_filters(demo_df, insurer="Nobody").empty
+    assert get_filter_index(demo_df) is get_filter_index(demo_df)
+
+
+def test_row_cache_hits_misses_and_evictions(demo_df):
+    from analytics.filter_index import ROW_CACHE, RowCache, filtered_rows
+
+    ROW_CACHE.clear()
+    first = filtered_rows(demo_df, insurer="LV", region="")
+    again = filtered_rows(demo_df, insurer="LV", region=None)
+    assert again is first
+    assert (ROW_CACHE.hits, ROW_CACHE.misses) == (1, 1)
+
+    cache = RowCache(max_bytes=16)
+    cache.put(("a",), np.arange(2, dtype=np.int32))
+    cache.put(("b",), np.arange(2, dtype=np.int32))
+    cache.get(("a",))
+    cache.put(("c",), np.arange(2, dtype=np.int32))
+    assert cache.get(("b",)) is None
+    assert cache.get(("a",)) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_sorted_dataset_slices_windows_and_custom_range():
+    from analytics.demographics import parse_year_month
+    from analytics.filter_index import get_filter_index, sort_for_index
+
+    df = sort_for_index(pd.DataFrame({
+        "Product": ["Home", "Motor", "Motor", "Motor", "Motor", "Home"],
+        "RenewalYearMonth": pd.array([202406, 202401, None, 202311, 202312, 202312], dtype="Int32"),
+        "CurrentCompany": ["LV", "Aviva", "Aviva", "LV", "Aviva", "LV"],
+    }))
+    assert get_filter_index(df).sorted
+    assert list(apply_filters(df, time_window_months=1)["RenewalYearMonth"]) == [202312, 202401]
+    assert len(apply_filters(df, time_window_months=0)) == 4
+    custom = apply_filters(df, start_month="2023-11", end_month="2023-12", insurer="Aviva")
+    assert list(custom["RenewalYearMonth"]) == [202312]
+    assert list(apply_filters(df, product="Home", end_month=202401)["RenewalYearMonth"]) == [202312]
+    assert parse_year_month("2025-03") == 202503
+    with pytest.raises(ValueError):
+        parse_year_month("2025-13")
@@ -1,11 +1,23 @@
 """Tests for flows."""
 import pytest
+import numpy as np
 import pandas as pd
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
-from analytics.flows import calc_net_flow, calc_flow_matrix, is_flow_cell_suppressed
+from analytics.demographics import apply_filters
+from analytics.filter_index import ROW_CACHE
+from analytics.flows import (
+    FlowMatrix,
+    calc_flow_matrix,
+    calc_flow_pct_of_lost,
+    calc_net_flow,
+    calc_top_destinations,
+    calc_top_sources,
+    flow_matrix,
+    is_flow_cell_suppressed,
+)
 
 
 @pytest.fixture
@@ -46,3 +58,63 @@ def test_flow_cell_suppression():
     assert is_flow_cell_suppressed(9) is True
     assert is_flow_cell_suppressed(10) is False
     assert is_flow_cell_suppressed(0) is True
+
+
+@pytest.fixture
+def market_df(make_survey_df):
+    """Shared survey frame plus PreviousCompany, including insurers no respondent is with now."""
+    df = make_survey_df(n=4000, seed=5)
+    rng = np.random.default_rng(5)
+    return df.assign(PreviousCompany=rng.choice(["Aviva", "LV", "Admiral", "Direct Line", "Hastings", None], len(df)))
+
+
+@pytest.mark.parametrize("filters", [{}, {"age_band": "25-34", "time_window_months": 1}])
+def test_flow_matrix_matches_frame_functions(market_df, filters):
+    df_mkt = apply_filters(market_df, **filters)
+    flows = flow_matrix(market_df, **filters)
+    for insurer in ["Aviva", "Hastings"]:
+        assert flows.net_flow(insurer) == calc_net_flow(df_mkt, insurer)
+        assert flows.top_sources(insurer).to_dict() == calc_top_sources(df_mkt, insurer).to_dict()
+        assert flows.top_destinations(insurer).to_dict() == calc_top_destinations(df_mkt, insurer).to_dict()
+        expected_pct = calc_flow_pct_of_lost(df_mkt, insurer)
+        assert flows.pct_of_lost(insurer).to_dict() == pytest.approx(expected_pct.rename(index=str).to_dict())
+    expected = calc_flow_matrix(df_mkt)
+    dense = flows.to_frame().loc[expected.index, expected.columns.astype(str)]
+    assert (dense.to_numpy() == expected.to_numpy()).all()
+    totals = flows.totals()
+    assert totals["gained"].sum() <= flows.total and totals["net"].sum() == totals["gained"].sum() - totals["lost"].sum()
+    assert flows.net_flow("Nobody") == {"gained": 0, "lost": 0, "net": 0}
+
+
+def test_flow_matrix_is_cached_per_slice(market_df):
+    ROW_CACHE.clear()
+    first = flow_matrix(market_df, age_band="18-24")
+    assert flow_matrix(market_df, age_band="18-24", region="") is first
+    assert flow_matrix(market_df, age_band="25-34") is not first
+
+
+def test_heatmap_masks_suppressed_cells(flow_df):
+    hm = FlowMatrix.from_frame(flow_df).heatmap(min_cell=10)
+    assert list(hm.index) == ["A", "B", "C"] and list(hm.columns) == list(hm.index)
+    assert hm.loc["A", "B"] == 10 and hm.loc["A", "C"] == 10
+    assert np.isnan(hm.loc["B", "A"])
+    assert FlowMatrix.from_frame(flow_df).heatmap(min_cell=11).isna().all().all()
+
+
+def test_heatmap_excludes_flows_between_unauthorised_insurers(flow_df, monkeypatch):
+    from auth.access import get_authorized_insurers
+
+    flows = FlowMatrix.from_frame(pd.concat([flow_df, pd.DataFrame({
+        "UniqueID": range(101, 113),
+        "IsSwitcher": [True] * 12,
+        "CurrentCompany": ["D"] * 12,
+        "PreviousCompany": ["C"] * 12,
+    })], ignore_index=True))
+    assert flows.heatmap(min_cell=10).loc["C", "D"] == 12
+
+    monkeypatch.setenv("AUTHORIZED_INSURERS", "B")
+    hm = flows.heatmap(min_cell=10, insurers=get_authorized_insurers(list(flows.labels)))
+    # A -> B involves the authorised insurer; A -> C and C -> D do not and must not be shown or ranked
+    assert list(hm.index) == ["A", "B"] and list(hm.columns) == ["A", "B"]
+    assert hm.loc["A", "B"] == 10
+    assert hm.drop(index="B", columns="B").isna().all().all()
@@ -0,0 +1,44 @@
+"""Tests for select_market and the insurer-vs-market *_pair functions."""
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analytics.channels import calc_quote_buy_mismatch, calc_quote_buy_mismatch_pair
+from analytics.demographics import apply_filters, select_market
+from analytics.price import calc_price_direction_dist, calc_price_direction_dist_pair
+from analytics.rates import calc_conversion_rate, calc_rates_pair, calc_retention_rate, calc_shopping_rate
+from analytics.reasons import calc_reason_comparison, calc_reason_comparison_pair
+
+
+def test_pairs_match_two_pass_results(survey_df):
+    filters = {"region": "London", "time_window_months": 1}
+    sel = select_market(survey_df, insurer="LV", **filters)
+    df_mkt = apply_filters(survey_df, **filters)
+    df_ins = apply_filters(survey_df, insurer="LV", **filters)
+    assert sel.market.index.equals(df_mkt.index)
+    assert sel.insurer_frame.index.equals(df_ins.index)
+
+    ins, mkt = calc_rates_pair(sel)
+    assert ins["shopping"] == pytest.approx(calc_shopping_rate(df_ins))
+    assert ins["retention"] == pytest.approx(calc_retention_rate(df_ins))
+    assert mkt["conversion"] == pytest.approx(calc_conversion_rate(df_mkt))
+    assert ins["counts"]["n"] == len(df_ins)
+
+    assert calc_reason_comparison_pair(sel, "Q18") == calc_reason_comparison(df_ins, df_mkt, "Q18")
+    dist_ins, dist_mkt = calc_price_direction_dist_pair(sel)
+    pd.testing.assert_series_equal(dist_mkt.sort_index(), calc_price_direction_dist(df_mkt).sort_index(), check_index_type=False)
+    assert dist_ins.sum() == pytest.approx(1.0)
+    mis_ins, mis_mkt = calc_quote_buy_mismatch_pair(sel)
+    assert mis_ins == pytest.approx(calc_quote_buy_mismatch(df_ins))
+    assert mis_mkt == pytest.approx(calc_quote_buy_mismatch(df_mkt))
+
+
+def test_market_only_selection_has_no_insurer_values(survey_df):
+    sel = select_market(survey_df)
+    assert sel.insurer_n == 0
+    ins, mkt = calc_rates_pair(sel)
+    assert ins is None and mkt["counts"]["n"] == sel.market_n
+    assert calc_reason_comparison_pair(sel, "Q18")["insurer"] == []
@@ -0,0 +1,73 @@
+"""
+Benchmark for the Bayesian pre-compute against insurer count and row count, on synthetic
+data: refresh time (run_precompute, every window and demographic cell), the per-insurer
+rates alone (one grouped aggregation per window) and the previous one-filter-per-insurer
+loop. Prints the table (run with -s to see it). The default run is a quick smoke check of the
+rates against the loop on a 5,000-row frame; setting PRECOMPUTE_BENCH_ROWS (e.g.
+1000000,5000000) runs those frames with up to 160 insurers and also asserts the per-insurer
+step is flat in insurer count (demographic cells grow with insurers × cells, so the full
+refresh is not).
+"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+from analytics import bayesian_precompute as bp
+from analytics.demographics import apply_filters
+from analytics.filter_index import ROW_CACHE, sort_for_index
+from data.transforms import transform
+from synthetic import make_survey_frame
+
+pytest.importorskip("pyarrow")
+
+# Full-size frames and timing assertions only when benchmark sizes are requested (wall-clock
+# ratios flake on shared runners); otherwise a small smoke check that runs in the default suite
+BENCHMARK = bool(os.environ.get("PRECOMPUTE_BENCH_ROWS"))
+ROW_COUNTS = [int(n) for n in os.environ["PRECOMPUTE_BENCH_ROWS"].split(",")] if BENCHMARK else [5000]
+INSURER_COUNTS = (10, 40, 160) if BENCHMARK else (10, 40)
+
+
+def _loop_counts(df, insurers) -> dict:
+    """The previous approach: one filter per insurer and window. Returns the 24-month counts."""
+    for tw in bp.TIME_WINDOWS:
+        counts = {}
+        for ins in insurers:
+            df_ins = apply_filters(df, insurer=ins, time_window_months=tw)
+            counts[ins] = int((~df_ins["IsNewToMarket"]).sum())
+    return counts
+
+
+def test_precompute_time_is_flat_in_insurer_count(tmp_path, monkeypatch):
+    monkeypatch.setattr(bp, "_CACHE_PATH", tmp_path / "bayesian_cache.parquet")
+    lines = [f"{'rows':>10} {'insurers':>8} {'refresh_s':>10} {'insurer_s':>10} {'loop_s':>8}"]
+    for n_rows in ROW_COUNTS:
+        times = {}
+        for n_insurers in INSURER_COUNTS:
+            df = sort_for_index(transform(make_survey_frame(n_rows, n_insurers=n_insurers), "Motor", copy=False))
+            apply_filters(df)  # build the filter index outside the timings
+            ROW_CACHE.clear()
+            t0 = time.perf_counter()
+            bp.run_precompute(df)
+            refresh_s = time.perf_counter() - t0
+
+            ROW_CACHE.clear()
+            t0 = time.perf_counter()
+            for tw in bp.TIME_WINDOWS:
+                rates = bp.precompute_retention_rates(df, "Motor", tw)
+            times[n_insurers] = time.perf_counter() - t0
+
+            ROW_CACHE.clear()
+            t0 = time.perf_counter()
+            expected = _loop_counts(df, list(rates["insurer"]))
+            loop_s = time.perf_counter() - t0
+            assert dict(zip(rates["insurer"], rates["n"])) == expected
+            lines.append(f"{n_rows:>10,} {n_insurers:>8} {refresh_s:>10.3f} {times[n_insurers]:>10.3f} {loop_s:>8.3f}")
+        if BENCHMARK:
+            # One grouped aggregation per product × window: 16x the insurers must not cost 16x the time
+            assert times[INSURER_COUNTS[-1]] < 4 * times[INSURER_COUNTS[0]]
+    print("\n" + "\n".join(lines))
@@ -14,3 +14,13 @@ def test_retention_equals_one_minus_switching(sample_df):
 
 def test_empty_returns_none(empty_df):
     assert calc_shopping_rate(empty_df) is None
+
+
+def test_counts_by_insurer_match_per_insurer_filter(sample_df):
+    from analytics.rates import calc_counts_by_insurer
+
+    counts = calc_counts_by_insurer(sample_df)
+    aviva = sample_df[sample_df["CurrentCompany"] == "Aviva"]
+    assert counts.loc["Aviva", "n"] == len(aviva)
+    assert counts.loc["Aviva", "retained"] == (aviva["IsRetained"] & ~aviva["IsNewToMarket"]).sum()
+    assert counts["n"].sum() == len(sample_df)
@@ -0,0 +1,64 @@
+"""Tests for analytics/segments.py and the price-direction cross-tabs built on it."""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from analytics.price import calc_rate_by_price_direction, calc_rates_by_price_band, calc_rates_by_price_direction
+from analytics.rates import calc_conversion_rate, calc_shopping_rate, calc_switching_rate
+from analytics.segments import calc_segment_rates, rate_grid
+
+BANDS = ["£10 or less a year", "£11 to £20 a year", "Over £350 a year"]
+
+
+@pytest.fixture
+def price_df(make_survey_df):
+    """Shared survey frame with "New" / "" price directions and the Q6a / Q6b price-change bands."""
+    df = make_survey_df(n=2000, seed=7)
+    rng = np.random.default_rng(7)
+    direction = rng.choice(["Higher", "Lower", "Unchanged", "New", ""], len(df))
+    return df.assign(
+        PriceDirection=pd.Categorical(direction),
+        Q6a=np.where(direction == "Higher", rng.choice(BANDS, len(df)), None),
+        Q6b=np.where(direction == "Lower", rng.choice(BANDS[::-1], len(df)), None),
+    )
+
+
+def test_segment_rates_match_per_segment_filters(price_df):
+    table = calc_segment_rates(price_df, ["PriceDirection", "AgeBand"])
+    assert "" not in table.index.get_level_values("PriceDirection")
+    assert None not in table.index.get_level_values("AgeBand")
+    assert table["n"].sum() == ((price_df["PriceDirection"] != "") & price_df["AgeBand"].notna()).sum()
+    for (direction, age), row in table.iterrows():
+        subset = price_df[(price_df["PriceDirection"] == direction) & (price_df["AgeBand"] == age)]
+        assert row["n"] == len(subset)
+        assert row["shopping"] == pytest.approx(calc_shopping_rate(subset))
+        assert row["switching"] == pytest.approx(calc_switching_rate(subset))
+        assert row["conversion"] == pytest.approx(calc_conversion_rate(subset))
+
+    rates, base = rate_grid(table, "switching", min_base=200)
+    assert list(rates.index) == list(table.index.get_level_values(0).unique())
+    assert rates.isna().equals(base < 200)
+
+
+def test_rate_by_price_direction_matches_loop(price_df):
+    def loop_switching(df):  # not a known rate function: takes the per-direction loop
+        return calc_switching_rate(df)
+
+    for exclude_new in (True, False):
+        fast = calc_rate_by_price_direction(price_df, calc_switching_rate, exclude_new=exclude_new)
+        pd.testing.assert_frame_equal(fast, calc_rate_by_price_direction(price_df, loop_switching, exclude_new=exclude_new), check_dtype=False)
+    assert "New" not in calc_rates_by_price_direction(price_df).index
+
+
+def test_rates_by_price_band_use_each_directions_band(price_df):
+    table = calc_rates_by_price_band(price_df)
+    assert set(table.index.get_level_values("PriceDirection")) == {"Higher", "Lower"}
+    assert list(table.index.get_level_values("band").unique()) == BANDS
+    lower = price_df[(price_df["PriceDirection"] == "Lower") & (price_df["Q6b"] == BANDS[-1])]
+    assert table.loc[("Lower", BANDS[-1]), "n"] == len(lower)
+    assert table.loc[("Lower", BANDS[-1]), "shopping"] == pytest.approx(calc_shopping_rate(lower))
+    assert table["n"].sum() == price_df["PriceDirection"].isin(["Higher", "Lower"]).sum()
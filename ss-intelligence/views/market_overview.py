@@ -8,15 +8,15 @@ import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 
 from analytics.rates import calc_shopping_rate, calc_switching_rate, calc_retention_rate
-from analytics.demographics import apply_filters
+from analytics.demographics import select_market
 from analytics.reasons import calc_reason_ranking
-from analytics.channels import calc_channel_usage, calc_pcw_usage
+from analytics.channels import CHANNEL_PREFIX, PCW_PREFIX, calc_code_usage_pair
 from components.cards import kpi_card
 from components.branded_chart import create_branded_figure
 from shared import format_year_month
 
 
-def layout(DF_MOTOR, DF_HOME):
+def layout():
     """Return Market Overview layout. Uses global filter bar from app layout."""
     return dbc.Container(
         [html.Div(id="market-overview-content-mo")],
@@ -25,8 +25,12 @@ def layout(DF_MOTOR, DF_HOME):
     )
 
 
-def register_callbacks(app, DF_MOTOR, DF_HOME):
-    """Register Market Overview callbacks. Called from app.py after app creation."""
+def register_callbacks(app, get_motor, get_home, get_cube=None):
+    """
+    Register Market Overview callbacks. Called from app.py after app creation.
+    get_motor / get_home return the (lazily loaded) datasets when a callback runs;
+    get_cube(product) returns the count cube the KPI cards and reason ranking are read from, if any.
+    """
 
     @app.callback(
         Output("market-overview-content-mo", "children"),
@@ -35,8 +39,12 @@ def register_callbacks(app, DF_MOTOR, DF_HOME):
     def update_market_overview(product, time_window):
         product = product or "Motor"
         tw = int(time_window or 24)
-        df = DF_MOTOR if product == "Motor" else (DF_HOME if DF_HOME is not None and len(DF_HOME) > 0 else DF_MOTOR)
-        df_market = apply_filters(df, product=product, time_window_months=tw)
+        df_home = get_home() if product != "Motor" else None
+        use_home = df_home is not None and len(df_home) > 0
+        df = df_home if use_home else get_motor()
+        sel = select_market(df, product=product, time_window_months=tw)
+        df_market = sel.market
+        cube = get_cube("Home" if use_home else "Motor") if get_cube else None
 
         by_month = df_market.groupby("RenewalYearMonth").agg(
             retained=("IsRetained", "sum"),
@@ -48,7 +56,10 @@ def register_callbacks(app, DF_MOTOR, DF_HOME):
         fig_trend.add_trace(go.Scatter(x=by_month["month_label"], y=by_month["retention"], mode="lines+markers"))
         fig_trend = create_branded_figure(fig_trend, title="Market Retention Trend")
 
-        why = calc_reason_ranking(df_market, "Q8", 5) if "Q8" in df_market.columns else []
+        if cube is not None and "Q8" in cube.reasons:
+            why = cube.reason_ranking("Q8", 5, product=product, time_window_months=tw)
+        else:
+            why = calc_reason_ranking(df_market, "Q8", 5) if "Q8" in df_market.columns else []
         if why:
             why_df = pd.DataFrame(why)
             if "pct" in why_df.columns:
@@ -57,7 +68,7 @@ def register_callbacks(app, DF_MOTOR, DF_HOME):
         else:
             why_table = html.P("Data not available", className="text-muted")
 
-        ch = calc_channel_usage(df_market)
+        _, ch = calc_code_usage_pair(sel, CHANNEL_PREFIX)
         if ch is not None and len(ch) > 0:
             fig_ch = go.Figure(go.Bar(x=ch.values, y=ch.index, orientation="h"))
             fig_ch = create_branded_figure(fig_ch, title="Channel Usage")
@@ -65,7 +76,7 @@ def register_callbacks(app, DF_MOTOR, DF_HOME):
         else:
             channel_div = html.P("Data not available", className="text-muted")
 
-        pcw = calc_pcw_usage(df_market)
+        _, pcw = calc_code_usage_pair(sel, PCW_PREFIX)
         if pcw is not None and len(pcw) > 0:
             fig_pcw = go.Figure(go.Pie(labels=pcw.index, values=pcw.values, hole=0.4))
             fig_pcw = create_branded_figure(fig_pcw, title="PCW Market Share")
@@ -82,9 +93,13 @@ def register_callbacks(app, DF_MOTOR, DF_HOME):
         )
         pcw_div = html.Div([pcw_content, footer])
 
-        shop = calc_shopping_rate(df_market)
-        switch = calc_switching_rate(df_market)
-        retain = calc_retention_rate(df_market)
+        if cube is not None:
+            rates = cube.rates(product=product, time_window_months=tw)
+            shop, switch, retain = rates["shopping"], rates["switching"], rates["retention"]
+        else:
+            shop = calc_shopping_rate(df_market)
+            switch = calc_switching_rate(df_market)
+            retain = calc_retention_rate(df_market)
         kpi_shop = kpi_card("Shopping Rate", shop, shop, format_str="{:.0%}")
         kpi_switch = kpi_card("Switching Rate", switch, switch, format_str="{:.0%}")
         kpi_retain = kpi_card("Retention Rate", retain, retain, format_str="{:.0%}")